@@ -0,0 +1,218 @@
+import argparse
+import importlib
+import itertools
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from charts import CHARTS_DIR, render
+from data_store import CHUNK_ROWS, DATASET_DIR, align_chunks, iter_table, load_table, table_columns
+from partial_store import load_partial, partition_key, save_partial, stage_version
+from profiling import merge, settings, worker_spans
+
+OUTPUT_DIR = '../csv_generated'
+
+# Analysis stages by name; each is a script in this directory exposing
+# TABLES, OUTPUT, summarize(**tables) and finalize(partials)
+STAGES = {
+    'average_positions': 'average_positions_compound',
+    'consistency': 'consistency',
+    'lap_consistency': 'lap_consistency_pit_stops',
+    'lap_times': 'lap_time_analysis',
+    'leaderboard': 'leaderboard',
+    'pit_stops': 'pit_stop_analysis',
+    'pit_stops_vs_position': 'pit_stops_vs_position',
+    'position_changes': 'position_due_pitstops',
+    'race_length': 'race_length_stats',
+    'tire_compound': 'tire_compound_analysis',
+    'starting_tire': 'tire_compound_final',
+    'tire_delta': 'tire_delta_analysis',
+    'track_status': 'track_status',
+    'tyre_model': 'tyre_model',
+    'undercut': 'undercut',
+    'weather': 'weather_tire_analysis',
+}
+
+
+def stage_module(name):
+    return importlib.import_module(STAGES[name])
+
+
+def select(df, columns):
+    return df if columns is None else df[columns]
+
+
+# Exactly the tables and columns a stage declares
+def stage_tables(module, tables):
+    return {table: select(tables[table], columns) for table, columns in module.TABLES.items()}
+
+
+# Run each stage's summarize on one slice of the data. Returns the partials
+# and, when the parent profiles, the spans recorded while computing them.
+def run_partition(stage_names, tables, profile=None):
+    partials = {}
+    with worker_spans(profile) as spans:
+        for name in stage_names:
+            module = stage_module(name)
+            partials[name] = module.summarize(**stage_tables(module, tables))
+    return partials, spans
+
+
+# Union of the columns the stages read from each table (None for all columns)
+def wanted_columns(stage_names):
+    wanted = {}
+    for name in stage_names:
+        for table, columns in stage_module(name).TABLES.items():
+            if columns is None or wanted.get(table, []) is None:
+                wanted[table] = None
+            else:
+                wanted[table] = sorted(set(wanted.get(table, [])) | set(columns))
+    return wanted
+
+
+# Stages that read nothing but the laps table can consume it chunk by chunk,
+# unless they set STREAM = False because they need each event whole
+def streamable(name):
+    module = stage_module(name)
+    return getattr(module, 'STREAM', True) and set(module.TABLES) == {'laps'}
+
+
+# Stream the season's laps in bounded chunks cut on race boundaries, so pit stop
+# detection always sees a driver's whole race. Yields (None, stage names, tables).
+def stream_tasks(stage_names, season, data_dir=DATASET_DIR, chunk_rows=CHUNK_ROWS):
+    columns = wanted_columns(stage_names)['laps']
+    chunks = iter_table('laps', season, columns, chunk_rows, data_dir)
+    for chunk in align_chunks(chunks, ['EventName', 'Driver']):
+        yield None, stage_names, {'laps': chunk}
+
+
+# Load the tables the stages need for one season, once, and cut them into tasks.
+# Stages whose tables all carry EventName run once per event, unless they set
+# PARTITION = 'season'; the rest run on the whole season.
+# Yields (event, stage names, tables); event is None for the whole-season task.
+def season_tasks(stage_names, season, data_dir=DATASET_DIR, partition='event'):
+    wanted = wanted_columns(stage_names)
+    tables = {}
+    by_event = set()
+    for table, columns in wanted.items():
+        available = table_columns(table, season, data_dir)
+        if 'EventName' in available:
+            by_event.add(table)
+            if columns is not None and 'EventName' not in columns:
+                columns = columns + ['EventName']
+        tables[table] = load_table(table, season, columns, data_dir)
+
+    per_event = [
+        name for name in stage_names
+        if partition == 'event'
+        and getattr(stage_module(name), 'PARTITION', 'event') == 'event'
+        and set(stage_module(name).TABLES) <= by_event
+    ]
+    per_season = [name for name in stage_names if name not in per_event]
+
+    if per_event:
+        needed = {table for name in per_event for table in stage_module(name).TABLES}
+        slices = {table: dict(list(tables[table].groupby('EventName', sort=False, observed=True))) for table in needed}
+        events = set().union(*(table_slices.keys() for table_slices in slices.values()))
+        for event in sorted(events):
+            yield event, per_event, {
+                table: table_slices.get(event, tables[table].iloc[0:0])
+                for table, table_slices in slices.items()
+            }
+    if per_season:
+        yield None, per_season, tables
+
+
+# Fan every (season, partition) task out over a process pool, then merge the
+# partials of each stage and write its usual csv_generated/ output. Partials
+# are merged in task order (events sorted by name, chunks in file order), not
+# in the order the workers finish, so the outputs never depend on scheduling.
+# Per-event partials are kept on disk keyed on the event's data, so a refresh
+# only summarizes the events that are new or changed since the last run.
+# With stream=True the laps-only stages read the laps in chunks of chunk_rows
+# instead, keeping at most two chunks per worker in flight. Charts go to
+# charts_dir, in a directory per season like the outputs when there are several.
+def run(stage_names, seasons, data_dir=DATASET_DIR, output_dir=OUTPUT_DIR, partition='event', workers=None,
+        reuse=True, stream=False, chunk_rows=CHUNK_ROWS, charts=False, charts_dir=CHARTS_DIR):
+    partials = {(season, name): [] for season in seasons for name in stage_names}
+    streamed = [name for name in stage_names if stream and streamable(name)]
+    loaded = [name for name in stage_names if name not in streamed]
+
+    def collect(done):
+        for future in done:
+            season, index, event, keys = futures.pop(future)
+            results, spans = future.result()
+            merge(spans)
+            for name, partial in results.items():
+                partials[(season, name)].append((index, partial))
+                if name in keys:
+                    save_partial(partial, name, season, event, keys[name], data_dir)
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        in_flight = 2 * (workers or os.cpu_count() or 1)
+        for season in seasons:
+            tasks = []
+            if streamed:
+                tasks.append(stream_tasks(streamed, season, data_dir, chunk_rows))
+            if loaded:
+                tasks.append(season_tasks(loaded, season, data_dir, partition))
+            for index, (event, names, tables) in enumerate(itertools.chain(*tasks)):
+                keys = {}
+                if event is not None and reuse:
+                    missing = []
+                    for name in names:
+                        module = stage_module(name)
+                        keys[name] = stage_version(module) + partition_key(stage_tables(module, tables))
+                        cached = load_partial(name, season, event, keys[name], data_dir)
+                        if cached is None:
+                            missing.append(name)
+                        else:
+                            partials[(season, name)].append((index, cached))
+                    names = missing
+                if names:
+                    futures[pool.submit(run_partition, names, tables, settings())] = (season, index, event, keys)
+                if len(futures) >= in_flight:
+                    collect(wait(futures, return_when=FIRST_COMPLETED).done)
+        collect(wait(futures).done)
+
+    written = []
+    for season in seasons:
+        season_dir = output_dir if len(seasons) == 1 else os.path.join(output_dir, str(season))
+        os.makedirs(season_dir, exist_ok=True)
+        specs = []
+        for name in stage_names:
+            module = stage_module(name)
+            stage_partials = [partial for _, partial in sorted(partials[(season, name)], key=lambda item: item[0])]
+            result = module.finalize(stage_partials)
+            path = os.path.join(season_dir, module.OUTPUT)
+            # lap_consistency_pit_stops.csv keeps Driver as its index, like the script
+            result.to_csv(path, index=result.index.name is not None)
+            written.append(path)
+
+            # Charts drawn from lap-level data are left to the scripts themselves
+            if charts and hasattr(module, 'charts'):
+                specs.extend(module.charts(result, stage_partials))
+
+        render(specs, workers, charts_dir if len(seasons) == 1 else os.path.join(charts_dir, str(season)))
+    return written
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the analysis stages over one or more seasons in parallel.')
+    parser.add_argument('--seasons', nargs='+', type=int, default=[2024])
+    parser.add_argument('--stages', nargs='+', choices=sorted(STAGES), default=sorted(STAGES))
+    parser.add_argument('--partition', choices=['event', 'season'], default='event')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per core)')
+    parser.add_argument('--stream', action='store_true', help='read the laps in bounded chunks for laps-only stages')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    parser.add_argument('--charts', action='store_true', help='also render the charts drawn from the outputs')
+    parser.add_argument('--charts-dir', default=CHARTS_DIR)
+    parser.add_argument('--full', action='store_true', help='recompute every event instead of reusing stored partials')
+    parser.add_argument('--data-dir', default=DATASET_DIR)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+
+    paths = run(args.stages, args.seasons, args.data_dir, args.output_dir, args.partition, args.workers,
+                not args.full, args.stream, args.chunk_rows, args.charts, args.charts_dir)
+    for path in paths:
+        print(f"Saved {path}")
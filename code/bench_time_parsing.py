@@ -0,0 +1,83 @@
+import time
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+
+from time_parsing import to_seconds, to_timedelta
+
+
+# Row-by-row parser formerly used by position_due_pitstops.py
+def parse_custom_time(time_str):
+    if pd.isna(time_str):
+        return pd.NaT
+    try:
+        days, time = time_str.split(' days ')
+        hours, minutes, seconds = time.split(':')
+        seconds, microseconds = seconds.split('.')
+
+        return timedelta(
+            days=int(days),
+            hours=int(hours),
+            minutes=int(minutes),
+            seconds=int(seconds),
+            microseconds=int(microseconds)
+        )
+    except ValueError:
+        return pd.NaT
+
+
+# Row-by-row parser formerly used by lap_time_analysis.py
+def lap_time_to_seconds(lap_time):
+    if pd.isna(lap_time):
+        return np.nan
+    if isinstance(lap_time, str):
+        time_str = lap_time.split(' ', 2)[-1]
+        hours, minutes, seconds = time_str.split(':')
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    elif isinstance(lap_time, (int, float)):
+        return lap_time
+    else:
+        return np.nan
+
+
+# Session times in the FastF1 export format, with some missing values mixed in
+def make_time_strings(n, missing_share=0.02, seed=0):
+    rng = np.random.default_rng(seed)
+    times = pd.Series(pd.to_timedelta(rng.uniform(0, 3 * 3600, n), unit='s').round('us'))
+    strings = times.astype(str).astype(object)
+    strings[rng.random(n) < missing_share] = np.nan
+    return strings
+
+
+def best_of(func, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    print(f"{'rows':>10} {'parser':<28} {'seconds':>10} {'speedup':>8}")
+    for n in [10_000, 100_000, 1_000_000]:
+        strings = make_time_strings(n)
+
+        # Check that both implementations agree before timing them
+        expected = strings.apply(lap_time_to_seconds)
+        assert np.allclose(to_seconds(strings), expected, equal_nan=True)
+        # parse_custom_time returns NaT for whole-second values, so compare where it parsed
+        legacy = pd.to_timedelta(strings.apply(parse_custom_time)).astype('timedelta64[ns]')
+        parsed = legacy.notna()
+        assert to_timedelta(strings)[parsed].equals(legacy[parsed])
+
+        results = [
+            ('parse_custom_time (.apply)', best_of(lambda: strings.apply(parse_custom_time), repeat=1)),
+            ('lap_time_to_seconds (.apply)', best_of(lambda: strings.apply(lap_time_to_seconds), repeat=1)),
+            ('time_parsing.to_timedelta', best_of(lambda: to_timedelta(strings))),
+            ('time_parsing.to_seconds', best_of(lambda: to_seconds(strings))),
+        ]
+        baseline = results[0][1]
+        for name, seconds in results:
+            print(f'{n:>10} {name:<28} {seconds:>10.4f} {baseline / seconds:>7.1f}x')
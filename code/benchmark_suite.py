@@ -0,0 +1,140 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+import lap_consistency_pit_stops
+import position_due_pitstops
+import race_length_stats
+import tire_delta_analysis
+import weather_tire_analysis
+from data_store import SOURCE_FILES, load_table
+from pit_stops import extract_pit_stops
+from synthetic_season import write_season
+
+SCALES = [1, 10, 100]
+REPORT_DIR = '../benchmarks'
+
+
+def load_tables(data_dir):
+    return {table: load_table(table, data_dir=data_dir) for table in SOURCE_FILES}
+
+
+# Each stage runs on the tables exactly as the analyses load them; 'load' reads
+# all four tables back from the columnar cache built by the first load
+STAGES = {
+    'load': lambda data_dir, tables: load_tables(data_dir),
+    'pit_detection': lambda data_dir, tables: extract_pit_stops(tables['laps']),
+    'tyre_delta': lambda data_dir, tables: tire_delta_analysis.finalize(
+        [tire_delta_analysis.summarize(tables['laps'])]),
+    'weather_merge': lambda data_dir, tables: weather_tire_analysis.finalize(
+        [weather_tire_analysis.summarize(tables['laps'], tables['weather'])]),
+    'position_change': lambda data_dir, tables: position_due_pitstops.summarize(
+        tables['laps'], tables['positions']),
+    'consistency': lambda data_dir, tables: lap_consistency_pit_stops.finalize(
+        [lap_consistency_pit_stops.summarize(tables['laps'])]),
+    'race_length': lambda data_dir, tables: race_length_stats.finalize(
+        [race_length_stats.summarize(tables['laps'])]),
+}
+
+
+# Best wall-clock time over `repeat` runs, then one more run under tracemalloc
+# for the peak memory allocated by the stage (tracing slows it down too much to time)
+def measure(stage, data_dir, tables, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        stage(data_dir, tables)
+        timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    stage(data_dir, tables)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(timings), peak / 2 ** 20
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(scales=SCALES, stages=None, repeat=3, seed=0, position_interval=5.0, data_root=None):
+    stages = stages or list(STAGES)
+    results = []
+    for scale in scales:
+        with tempfile.TemporaryDirectory(dir=data_root) as data_dir:
+            rows = write_season(data_dir, scale=scale, seed=seed, position_interval=position_interval)
+            tables = load_tables(data_dir)
+            for name in stages:
+                seconds, peak_mb = measure(STAGES[name], data_dir, tables, repeat)
+                results.append({'scale': scale, 'stage': name, 'seconds': seconds, 'peak_mb': peak_mb})
+                print(f"{scale:>6}x {name:<16} {seconds:>10.3f} s {peak_mb:>10.1f} MB", flush=True)
+            for result in results:
+                if result['scale'] == scale:
+                    result['rows'] = rows
+    return {
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+# Stages that got slower than `tolerance` times their time in a previous report
+def regressions(report, previous, tolerance=1.2):
+    before = {(r['scale'], r['stage']): r['seconds'] for r in previous['results']}
+    slower = []
+    for result in report['results']:
+        key = (result['scale'], result['stage'])
+        if key in before and result['seconds'] > tolerance * before[key]:
+            slower.append({**result, 'previous_seconds': before[key], 'ratio': result['seconds'] / before[key]})
+    return slower
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time and memory-profile the analysis stages on synthetic seasons.')
+    parser.add_argument('--scales', nargs='+', type=float, default=SCALES)
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--position-interval', type=float, default=5.0, help='seconds between position samples')
+    parser.add_argument('--data-root', default=None, help='where to write the synthetic CSVs (default: system temp)')
+    parser.add_argument('--output', default=None, help='report path (default: ../benchmarks/<commit>_<time>.json)')
+    parser.add_argument('--compare', default=None, help='previous report to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=1.2, help='slowdown ratio counted as a regression')
+    args = parser.parse_args()
+
+    report = run_benchmarks(args.scales, args.stages, args.repeat, args.seed, args.position_interval, args.data_root)
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+        output = os.path.join(REPORT_DIR, f"{report['commit'] or 'unknown'}_{stamp}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            slower = regressions(report, json.load(f), args.tolerance)
+        for result in slower:
+            print(f"REGRESSION {result['scale']}x {result['stage']}: "
+                  f"{result['previous_seconds']:.3f} s -> {result['seconds']:.3f} s ({result['ratio']:.2f}x)")
+        sys.exit(1 if slower else 0)
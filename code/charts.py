@@ -0,0 +1,94 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import pandas as pd
+
+from profiling import FORMATS, enable, span
+
+FONT_PATH = '../fonts/JetBrainsMono-Regular.ttf'
+# Where charts are saved unless render() is given another directory
+CHARTS_DIR = '../charts'
+
+_charts_dir = CHARTS_DIR
+
+# Charts are only ever written to files, so never start a GUI backend
+os.environ.setdefault('MPLBACKEND', 'Agg')
+
+
+# Register JetBrains Mono with matplotlib once per process and share one
+# FontProperties for it. Workers forked after the first call inherit both.
+@lru_cache(maxsize=None)
+def load_font():
+    from matplotlib import font_manager
+    font_manager.fontManager.addfont(FONT_PATH)
+    return font_manager.FontProperties(fname=FONT_PATH)
+
+
+# Plot categoricals as plain labels: seaborn orders a categorical axis by its
+# categories, while the charts expect the row order of the data they are given
+def _plain(value):
+    if isinstance(value, pd.DataFrame):
+        categorical = value.select_dtypes('category').columns
+        return value.astype({column: object for column in categorical})
+    return value
+
+
+# A queued chart: a module-level drawing function and its arguments
+def chart(function, *args, **kwargs):
+    return function, tuple(_plain(arg) for arg in args), {key: _plain(arg) for key, arg in kwargs.items()}
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+    load_font()
+
+
+# Path to save a chart file at, in the directory of the chart being drawn
+def chart_path(filename):
+    return os.path.join(_charts_dir, filename)
+
+
+# Draw one chart into charts_dir with its own copy of rcParams, so styles set
+# by one chart do not leak into the next one drawn by the same process
+def _draw(function, args, kwargs, charts_dir=CHARTS_DIR):
+    global _charts_dir
+    import matplotlib.pyplot as plt
+    os.makedirs(charts_dir, exist_ok=True)
+    _charts_dir = charts_dir
+    with plt.rc_context():
+        function(*args, **kwargs)
+    plt.close('all')
+
+
+# Render queued charts into charts_dir over a process pool, or in process when
+# only one worker would run
+def render(specs, workers=None, charts_dir=CHARTS_DIR):
+    specs = list(specs)
+    if not specs:
+        return
+    with span('render_charts', len(specs)):
+        load_font()
+        workers = min(len(specs), workers or os.cpu_count() or 1)
+        if workers == 1:
+            for spec in specs:
+                _draw(*spec, charts_dir)
+            return
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            for future in [pool.submit(_draw, *spec, charts_dir) for spec in specs]:
+                future.result()
+
+
+# Command line shared by the analysis scripts
+def parse_args(description=None):
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument('--no-charts', dest='charts', action='store_false', help='write the CSV output only')
+    parser.add_argument('--chart-workers', type=int, default=None, help='chart rendering processes (default: one per core)')
+    parser.add_argument('--profile', choices=FORMATS, default=None,
+                        help='record stage timings and write them on exit (also F1_PROFILE=json|folded)')
+    args = parser.parse_args()
+    if args.profile:
+        enable(args.profile)
+    return args
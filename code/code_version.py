@@ -0,0 +1,50 @@
+import ast
+import hashlib
+import os
+
+from data_store import file_hash
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Imports already parsed in this process, by path, size and mtime
+_imports = {}
+
+
+# Names of the modules a source file imports (absolute imports only)
+def parse_imports(path):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _imports:
+        with open(path) as f:
+            tree = ast.parse(f.read())
+        modules = set()
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                modules.update(alias.name for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                modules.add(node.module)
+        _imports[key] = sorted(modules)
+    return _imports[key]
+
+
+# Source files of a module and of every module of the same directory it
+# imports, directly or through another one. `imports` gives the modules a file
+# imports; callers keeping their own record of them can pass it in.
+def code_files(module_name, directory=CODE_DIR, imports=parse_imports):
+    files, pending = set(), [module_name]
+    while pending:
+        path = os.path.join(directory, f'{pending.pop()}.py')
+        if path in files or not os.path.exists(path):
+            continue
+        files.add(path)
+        pending.extend(imports(path))
+    return sorted(files)
+
+
+# Hash of a module's code and of every local module it imports, so that
+# editing a helper changes the version of each module built on it
+def code_version(module_name, directory=CODE_DIR):
+    digest = hashlib.sha1()
+    for path in code_files(module_name, directory):
+        digest.update(f'{os.path.basename(path)}:{file_hash(path)}'.encode())
+    return digest.hexdigest()[:8]
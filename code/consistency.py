@@ -0,0 +1,246 @@
+import math
+from collections import deque
+
+import numpy as np
+import pandas as pd
+from charts import parse_args
+from data_store import load_laps
+from pit_stops import LAP_COLUMNS
+from profiling import profiled
+from time_parsing import to_seconds
+
+# Tables and columns this analysis reads
+TABLES = {'laps': LAP_COLUMNS + ['LapTime', 'TrackStatus']}
+OUTPUT = 'consistency.csv'
+
+KEYS = ['EventName', 'Driver', 'Stint']
+
+# Laps in the rolling window whose median predicts the next lap, and the
+# fewest timed laps a window needs
+WINDOW = 5
+MIN_LAPS = 3
+
+# A lap is an outlier when its residual (the lap time minus the median of the
+# window before it) is further than MAD_LIMIT robust standard deviations
+# (1.4826 * MAD) from zero. The MAD is taken over the stint's last
+# SCALE_WINDOW residuals, not over the few laps of one window: with 3-5 laps
+# the scale is so noisy that a 3-sigma rule flags one lap in seven of pure
+# Gaussian noise. The cap keeps each live update constant time however long
+# the stint runs. A stint needs MIN_RESIDUALS residuals before laps are
+# tested, and with m of them the limit is widened by 1 + SMALL_SAMPLE / (m - 1),
+# which keeps the false positive rate near that of a 3-sigma rule with a
+# known scale. The scale never drops below MIN_SCALE seconds, so a run of
+# identical laps does not turn the next tenth of a second into an outlier.
+MAD_LIMIT = 3.0
+MAD_SCALE = 1.4826
+SCALE_WINDOW = 20
+MIN_RESIDUALS = 6
+SMALL_SAMPLE = 6.0
+MIN_SCALE = 0.1
+
+# Track status digits of a neutralised lap: safety car, red flag, virtual
+# safety car and its ending
+NEUTRAL_STATUS = '4567'
+
+
+# Why one lap is left out of the statistics: '' for a racing lap, or pit_in,
+# pit_out, start, neutralised or no_time, in that order of precedence
+def flag_lap(lap_number, lap_time, pit_in, pit_out, track_status):
+    if pit_in is not None:
+        return 'pit_in'
+    if pit_out is not None:
+        return 'pit_out'
+    if lap_number == 1:
+        return 'start'
+    if track_status is not None and any(code in str(track_status) for code in NEUTRAL_STATUS):
+        return 'neutralised'
+    if lap_time is None:
+        return 'no_time'
+    return ''
+
+
+# flag_lap() for every lap of a frame at once
+def flag_laps(laps, seconds):
+    status = laps['TrackStatus'].astype(str).str.contains(f'[{NEUTRAL_STATUS}]').fillna(False).to_numpy(dtype=bool)
+    return np.select(
+        [
+            laps['PitInTime'].notna().to_numpy(),
+            laps['PitOutTime'].notna().to_numpy(),
+            (laps['LapNumber'] == 1).to_numpy(),
+            status & laps['TrackStatus'].notna().to_numpy(),
+            np.isnan(seconds),
+        ],
+        ['pit_in', 'pit_out', 'start', 'neutralised', 'no_time'],
+        '',
+    )
+
+
+# Largest residual a lap may have given the MAD of `count` earlier residuals
+def outlier_limit(mad, count):
+    return MAD_LIMIT * (1 + SMALL_SAMPLE / (count - 1)) * np.fmax(MAD_SCALE * mad, MIN_SCALE)
+
+
+def is_outlier(residual, mad, count):
+    return count >= MIN_RESIDUALS and abs(residual) > outlier_limit(mad, count)
+
+
+# Rolling median over the last `window` laps of every stint, the residual of
+# each lap against the window before it, the MAD of the stint's last
+# SCALE_WINDOW residuals and the flag of every lap, from (lap, window) and
+# (residual, SCALE_WINDOW) matrices. Laps left out of the statistics are NaN
+# in the lap matrix, so a window may hold fewer timed laps than it spans; with
+# fewer than MIN_LAPS it gives NaN.
+# Each lap is tested against the window and residuals before it, so a lap is
+# judged on the same history whether the stint is processed whole or lap by lap.
+def lap_consistency(laps, window=WINDOW):
+    laps = laps.sort_values(KEYS + ['LapNumber'], kind='stable')
+    seconds = to_seconds(laps['LapTime']).to_numpy(dtype=float)
+    flag = flag_laps(laps, seconds)
+    values = np.where(flag == '', seconds, np.nan)
+
+    # Row of the first lap of each lap's stint, so windows stop at stint boundaries
+    n = len(laps)
+    keys = laps[KEYS].astype(object).to_numpy()
+    new_stint = np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)] if n else np.zeros(0, dtype=bool)
+    first = np.maximum.accumulate(np.where(new_stint, np.arange(n), 0))
+
+    def trailing(values, span, first):
+        rows = np.arange(len(values))[:, None] - np.arange(span - 1, -1, -1)[None, :]
+        return np.where(rows >= first[:, None], values[rows.clip(0, None)], np.nan)
+
+    def previous(values):
+        return np.where(new_stint, np.nan, np.r_[np.nan, values[:-1]])
+
+    matrix = trailing(values, window, first)
+    enough = (~np.isnan(matrix)).sum(axis=1) >= MIN_LAPS
+    median = np.full(n, np.nan)
+    median[enough] = np.nanmedian(matrix[enough], axis=1)
+
+    # Residuals against the window before each lap. The scale comes from the
+    # stint's last SCALE_WINDOW residuals, so the laps that have one are taken
+    # on their own (row k of `deviations` ends at the k-th residual) and each
+    # lap gets the MAD and count of the last residual up to it in its stint.
+    residual = values - previous(median)
+    rows = np.flatnonzero(~np.isnan(residual))
+    count = np.zeros(n, dtype=int)
+    mad = np.full(n, np.nan)
+    if len(rows):
+        stint = np.cumsum(new_stint) - 1
+        residual_stint = stint[rows]
+        starts = np.r_[True, residual_stint[1:] != residual_stint[:-1]]
+        residual_first = np.maximum.accumulate(np.where(starts, np.arange(len(rows)), 0))
+        deviations = trailing(np.abs(residual[rows]), SCALE_WINDOW, residual_first)
+        last = np.cumsum(~np.isnan(residual)) - 1
+        known = (last >= 0) & (residual_stint[last.clip(0, None)] == stint)
+        count[known] = np.minimum(last[known] - residual_first[last[known]] + 1, SCALE_WINDOW)
+        mad[known] = np.nanmedian(deviations, axis=1)[last[known]]
+
+    previous_count = np.where(new_stint, 0, np.r_[0, count[:-1]])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        limit = outlier_limit(previous(mad), previous_count)
+    outlier = (previous_count >= MIN_RESIDUALS) & (np.abs(residual) > limit)
+    flag = np.where(outlier, 'outlier', flag)
+
+    return laps.assign(LapTimeSeconds=seconds, RollingMedian=median, Residual=residual, ResidualMAD=mad, Flag=flag)
+
+
+# Statistics of every stint from its racing laps, outliers excluded
+@profiled()
+def summarize(laps):
+    lap_df = lap_consistency(laps)
+    clean = lap_df[lap_df['Flag'] == '']
+    deviation = (clean['LapTimeSeconds'] - clean.groupby(KEYS, observed=True)['LapTimeSeconds'].transform('median')).abs()
+
+    stint_stats = lap_df.assign(Outlier=lap_df['Flag'] == 'outlier').groupby(KEYS, observed=True).agg(
+        Compound=('Compound', 'first'),
+        Laps=('LapNumber', 'size'),
+        Outliers=('Outlier', 'sum'),
+    )
+    clean_stats = clean.groupby(KEYS, observed=True)['LapTimeSeconds'].agg(
+        CleanLaps='count', Median='median', Mean='mean', Std='std')
+    clean_stats['MAD'] = deviation.groupby([clean[key] for key in KEYS], observed=True).median()
+    stint_stats = stint_stats.join(clean_stats)
+    stint_stats['CleanLaps'] = stint_stats['CleanLaps'].fillna(0).astype(int)
+    stint_stats['RobustStd'] = MAD_SCALE * stint_stats['MAD']
+    return stint_stats.reset_index()
+
+
+@profiled()
+def finalize(partials):
+    stint_stats = pd.concat(partials, ignore_index=True)
+    return stint_stats.sort_values(KEYS).reset_index(drop=True)
+
+
+# Rolling state of one stint
+class StintWindow:
+    __slots__ = ['values', 'median', 'residuals', 'mad', 'outliers', 'count', 'total', 'total_sq']
+
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        self.median = math.nan
+        self.residuals = deque(maxlen=SCALE_WINDOW)
+        self.mad = math.nan
+        self.outliers = 0
+        self.count = 0
+        self.total = 0.0
+        self.total_sq = 0.0
+
+    # Sample standard deviation of the racing laps so far, outliers excluded
+    def std(self):
+        if self.count < 2:
+            return math.nan
+        return math.sqrt(max(self.total_sq - self.total * self.total / self.count, 0.0) / (self.count - 1))
+
+
+# lap_consistency() lap by lap, for laps arriving live. Laps of a stint must
+# arrive in order; the flags and rolling numbers match the batch ones. An
+# update costs the same however long the stint: both medians are over at most
+# `window` laps and SCALE_WINDOW residuals.
+class ConsistencyTracker:
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.stints = {}
+
+    def stint(self, key):
+        state = self.stints.get(key)
+        if state is None:
+            state = self.stints[key] = StintWindow(self.window)
+        return state
+
+    # Add one lap of the (event, driver, stint) `key`, flagged by flag_lap().
+    # Returns the lap's flag, 'outlier' when a racing lap strays too far from
+    # the window before it.
+    def update(self, key, lap_time, flag=''):
+        state = self.stint(key)
+        if not flag and state.median == state.median:
+            residual = lap_time - state.median
+            if is_outlier(residual, state.mad, len(state.residuals)):
+                flag = 'outlier'
+            # Outliers count towards the residuals and stay in the window, as in the batch matrices
+            state.residuals.append(abs(residual))
+            state.mad = float(np.median(state.residuals))
+
+        state.values.append(lap_time if flag in ('', 'outlier') else math.nan)
+        if flag == 'outlier':
+            state.outliers += 1
+        elif not flag:
+            state.count += 1
+            state.total += lap_time
+            state.total_sq += lap_time * lap_time
+
+        timed = [value for value in state.values if value == value]
+        state.median = float(np.median(timed)) if len(timed) >= MIN_LAPS else math.nan
+        return flag
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Load the data
+    lap_data = load_laps(columns=TABLES['laps'])
+
+    stint_stats = finalize([summarize(lap_data)])
+    stint_stats.to_csv('../csv_generated/consistency.csv', index=False)
+
+    print("Analysis complete. Results saved to 'consistency.csv'.")
@@ -0,0 +1,298 @@
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+from profiling import span
+from time_parsing import to_timedelta
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+DATASET_DIR = '../dataset'
+
+# Rows per chunk when streaming a table
+CHUNK_ROWS = 500_000
+
+# Rows per row group of the columnar cache. The exports keep each event's rows
+# together, so with small row groups a filter on EventName skips most of the file.
+ROW_GROUP_ROWS = 50_000
+
+# Source CSV for each table, by season
+SOURCE_FILES = {
+    'laps': 'lap_{season}.csv',
+    'positions': 'position_{season}.csv',
+    'weather': 'weather_{season}.csv',
+    'results': 'result_{season}.csv',
+}
+
+# The 2024 position export was published with a letter O in the year
+LEGACY_FILES = {
+    ('positions', 2024): 'position_2O24.csv',
+}
+
+
+# Compact dtypes applied at load time: low-cardinality strings become
+# categoricals, counters small integers (float32 when the column has gaps) and
+# session times timedelta64[ns]. Measurements the analyses write out (weather,
+# speed traps) stay float64, since float32 would print 44.3 as
+# 44.29999923706055; only the car coordinates, by far the largest columns and
+# never written out, are float32. Columns not listed keep the dtype read_csv infers.
+CATEGORY = 'category'
+TIMEDELTA = 'timedelta64[ns]'
+
+SCHEMAS = {
+    'laps': {
+        'Time': TIMEDELTA,
+        'Driver': CATEGORY,
+        'DriverNumber': 'int16',
+        'LapTime': TIMEDELTA,
+        'LapNumber': 'int16',
+        'Stint': 'int8',
+        'PitOutTime': TIMEDELTA,
+        'PitInTime': TIMEDELTA,
+        'Sector1Time': TIMEDELTA,
+        'Sector2Time': TIMEDELTA,
+        'Sector3Time': TIMEDELTA,
+        'Sector1SessionTime': TIMEDELTA,
+        'Sector2SessionTime': TIMEDELTA,
+        'Sector3SessionTime': TIMEDELTA,
+        'SpeedI1': 'float64',
+        'SpeedI2': 'float64',
+        'SpeedFL': 'float64',
+        'SpeedST': 'float64',
+        'Compound': CATEGORY,
+        'TyreLife': 'int16',
+        'Team': CATEGORY,
+        'LapStartTime': TIMEDELTA,
+        'Position': 'int8',
+        'EventName': CATEGORY,
+    },
+    'positions': {
+        'Time': TIMEDELTA,
+        'SessionTime': TIMEDELTA,
+        'X': 'float32',
+        'Y': 'float32',
+        'Z': 'float32',
+        'Status': CATEGORY,
+        'DriverName': CATEGORY,
+        'EventName': CATEGORY,
+    },
+    'weather': {
+        'Time': TIMEDELTA,
+        'AirTemp': 'float64',
+        'Humidity': 'float64',
+        'Pressure': 'float64',
+        'TrackTemp': 'float64',
+        'WindDirection': 'int16',
+        'WindSpeed': 'float64',
+        'EventName': CATEGORY,
+    },
+    'results': {
+        'DriverNumber': 'int16',
+        'Abbreviation': CATEGORY,
+        'TeamName': CATEGORY,
+        'Status': CATEGORY,
+        'EventName': CATEGORY,
+    },
+}
+
+
+def apply_schema(df, table):
+    for column, dtype in SCHEMAS[table].items():
+        if column not in df:
+            continue
+        values = df[column]
+        if dtype == TIMEDELTA:
+            df[column] = to_timedelta(values)
+        elif dtype.startswith('int') and values.isna().any():
+            df[column] = values.astype('float32')
+        else:
+            df[column] = values.astype(dtype)
+    return df
+
+
+def source_path(table, season=2024, data_dir=DATASET_DIR):
+    path = os.path.join(data_dir, SOURCE_FILES[table].format(season=season))
+    legacy = LEGACY_FILES.get((table, season))
+    if legacy and not os.path.exists(path):
+        path = os.path.join(data_dir, legacy)
+    return path
+
+
+# Content hashes already computed in this process, by path, size and mtime
+_file_hashes = {}
+
+
+def file_hash(path, block_size=1 << 20):
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _file_hashes:
+        digest = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(block_size), b''):
+                digest.update(block)
+        _file_hashes[key] = digest.hexdigest()[:16]
+    return _file_hashes[key]
+
+
+# The cache is keyed on the source file and on the schema and layout it was written with
+def cache_path(table, season=2024, data_dir=DATASET_DIR):
+    source = source_path(table, season, data_dir)
+    layout = f'{file_hash(source)}{sorted(SCHEMAS[table].items())}{ROW_GROUP_ROWS}'
+    key = hashlib.sha1(layout.encode()).hexdigest()[:16]
+    name = f'{table}_{season}_{key}.parquet'
+    return os.path.join(data_dir, '.cache', name)
+
+
+# Marker left next to a cache that could not be written, keyed like the cache,
+# so a new source file or schema gets a fresh attempt
+def failed_path(target):
+    return f'{target[:-len(".parquet")]}.failed'
+
+
+def _build_cache(table, source, target):
+    df = apply_schema(pd.read_csv(source, low_memory=False), table)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    # Drop caches (and failure markers) built from older versions of the same source file
+    prefix = os.path.basename(target).rsplit('_', 1)[0] + '_'
+    for name in os.listdir(os.path.dirname(target)):
+        stale = name.startswith(prefix) and name.endswith(('.parquet', '.failed'))
+        if stale and name not in (os.path.basename(target), os.path.basename(failed_path(target))):
+            try:
+                os.remove(os.path.join(os.path.dirname(target), name))
+            except FileNotFoundError:
+                pass
+
+    # Write to a temporary file first so concurrent readers never see a partial cache
+    tmp = f'{target}.{os.getpid()}.tmp'
+    try:
+        df.to_parquet(tmp, index=False, row_group_size=ROW_GROUP_ROWS)
+    except (TypeError, ValueError):
+        # Columns pyarrow cannot type are left uncached; callers fall back to the
+        # CSV, and the marker stops every later load from trying again
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        open(failed_path(target), 'w').close()
+        return False
+    os.replace(tmp, target)
+    return True
+
+
+# Column names of a table, read from the CSV header only
+def table_columns(table, season=2024, data_dir=DATASET_DIR):
+    return list(pd.read_csv(source_path(table, season, data_dir), nrows=0).columns)
+
+
+# Path of a table's columnar cache, built first if needed; None without pyarrow
+# or when the table cannot be cached
+def cached_table(table, season=2024, data_dir=DATASET_DIR):
+    if pyarrow is None:
+        return None
+    target = cache_path(table, season, data_dir)
+    if os.path.exists(failed_path(target)):
+        return None
+    if os.path.exists(target) or _build_cache(table, source_path(table, season, data_dir), target):
+        return target
+    return None
+
+
+def load_table(table, season=2024, columns=None, data_dir=DATASET_DIR):
+    with span(f'load:{table}') as record:
+        target = cached_table(table, season, data_dir)
+        if target is not None:
+            df = pd.read_parquet(target, columns=columns)
+        else:
+            df = apply_schema(pd.read_csv(source_path(table, season, data_dir), usecols=columns, low_memory=False), table)
+            # usecols keeps the file's column order; the cache returns them as asked
+            df = df if columns is None else df[columns]
+        record.rows = len(df)
+    return df
+
+
+# Stream a table in chunks of at most chunk_rows rows without ever holding the
+# whole file. An existing columnar cache is read batch by batch; otherwise the
+# CSV is read in chunks (the cache is not built here, as that needs the full file).
+def iter_table(table, season=2024, columns=None, chunk_rows=CHUNK_ROWS, data_dir=DATASET_DIR):
+    source = source_path(table, season, data_dir)
+    if pyarrow is not None:
+        target = cache_path(table, season, data_dir)
+        if os.path.exists(target):
+            for batch in pyarrow.parquet.ParquetFile(target).iter_batches(batch_size=chunk_rows, columns=columns):
+                yield batch.to_pandas()
+            return
+    for chunk in pd.read_csv(source, usecols=columns, chunksize=chunk_rows):
+        yield apply_schema(chunk, table)
+
+
+# Re-cut a stream of chunks so the rows of one key (e.g. one driver's race) are
+# never split over two chunks. The last run of rows in each chunk is held back
+# and prepended to the next one. Rows of a key must be contiguous in the file, as
+# in the FastF1 lap exports (driver after driver within each event).
+def align_chunks(chunks, keys):
+    seen = set()
+    carry = None
+    for chunk in chunks:
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        hashes = pd.util.hash_pandas_object(chunk[keys], index=False).to_numpy()
+        starts = np.flatnonzero(np.r_[True, hashes[1:] != hashes[:-1]])
+        last = starts[-1]
+
+        complete = set(hashes[starts[:-1]].tolist())
+        if len(complete) < len(starts) - 1 or not seen.isdisjoint(complete):
+            raise ValueError(f'rows are not grouped by {", ".join(keys)}; load the table whole instead')
+        seen |= complete
+
+        carry = chunk.iloc[last:]
+        if last > 0:
+            yield chunk.iloc[:last]
+    if carry is not None and len(carry):
+        if int(hashes[-1]) in seen:
+            raise ValueError(f'rows are not grouped by {", ".join(keys)}; load the table whole instead')
+        yield carry
+
+
+def load_laps(columns=None, season=2024, data_dir=DATASET_DIR):
+    return load_table('laps', season, columns, data_dir)
+
+
+def load_positions(columns=None, season=2024, data_dir=DATASET_DIR):
+    return load_table('positions', season, columns, data_dir)
+
+
+def load_weather(columns=None, season=2024, data_dir=DATASET_DIR):
+    return load_table('weather', season, columns, data_dir)
+
+
+def load_results(columns=None, season=2024, data_dir=DATASET_DIR):
+    return load_table('results', season, columns, data_dir)
+
+
+# Resident memory of each table as read_csv infers it and with the compact schema
+def memory_report(season=2024, data_dir=DATASET_DIR):
+    rows = []
+    for table in SOURCE_FILES:
+        source = source_path(table, season, data_dir)
+        if not os.path.exists(source):
+            continue
+        raw = pd.read_csv(source, low_memory=False)
+        raw_bytes = raw.memory_usage(deep=True).sum()
+        compact_bytes = apply_schema(raw, table).memory_usage(deep=True).sum()
+        rows.append({
+            'Table': table,
+            'Rows': len(raw),
+            'RawMB': raw_bytes / 2 ** 20,
+            'CompactMB': compact_bytes / 2 ** 20,
+            'Ratio': raw_bytes / compact_bytes,
+        })
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    print(memory_report().to_string(index=False, float_format='{:.2f}'.format))
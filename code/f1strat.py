@@ -0,0 +1,123 @@
+import argparse
+import os
+import sys
+import time
+
+# Scripts and charts use paths relative to this directory
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(CODE_DIR, '..', 'dataset')
+OUTPUT_DIR = os.path.join(CODE_DIR, '..', 'csv_generated')
+CHARTS_DIR = os.path.join(CODE_DIR, '..', 'charts')
+
+# Short names for groups of stages; any stage name of batch_runner works too
+ANALYSES = {
+    'pit': ['pit_stops', 'pit_stops_vs_position', 'position_changes', 'undercut'],
+    'tyre': ['average_positions', 'starting_tire', 'tire_compound', 'tire_delta', 'tyre_model'],
+    'weather': ['weather', 'track_status'],
+    'laps': ['consistency', 'lap_consistency', 'lap_times', 'race_length'],
+    'race': ['leaderboard', 'undercut'],
+}
+
+
+# Stage names for a comma-separated list of analyses and stages, in order, once each
+def resolve(analyses, stages):
+    names = []
+    for analysis in analyses.split(','):
+        analysis = analysis.strip()
+        if analysis == 'all':
+            selected = sorted(stages)
+        elif analysis in ANALYSES:
+            selected = ANALYSES[analysis]
+        elif analysis in stages:
+            selected = [analysis]
+        else:
+            raise ValueError(f"unknown analysis {analysis!r}; expected all, {', '.join(ANALYSES)} or a stage name")
+        names.extend(name for name in selected if name not in names)
+    return names
+
+
+# Run the stages in this process on tables loaded once: every table is read
+# with the union of the columns the stages need and handed to each of them.
+# Holding every lap, it also draws the charts stages make from lap-level data
+# (their lap_charts()). Charts go to charts_dir, by default the repo's charts/
+# next to its csv_generated/ and <output_dir>/charts for any other output_dir,
+# so runs for other seasons or checkouts do not overwrite the repo's charts.
+# Plotting libraries are only imported when charts are drawn.
+def run(names, season=2024, data_dir=DATA_DIR, output_dir=OUTPUT_DIR, charts=True, chart_workers=None,
+        charts_dir=None):
+    from batch_runner import stage_module, stage_tables, wanted_columns
+    from charts import render
+    from data_store import load_table
+
+    tables = {table: load_table(table, season, columns, data_dir) for table, columns in wanted_columns(names).items()}
+    os.makedirs(output_dir, exist_ok=True)
+
+    specs = []
+    timings = {}
+    for name in names:
+        start = time.perf_counter()
+        module = stage_module(name)
+        partials = [module.summarize(**stage_tables(module, tables))]
+        result = module.finalize(partials)
+        # lap_consistency_pit_stops.csv and external_events.csv keep their index, like the scripts
+        result.to_csv(os.path.join(output_dir, module.OUTPUT), index=result.index.name is not None)
+        timings[name] = time.perf_counter() - start
+        if charts and hasattr(module, 'charts'):
+            specs.extend(module.charts(result, partials))
+        if charts and hasattr(module, 'lap_charts'):
+            specs.extend(module.lap_charts(**stage_tables(module, tables), season=season, data_dir=data_dir))
+
+    if charts_dir is None:
+        default = os.path.abspath(output_dir) == os.path.abspath(OUTPUT_DIR)
+        charts_dir = CHARTS_DIR if default else os.path.join(output_dir, 'charts')
+    render(specs, chart_workers, charts_dir)
+    return timings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(prog='f1strat', description='Run the F1 strategy analyses in one process.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='run analyses on a season')
+    run_parser.add_argument('--season', type=int, default=2024)
+    run_parser.add_argument('--analyses', default='all',
+                            help=f"comma-separated: all, {', '.join(ANALYSES)} or stage names (default: all)")
+    run_parser.add_argument('--data-dir', default=DATA_DIR)
+    run_parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    run_parser.add_argument('--no-charts', dest='charts', action='store_false', help='write the CSV outputs only')
+    run_parser.add_argument('--chart-workers', type=int, default=None)
+    run_parser.add_argument('--charts-dir', default=None,
+                            help='where to save the charts (default: charts/, or charts/ in --output-dir when given)')
+    run_parser.add_argument('--profile', choices=('json', 'folded'), default=None,
+                            help='record stage timings and write them on exit (also F1_PROFILE=json|folded)')
+
+    commands.add_parser('list', help='list the analyses and their stages')
+    args = parser.parse_args()
+
+    # Directories given on the command line are relative to where it was typed
+    data_dir = os.path.abspath(getattr(args, 'data_dir', DATA_DIR))
+    output_dir = os.path.abspath(getattr(args, 'output_dir', OUTPUT_DIR))
+    charts_dir = os.path.abspath(args.charts_dir) if getattr(args, 'charts_dir', None) else None
+    os.chdir(CODE_DIR)
+    sys.path.insert(0, CODE_DIR)
+
+    from batch_runner import STAGES
+
+    if args.command == 'list':
+        for analysis, names in ANALYSES.items():
+            print(f"{analysis:<10} {', '.join(names)}")
+        print(f"{'stages':<10} {', '.join(sorted(STAGES))}")
+        sys.exit()
+
+    try:
+        names = resolve(args.analyses, STAGES)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.profile:
+        from profiling import enable
+        enable(args.profile)
+
+    timings = run(names, args.season, data_dir, output_dir, args.charts, args.chart_workers, charts_dir)
+    for name, seconds in timings.items():
+        print(f"{name:<24} {seconds:8.3f}s")
+    print(f"Analysis complete. Results saved to '{output_dir}'.")
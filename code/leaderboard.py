@@ -0,0 +1,208 @@
+import numpy as np
+import pandas as pd
+from charts import parse_args
+from data_store import load_laps, load_positions
+from profiling import profiled
+
+# Tables and columns this analysis reads
+TABLES = {
+    'laps': ['Time', 'Driver', 'LapNumber', 'LapTime', 'EventName'],
+    'positions': ['Time', 'X', 'Y', 'DriverName', 'EventName'],
+}
+OUTPUT = 'leaderboard.csv'
+
+# Seconds between two rows of the running order
+TICK = 5.0
+
+# Weight of elapsed time in the distance a car has covered, in position units
+# (tenths of a metre) per second. Far too small to move a car against its
+# rivals, it keeps the distance strictly increasing when a car stands still,
+# so a lap without movement is spread over its duration instead.
+CREEP = 1e-3
+
+
+# Interpolate many monotone curves in one np.interp call. Curve i is given by
+# (xp[curve == i], fp[curve == i]) with xp increasing; each query is clipped to
+# its curve's range, so values before the first and after the last point are held.
+def _interp_curves(x, x_curve, xp, fp, curve, n_curves):
+    first = np.full(n_curves, np.inf)
+    last = np.full(n_curves, -np.inf)
+    np.minimum.at(first, curve, xp)
+    np.maximum.at(last, curve, xp)
+    span = np.nanmax(last[np.isfinite(last)]) - np.nanmin(first[np.isfinite(first)]) + 1 if len(xp) else 1
+
+    # Shift each curve past the previous one so all of them form one increasing curve
+    offset = np.arange(n_curves) * span
+    x = np.clip(x, first[x_curve], last[x_curve]) - first[x_curve] + offset[x_curve]
+    return np.interp(x, xp - first[curve] + offset[curve], fp)
+
+
+# Progress of every driver of one event as (driver, time, progress) points, in
+# laps since the start. Lap ends give whole laps; position samples in between
+# place the car within its lap by the distance it covered since the lap began.
+def driver_progress(laps, positions=None):
+    laps = laps.dropna(subset=['Time', 'LapNumber', 'Driver'])
+    drivers = pd.Categorical(laps['Driver'].astype(object))
+    ends = laps['Time'].dt.total_seconds().to_numpy()
+    lap_numbers = laps['LapNumber'].to_numpy(dtype=float)
+
+    # Everyone starts from lap 0 when the first lap 1 began
+    starts = ends - laps['LapTime'].dt.total_seconds().to_numpy()
+    first_laps = starts[(lap_numbers == 1) & ~np.isnan(starts)]
+    race_start = first_laps.min() if len(first_laps) else np.nanmin(ends) if len(ends) else np.nan
+
+    n = len(drivers.categories)
+    curve = np.r_[drivers.codes, np.arange(n)]
+    times = np.r_[ends, np.full(n, race_start)]
+    progress = np.r_[lap_numbers, np.zeros(n)]
+    order = np.lexsort((progress, times, curve))
+    curve, times, progress = curve[order], times[order], progress[order]
+
+    # Lap ends out of order (a lap number going down) would make the curve fold back
+    keep = np.r_[True, (curve[1:] != curve[:-1]) | (progress[1:] > progress[:-1])]
+    keep &= times >= race_start
+    curve, times, progress = curve[keep], times[keep], progress[keep]
+
+    if positions is not None and len(positions) and len(times):
+        samples = positions.dropna(subset=['Time', 'DriverName'])
+        sample_curve = pd.Categorical(samples['DriverName'].astype(object), categories=drivers.categories).codes
+        sample_times = samples['Time'].dt.total_seconds().to_numpy()
+        x = samples['X'].to_numpy(dtype=float)
+        y = samples['Y'].to_numpy(dtype=float)
+        inside = (sample_curve >= 0) & (sample_times >= race_start)
+        sample_curve, sample_times, x, y = sample_curve[inside], sample_times[inside], x[inside], y[inside]
+
+        # Distance covered along each driver's samples, in time order
+        order = np.lexsort((sample_times, sample_curve))
+        sample_curve, sample_times, x, y = sample_curve[order], sample_times[order], x[order], y[order]
+        step = np.nan_to_num(np.hypot(np.diff(x, prepend=np.nan), np.diff(y, prepend=np.nan)))
+        step[np.r_[True, sample_curve[1:] != sample_curve[:-1]]] = 0
+        distance = np.cumsum(step)
+
+        # Distance at each lap end, then progress at each sample between two lap ends
+        if len(distance):
+            sampled = np.isin(curve, sample_curve)
+            lap_distance = _interp_curves(times[sampled], curve[sampled], sample_times, distance, sample_curve, n)
+            lap_distance += CREEP * (times[sampled] - race_start)
+            distance += CREEP * (sample_times - race_start)
+            sample_progress = _interp_curves(distance, sample_curve, lap_distance, progress[sampled], curve[sampled], n)
+            curve = np.r_[curve, sample_curve]
+            times = np.r_[times, sample_times]
+            progress = np.r_[progress, sample_progress]
+            order = np.lexsort((progress, times, curve))
+            curve, times, progress = curve[order], times[order], progress[order]
+
+    return drivers.categories, curve, times, progress
+
+
+# Running order of one event on a grid of `tick` seconds. Progress is
+# resampled for all drivers at once into a (driver, tick) array, and one sort
+# down each column gives the order; the gap to the leader is the time since the
+# leader reached the same progress, and the interval the gap to the car ahead.
+# Returns a dict of the drivers, the grid times and (driver, tick) arrays.
+def leaderboard(laps, positions=None, tick=TICK):
+    drivers, curve, times, progress = driver_progress(laps, positions)
+    n = len(drivers)
+    if not len(times):
+        empty = np.empty((n, 0))
+        return {'drivers': drivers, 'time': np.empty(0), 'progress': empty, 'position': empty.astype(int),
+                'gap': empty, 'interval': empty}
+
+    grid = np.arange(times.min(), times.max() + tick, tick)
+    x_curve = np.repeat(np.arange(n), len(grid))
+    on_track = _interp_curves(np.tile(grid, n), x_curve, times, progress, curve, n).reshape(n, len(grid))
+
+    order = np.argsort(-on_track, axis=0, kind='stable')
+    position = np.empty_like(order)
+    np.put_along_axis(position, order, np.arange(1, n + 1)[:, None], axis=0)
+
+    # The leader's progress never goes down; a tiny slope keeps it strictly
+    # increasing so it can be inverted
+    lead = np.maximum.accumulate(on_track.max(axis=0)) + 1e-9 * np.arange(len(grid))
+    gap = grid[None, :] - np.interp(on_track, lead, grid)
+
+    ahead = np.take_along_axis(gap, order, axis=0)
+    interval = np.empty_like(gap)
+    np.put_along_axis(interval, order, np.diff(ahead, axis=0, prepend=ahead[:1]), axis=0)
+
+    return {'drivers': drivers, 'time': grid, 'progress': on_track, 'position': position,
+            'gap': gap, 'interval': interval}
+
+
+# Values of a leaderboard field for many (driver, time) pairs, from the last
+# tick at or before each time (NaN before the first tick or for unknown drivers).
+# Drivers may be names or integer rows of the board (-1 for unknown), which
+# skips the name lookup for callers querying the same drivers many times.
+def board_values(board, field, drivers, times):
+    rows = np.asarray(drivers)
+    if rows.dtype.kind not in 'iu':
+        rows = pd.Categorical(rows.astype(object), categories=board['drivers']).codes
+    times = np.asarray(times, dtype=float)
+    ticks = np.searchsorted(board['time'], times, side='right') - 1
+    found = (rows >= 0) & (ticks >= 0) & ~np.isnan(times)
+    values = np.full(len(times), np.nan)
+    values[found] = board[field][rows[found], ticks[found]]
+    return values
+
+
+# Running position of every position sample in the row order of positions,
+# from its event's leaderboard at the last tick at or before the sample: NaN
+# before the start or for drivers without laps in the event
+def sample_positions(laps, positions, tick=TICK):
+    values = np.full(len(positions), np.nan)
+    event_rows = positions.groupby('EventName', sort=False, observed=True).indices
+    for event, event_laps in laps.groupby('EventName', sort=False, observed=True):
+        rows = event_rows.get(event)
+        if rows is None:
+            continue
+        samples = positions.iloc[rows]
+        board = leaderboard(event_laps, samples, tick)
+        values[rows] = board_values(board, 'position', samples['DriverName'].astype(object).to_numpy(),
+                                    samples['Time'].dt.total_seconds().to_numpy())
+    return values
+
+
+# One row per driver and tick of an event's leaderboard
+def board_frame(event, board):
+    n, ticks = board['position'].shape
+    return pd.DataFrame({
+        'EventName': event,
+        'Time': np.tile(board['time'], n),
+        'Driver': np.repeat(np.asarray(board['drivers'], dtype=object), ticks),
+        'Position': board['position'].ravel(),
+        'Progress': board['progress'].ravel(),
+        'Gap': board['gap'].ravel(),
+        'Interval': board['interval'].ravel(),
+    })
+
+
+# Leaderboard of every event in the slice
+@profiled()
+def summarize(laps, positions):
+    samples = dict(list(positions.groupby('EventName', sort=False, observed=True)))
+    frames = [
+        board_frame(event, leaderboard(event_laps, samples.get(event)))
+        for event, event_laps in laps.groupby('EventName', sort=False, observed=True)
+    ]
+    if not frames:
+        return pd.DataFrame(columns=['EventName', 'Time', 'Driver', 'Position', 'Progress', 'Gap', 'Interval'])
+    return pd.concat(frames, ignore_index=True)
+
+
+@profiled()
+def finalize(partials):
+    leaderboard_df = pd.concat(partials, ignore_index=True)
+    return leaderboard_df.sort_values(['EventName', 'Time', 'Position']).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Load the data
+    lap_df = load_laps(columns=TABLES['laps'])
+    position_df = load_positions(columns=TABLES['positions'])
+
+    leaderboard_df = finalize([summarize(lap_df, position_df)])
+    leaderboard_df.to_csv('../csv_generated/leaderboard.csv', index=False)
+
+    print("Analysis complete. Results saved to 'leaderboard.csv'.")
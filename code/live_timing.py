@@ -0,0 +1,396 @@
+import argparse
+import csv
+import json
+import math
+import os
+import socket
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from consistency import ConsistencyTracker, flag_lap
+from data_store import DATASET_DIR, load_laps, load_positions, load_weather
+from pit_stops import MAX_PIT_TIME, MIN_PIT_TIME
+
+OUTPUT = '../csv_generated/live_timing.csv'
+
+# Laps in the rolling lap time consistency window
+WINDOW = 10
+
+
+# Seconds from a record value: a FastF1 time string, a Timedelta, a number, or
+# nothing (None, '' or NaN from a CSV row) which gives None. Like to_timedelta,
+# a malformed value gives None rather than stopping the feed.
+def _seconds(value):
+    if value is None or value == '':
+        return None
+    try:
+        if hasattr(value, 'total_seconds'):
+            value = value.total_seconds()
+        elif isinstance(value, str):
+            value = pd.Timedelta(value).total_seconds()
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return None if math.isnan(value) else value
+
+
+def _number(value):
+    if value is None or value == '':
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError, OverflowError):
+        return None
+    return None if math.isnan(value) else value
+
+
+# A True/False flag such as Rainfall, from a bool or its CSV text
+def _flag(value):
+    if value is None or value == '' or value != value:
+        return None
+    return str(value).strip().lower() in ('true', '1', '1.0')
+
+
+# Running state of one driver's race, updated lap by lap
+class DriverState:
+    __slots__ = ['laps', 'stint', 'stint_laps', 'longest_stint', 'pit_stops', 'pit_in', 'position',
+                 'last_pit_time', 'last_position_change', 'window', 'window_sum', 'window_sumsq',
+                 'total', 'total_sq', 'timed_laps', 'sample']
+
+    def __init__(self):
+        self.laps = 0
+        self.stint = None
+        self.stint_laps = 0
+        self.longest_stint = 0
+        self.pit_stops = 0
+        self.pit_in = None
+        self.position = None
+        self.last_pit_time = None
+        self.last_position_change = None
+        self.window = deque()
+        self.window_sum = 0.0
+        self.window_sumsq = 0.0
+        self.total = 0.0
+        self.total_sq = 0.0
+        self.timed_laps = 0
+        self.sample = None
+
+
+# Sample standard deviation from running sums, like partials.std
+def _std(total, total_sq, count):
+    if count < 2:
+        return np.nan
+    return math.sqrt(max(total_sq - total * total / count, 0.0) / (count - 1))
+
+
+# Pit counts, stint lengths, lap time consistency and position changes over pit
+# stops, kept up to date record by record. Every update touches one driver's
+# or one event's state only, so its cost does not grow with the session.
+# Pit stops follow extract_pit_stops: a stint change between two consecutive
+# laps, timed from the in-lap's PitInTime to the out-lap's PitOutTime.
+class LiveTiming:
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self.drivers = {}
+        self.consistency = ConsistencyTracker()
+        self.weather = {}
+        self.records = 0
+        self.skipped = 0
+
+    # Records of other tables, or with none (table None, from a malformed
+    # line), are counted and skipped rather than stopping the feed
+    def update(self, table, record):
+        if table == 'laps':
+            self.on_lap(record)
+        elif table == 'positions':
+            self.on_position(record)
+        elif table == 'weather':
+            self.on_weather(record)
+        else:
+            self.skipped += 1
+            return
+        self.records += 1
+
+    def driver(self, event, driver):
+        key = (event, driver)
+        state = self.drivers.get(key)
+        if state is None:
+            state = self.drivers[key] = DriverState()
+        return state
+
+    def on_lap(self, record):
+        state = self.driver(record.get('EventName'), record.get('Driver'))
+        state.laps += 1
+
+        # Lap time consistency, over the whole race and the last `window` laps
+        lap_time = _seconds(record.get('LapTime'))
+        if lap_time is not None:
+            state.total += lap_time
+            state.total_sq += lap_time * lap_time
+            state.timed_laps += 1
+            state.window.append(lap_time)
+            state.window_sum += lap_time
+            state.window_sumsq += lap_time * lap_time
+            if len(state.window) > self.window:
+                dropped = state.window.popleft()
+                state.window_sum -= dropped
+                state.window_sumsq -= dropped * dropped
+
+        # A new stint number means the driver stopped at the end of the previous lap
+        stint = _number(record.get('Stint'))
+        position = _number(record.get('Position'))
+        if stint is not None:
+            if state.stint is not None and stint != state.stint:
+                state.pit_stops += 1
+                pit_out = _seconds(record.get('PitOutTime'))
+                pit_time = None if pit_out is None or state.pit_in is None else pit_out - state.pit_in
+                state.last_pit_time = pit_time if pit_time is not None and MIN_PIT_TIME <= pit_time <= MAX_PIT_TIME else None
+                state.last_position_change = (
+                    state.position - position if state.position is not None and position is not None else None
+                )
+                state.stint_laps = 0
+            state.stint = stint
+            state.stint_laps += 1
+            state.longest_stint = max(state.longest_stint, state.stint_laps)
+
+        # Racing laps of the stint feed the robust consistency window
+        pit_in = _seconds(record.get('PitInTime'))
+        flag = flag_lap(_number(record.get('LapNumber')), lap_time, pit_in, _seconds(record.get('PitOutTime')),
+                        record.get('TrackStatus') or None)
+        self.consistency.update((record.get('EventName'), record.get('Driver'), stint), lap_time, flag)
+
+        state.pit_in = pit_in
+        state.position = position
+
+    # The driver's latest position sample: its session time and track status
+    def on_position(self, record):
+        state = self.driver(record.get('EventName'), record.get('DriverName'))
+        state.sample = (_seconds(record.get('Time')), record.get('Status') or None)
+
+    # The event's latest weather reading
+    def on_weather(self, record):
+        self.weather[record.get('EventName')] = (
+            _number(record.get('AirTemp')),
+            _number(record.get('TrackTemp')),
+            _number(record.get('Humidity')),
+            _flag(record.get('Rainfall')),
+        )
+
+    # Current numbers of every driver, one row each
+    def snapshot(self):
+        rows = []
+        for (event, driver), state in self.drivers.items():
+            if not state.laps:
+                continue
+            stint = self.consistency.stint((event, driver, state.stint))
+            sample_time, status = state.sample or (None, None)
+            air_temp, track_temp, humidity, rainfall = self.weather.get(event, (None, None, None, None))
+            rows.append({
+                'EventName': event,
+                'Driver': driver,
+                'Laps': state.laps,
+                'PitStops': state.pit_stops,
+                'Stint': state.stint,
+                'StintLaps': state.stint_laps,
+                'LongestStint': state.longest_stint,
+                'Position': state.position,
+                'LastPitTime': state.last_pit_time,
+                'LastPositionChange': state.last_position_change,
+                'RollingLapTime': state.window_sum / len(state.window) if state.window else np.nan,
+                'RollingLapTimeStd': _std(state.window_sum, state.window_sumsq, len(state.window)),
+                'LapTimeStd': _std(state.total, state.total_sq, state.timed_laps),
+                'StintMedian': stint.median,
+                'StintMAD': stint.mad,
+                'StintOutliers': stint.outliers,
+                'StintStd': stint.std(),
+                'SampleTime': sample_time,
+                'Status': status,
+                'AirTemp': air_temp,
+                'TrackTemp': track_temp,
+                'Humidity': humidity,
+                'Rainfall': rainfall,
+            })
+        return pd.DataFrame(rows)
+
+
+# Rows turned into records at a time while replaying, so an event never holds
+# a dict for each of its rows at once
+RECORD_CHUNK = 10_000
+
+
+# (table, record) pairs of some tables' rows in the given merged order, built
+# chunk by chunk. Order positions count the rows of `parts` one after another.
+def _records(parts, order):
+    sources = np.concatenate([np.full(len(df), i) for i, (_, df) in enumerate(parts)])
+    rows = np.concatenate([np.arange(len(df)) for _, df in parts])
+    for first in range(0, len(order), RECORD_CHUNK):
+        chunk = order[first:first + RECORD_CHUNK]
+        records = [None] * len(chunk)
+        for i, (table, df) in enumerate(parts):
+            at = np.flatnonzero(sources[chunk] == i)
+            for position, record in zip(at, df.iloc[rows[chunk[at]]].to_dict('records')):
+                records[position] = (table, record)
+        yield from records
+
+
+# Records of each event of a season merged in session time order. Yields
+# (event, clock, records) with the session time in seconds of every
+# (table, record) pair, NaN where a row has no time; records is an iterator
+# over the pairs, built as it is consumed.
+def event_records(season=2024, data_dir=DATASET_DIR):
+    tables = {
+        'laps': load_laps(season=season, data_dir=data_dir),
+        'positions': load_positions(season=season, data_dir=data_dir),
+        'weather': load_weather(season=season, data_dir=data_dir),
+    }
+    events = pd.unique(pd.concat([df['EventName'].astype(object) for df in tables.values()]).dropna())
+    slices = {table: dict(list(df.groupby('EventName', sort=False, observed=True))) for table, df in tables.items()}
+
+    for event in events:
+        parts = [(table, slices[table][event]) for table in tables if event in slices[table]]
+        clock = np.concatenate([df['Time'].dt.total_seconds().to_numpy() for _, df in parts])
+        order = np.argsort(clock, kind='stable')
+        yield event, clock[order], _records(parts, order)
+
+
+# Replay of a season's CSVs, event by event, at `speed` times real time
+# (0 replays as fast as possible). Yields (table, record).
+def replay(season=2024, data_dir=DATASET_DIR, speed=1.0):
+    for event, clock, records in event_records(season, data_dir):
+        start = clock[0] if len(clock) else 0.0
+        began = time.monotonic()
+        for at, record in zip(clock, records):
+            if speed > 0 and not np.isnan(at):
+                delay = (at - start) / speed - (time.monotonic() - began)
+                if delay > 0:
+                    time.sleep(delay)
+            yield record
+
+
+# Rows appended to growing CSV files, as `tail -f` would show them; paths maps
+# a table name to its file. Half-written lines wait for their newline. Yields
+# None whenever the files have nothing new, so the consumer can catch up.
+def tail(paths, poll=0.2, follow=True):
+    files = {table: open(path, newline='') for table, path in paths.items()}
+    headers = {}
+    pending = {table: '' for table in files}
+    try:
+        while True:
+            idle = True
+            for table, f in files.items():
+                for line in iter(f.readline, ''):
+                    line = pending[table] + line
+                    if not line.endswith('\n'):
+                        pending[table] = line
+                        break
+                    pending[table] = ''
+                    values = next(csv.reader([line]))
+                    if table not in headers:
+                        headers[table] = values
+                        continue
+                    idle = False
+                    yield table, dict(zip(headers[table], values))
+            if idle:
+                if not follow:
+                    return
+                yield None
+                time.sleep(poll)
+    finally:
+        for f in files.values():
+            f.close()
+
+
+# Newline-delimited JSON records from clients of a local TCP socket, one client
+# after another; each record names its table, e.g. {"table": "laps", "Driver": ...}.
+# A line that is not a JSON object with a table is yielded as (None, line), for
+# LiveTiming to count and skip. Yields None when no data came for `poll`
+# seconds or a client hung up.
+def listen(host='127.0.0.1', port=9099, poll=0.2):
+    with socket.create_server((host, port)) as server:
+        while True:
+            connection, _ = server.accept()
+            connection.settimeout(poll)
+            buffer = b''
+            with connection:
+                while True:
+                    try:
+                        data = connection.recv(1 << 16)
+                    except TimeoutError:
+                        yield None
+                        continue
+                    if not data:
+                        break
+                    *lines, buffer = (buffer + data).split(b'\n')
+                    for line in lines:
+                        if not line.strip():
+                            continue
+                        try:
+                            record = json.loads(line)
+                            table = record.pop('table')
+                        except (ValueError, KeyError, TypeError, AttributeError):
+                            yield None, line
+                            continue
+                        yield table, record
+            yield None
+
+
+def _write(snapshot, output):
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    tmp = f'{output}.{os.getpid()}.tmp'
+    snapshot.to_csv(tmp, index=False)
+    os.replace(tmp, output)
+
+
+# Feed records into the live state and rewrite the output at most every
+# `interval` seconds, when the source goes quiet (a None item) with updates
+# still unwritten, and once more when it runs dry
+def run(records, state=None, output=OUTPUT, interval=1.0):
+    state = state or LiveTiming()
+    written = time.monotonic()
+    pending = False
+    for item in records:
+        if item is not None:
+            state.update(*item)
+            pending = True
+        if pending and (item is None or time.monotonic() - written >= interval):
+            _write(state.snapshot(), output)
+            written = time.monotonic()
+            pending = False
+    _write(state.snapshot(), output)
+    return state
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Keep pit, stint and consistency numbers live as records arrive.')
+    parser.add_argument('--output', default=OUTPUT)
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between output refreshes')
+    parser.add_argument('--window', type=int, default=WINDOW, help='laps in the rolling consistency window')
+    sources = parser.add_subparsers(dest='source', required=True)
+
+    replay_parser = sources.add_parser('replay', help='replay the season CSVs')
+    replay_parser.add_argument('--season', type=int, default=2024)
+    replay_parser.add_argument('--data-dir', default=DATASET_DIR)
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='times real time; 0 for no delay')
+
+    tail_parser = sources.add_parser('tail', help='follow CSV files as they grow')
+    tail_parser.add_argument('files', nargs='+', metavar='TABLE=PATH', help='e.g. laps=../dataset/lap_live.csv')
+
+    socket_parser = sources.add_parser('socket', help='read JSON lines from a local socket')
+    socket_parser.add_argument('--host', default='127.0.0.1')
+    socket_parser.add_argument('--port', type=int, default=9099)
+    args = parser.parse_args()
+
+    if args.source == 'replay':
+        records = replay(args.season, args.data_dir, args.speed)
+    elif args.source == 'tail':
+        records = tail(dict(spec.split('=', 1) for spec in args.files))
+    else:
+        records = listen(args.host, args.port)
+
+    state = run(records, LiveTiming(args.window), args.output, args.interval)
+    print(f"Processed {state.records} records ({state.skipped} skipped). "
+          f"Results saved to '{os.path.basename(args.output)}'.")
@@ -0,0 +1,126 @@
+import argparse
+import hashlib
+import json
+import os
+
+from batch_runner import OUTPUT_DIR, STAGES, run, stage_module
+from code_version import code_files, parse_imports
+from data_store import DATASET_DIR, file_hash, source_path
+
+MANIFEST = '.manifest.json'
+
+
+# Names of the modules a source file imports. The list is kept in the
+# manifest next to the file's hash, so unchanged files are not parsed again.
+def imported_modules(path, manifest):
+    digest = content_hash(path, manifest)
+    known = manifest.setdefault('imports', {}).get(path)
+    if known and known['hash'] == digest:
+        return known['modules']
+    manifest['imports'][path] = {'hash': digest, 'modules': parse_imports(path)}
+    return manifest['imports'][path]['modules']
+
+
+def load_manifest(output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    if not os.path.exists(path):
+        return {'files': {}, 'stages': {}}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest, output_dir):
+    path = os.path.join(output_dir, MANIFEST)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+# Content hash of a file, reusing the hash recorded in the manifest while the
+# file's size and mtime are unchanged, so a refresh reads no unchanged file
+def content_hash(path, manifest):
+    stat = os.stat(path)
+    known = manifest['files'].get(path)
+    if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+        return known['hash']
+    digest = file_hash(path)
+    manifest['files'][path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'hash': digest}
+    return digest
+
+
+# Every input of a stage with its content hash: the source tables it reads
+# and its code. Stages only read source tables, never each other's outputs;
+# scripts reading an output get it through require().
+def stage_inputs(name, season, data_dir, output_dir, manifest):
+    module = stage_module(name)
+    paths = [source_path(table, season, data_dir) for table in sorted(module.TABLES)]
+    paths += code_files(module.__name__, os.path.dirname(os.path.abspath(module.__file__)),
+                        imports=lambda path: imported_modules(path, manifest))
+    return {path: content_hash(path, manifest) for path in paths}
+
+
+def stage_key(inputs, season):
+    digest = hashlib.sha1(str(season).encode())
+    for path, digest_of_input in sorted(inputs.items()):
+        digest.update(f'{os.path.basename(path)}:{digest_of_input}'.encode())
+    return digest.hexdigest()[:16]
+
+
+# Bring the outputs of the stages up to date. A stage reruns only when one of
+# its inputs changed or its output is missing or was edited since it was
+# written; otherwise its output is left as it is. The stale stages run together
+# in one batch_runner pass. Returns {stage: 'built' | 'cached'}.
+def build(names=None, season=2024, data_dir=DATASET_DIR, output_dir=OUTPUT_DIR, force=False, workers=None):
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    status = {}
+    keys = {}
+    for name in names or sorted(STAGES):
+        output = os.path.join(output_dir, stage_module(name).OUTPUT)
+        keys[name] = stage_key(stage_inputs(name, season, data_dir, output_dir, manifest), season)
+        entry = manifest['stages'].get(name, {})
+        fresh = (
+            not force
+            and entry.get('key') == keys[name]
+            and os.path.exists(output)
+            and content_hash(output, manifest) == entry.get('output')
+        )
+        status[name] = 'cached' if fresh else 'built'
+
+    stale = [name for name in status if status[name] == 'built']
+    if stale:
+        run(stale, [season], data_dir, output_dir, workers=workers)
+    for name in stale:
+        output = os.path.join(output_dir, stage_module(name).OUTPUT)
+        manifest['stages'][name] = {'key': keys[name], 'output': content_hash(output, manifest)}
+    save_manifest(manifest, output_dir)
+    return status
+
+
+# Path of a csv_generated/ file for a script that reads it, built first by the
+# stage producing it if it is missing or out of date
+def require(output_name, season=2024, data_dir=DATASET_DIR, output_dir=OUTPUT_DIR):
+    producers = [name for name in STAGES if stage_module(name).OUTPUT == output_name]
+    if not producers:
+        raise FileNotFoundError(f"no stage produces {output_name}")
+    build(producers, season, data_dir, output_dir)
+    return os.path.join(output_dir, output_name)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rebuild only the csv_generated/ outputs whose inputs changed.')
+    parser.add_argument('stages', nargs='*', help=f"stages to bring up to date (default: all of {', '.join(sorted(STAGES))})")
+    parser.add_argument('--season', type=int, default=2024)
+    parser.add_argument('--force', action='store_true', help='rebuild even when up to date')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--data-dir', default=DATASET_DIR)
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    args = parser.parse_args()
+    unknown = set(args.stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(sorted(unknown))}")
+
+    status = build(args.stages, args.season, args.data_dir, args.output_dir, args.force, args.workers)
+    for name, state in status.items():
+        print(f"{name:<24} {state}")
@@ -0,0 +1,58 @@
+import hashlib
+import os
+import re
+
+import pandas as pd
+
+from code_version import code_version
+from data_store import DATASET_DIR
+
+
+# Content hash of one event's slice of the tables a stage reads. Adding an
+# event or re-exporting the file leaves the keys of untouched events as they were.
+def partition_key(tables):
+    digest = hashlib.sha1()
+    for table in sorted(tables):
+        df = tables[table]
+        digest.update(table.encode())
+        digest.update(','.join(map(str, df.columns)).encode())
+        digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+
+# A stage's partials are only reusable with the code that produced them: the
+# stage's own file and the helpers it imports from this directory
+def stage_version(module):
+    directory, name = os.path.split(os.path.abspath(module.__file__))
+    return code_version(os.path.splitext(name)[0], directory)
+
+
+def partial_path(stage, season, event, key, data_dir=DATASET_DIR):
+    slug = re.sub(r'\W+', '_', event).strip('_')
+    return os.path.join(data_dir, '.cache', 'partials', stage, str(season), f'{slug}_{key}.pkl')
+
+
+def load_partial(stage, season, event, key, data_dir=DATASET_DIR):
+    path = partial_path(stage, season, event, key, data_dir)
+    if not os.path.exists(path):
+        return None
+    return pd.read_pickle(path)
+
+
+def save_partial(partial, stage, season, event, key, data_dir=DATASET_DIR):
+    path = partial_path(stage, season, event, key, data_dir)
+    directory, name = os.path.split(path)
+    os.makedirs(directory, exist_ok=True)
+
+    # Drop partials of earlier versions of the same event
+    slug = name.rsplit('_', 1)[0]
+    for other in os.listdir(directory):
+        if other.rsplit('_', 1)[0] == slug and other.endswith('.pkl') and other != name:
+            try:
+                os.remove(os.path.join(directory, other))
+            except FileNotFoundError:
+                pass
+
+    tmp = f'{path}.{os.getpid()}.tmp'
+    partial.to_pickle(tmp)
+    os.replace(tmp, path)
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+
+
+# Per-group sum, sum of squares and count of a column. Partials from separate
+# slices of the data (events, seasons) add up to the partial of their union.
+def moments(df, keys, column):
+    # Small integer and float32 columns are widened so squares neither overflow nor lose precision
+    value = df[column].astype('float64')
+    values = df[keys].assign(Value=value, Square=value ** 2)
+    partial = values.groupby(keys, observed=True).agg(
+        Sum=('Value', 'sum'),
+        SumSq=('Square', 'sum'),
+        Count=('Value', 'count')
+    )
+    return partial.reset_index()
+
+
+# Add up partials sharing the same keys; agg maps columns that need another
+# reduction than a sum (e.g. a running max)
+def combine(partials, keys, agg=None):
+    partials = pd.concat(partials, ignore_index=True) if isinstance(partials, list) else partials
+    agg = {column: (agg or {}).get(column, 'sum') for column in partials.columns if column not in keys}
+    return partials.groupby(keys, as_index=False, observed=True).agg(agg)
+
+
+def mean(partial):
+    return partial['Sum'] / partial['Count'].where(partial['Count'] > 0)
+
+
+# Sample standard deviation (ddof=1), NaN for groups with fewer than two values
+def std(partial):
+    count = partial['Count'].where(partial['Count'] > 1)
+    variance = (partial['SumSq'] - partial['Sum'] ** 2 / count) / (count - 1)
+    return np.sqrt(variance.clip(lower=0))
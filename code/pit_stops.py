@@ -0,0 +1,57 @@
+import pandas as pd
+
+from profiling import profiled
+from time_parsing import to_timedelta
+
+# Lap columns needed to extract pit stops
+LAP_COLUMNS = ['EventName', 'Driver', 'LapNumber', 'Stint', 'Compound', 'PitInTime', 'PitOutTime']
+
+# Reasonable range for pit stop times; anything outside is a timing gap, not a stop
+MIN_PIT_TIME = 10
+MAX_PIT_TIME = 60
+
+
+# Build one row per pit stop, i.e. per stint change within an (EventName, Driver) race.
+# PitTime pairs the in-lap's PitInTime with the out-lap's PitOutTime and is NaN
+# when either is missing or the result falls outside the reasonable range.
+@profiled()
+def extract_pit_stops(laps):
+    laps = laps[LAP_COLUMNS].dropna(subset=['Stint']).sort_values(['EventName', 'Driver', 'LapNumber'])
+    prev = laps.shift()
+
+    same_race = (laps['EventName'] == prev['EventName']) & (laps['Driver'] == prev['Driver'])
+    is_stop = same_race & (laps['Stint'] != prev['Stint'])
+
+    # Only the laps around a stint change need their pit times parsed
+    out_laps = laps[is_stop]
+    in_laps = prev[is_stop]
+    pit_in = to_timedelta(in_laps['PitInTime'])
+    pit_out = to_timedelta(out_laps['PitOutTime'])
+    pit_time = (pit_out - pit_in).dt.total_seconds()
+    pit_time = pit_time.where(pit_time.between(MIN_PIT_TIME, MAX_PIT_TIME))
+
+    stops = pd.DataFrame({
+        'EventName': out_laps['EventName'],
+        'Driver': out_laps['Driver'],
+        'InLap': in_laps['LapNumber'],
+        'OutLap': out_laps['LapNumber'],
+        'StintBefore': in_laps['Stint'],
+        'StintAfter': out_laps['Stint'],
+        'CompoundBefore': in_laps['Compound'],
+        'CompoundAfter': out_laps['Compound'],
+        'PitInTime': pit_in,
+        'PitOutTime': pit_out,
+        'PitTime': pit_time,
+    }).reset_index(drop=True)
+
+    stops.insert(2, 'StopNumber', stops.groupby(['EventName', 'Driver'], observed=True).cumcount() + 1)
+    return stops
+
+
+# Number of stops for every (EventName, Driver) race in laps, including races without a stop
+def count_pit_stops(laps, stops):
+    races = laps[['EventName', 'Driver']].drop_duplicates()
+    counts = stops.groupby(['EventName', 'Driver'], observed=True).size().rename('PitStops').reset_index()
+    counts = races.merge(counts, on=['EventName', 'Driver'], how='left')
+    counts['PitStops'] = counts['PitStops'].fillna(0).astype(int)
+    return counts.sort_values(['EventName', 'Driver']).reset_index(drop=True)
@@ -1,113 +1,180 @@
+import numpy as np
 import pandas as pd
-import matplotlib.pyplot as plt
-import matplotlib.font_manager as fm
-from matplotlib.lines import Line2D
-from datetime import timedelta
-
-def parse_custom_time(time_str):
-    if pd.isna(time_str):
-        return pd.NaT
-    try:
-        days, time = time_str.split(' days ')
-        hours, minutes, seconds = time.split(':')
-        seconds, microseconds = seconds.split('.')
-        
-        return timedelta(
-            days=int(days),
-            hours=int(hours),
-            minutes=int(minutes),
-            seconds=int(seconds),
-            microseconds=int(microseconds)
-        )
-    except ValueError:
-        return pd.NaT
-
-# Read the CSV files
-position_df = pd.read_csv('../dataset/position_2O24.csv', low_memory=False)
-lap_df = pd.read_csv('../dataset/lap_2024.csv', low_memory=False)
-
-# Convert Time columns to timedelta
-position_df['Time'] = position_df['Time'].apply(parse_custom_time)
-lap_df['Time'] = lap_df['Time'].apply(parse_custom_time)
-
-# Calculate the race start time
-race_start = position_df['Time'].min()
-
-# Convert timedelta to seconds since race start
-position_df['Seconds'] = (position_df['Time'] - race_start).dt.total_seconds()
-lap_df['Seconds'] = (lap_df['Time'] - race_start).dt.total_seconds()
-
-# Calculate position for each driver at each time point
-position_df = position_df.sort_values('Seconds')
-position_df['Position'] = position_df.groupby('Seconds')['DriverName'].rank(method='dense')
-
-# Identify pit stops
-pit_stops = lap_df[lap_df['PitInTime'].notna()]
-
-# Initialize lists to store data for CSV
-csv_data = []
-
-# Process each driver's data
-for driver in position_df['DriverName'].unique():
-    driver_positions = position_df[position_df['DriverName'] == driver].sort_values('Seconds')
-    driver_pit_stops = pit_stops[pit_stops['Driver'] == driver]
-    
-    for _, pit_stop in driver_pit_stops.iterrows():
-        pit_time = pit_stop['Seconds']
-        before_pit = driver_positions[driver_positions['Seconds'] < pit_time]['Position'].iloc[-1] if not driver_positions[driver_positions['Seconds'] < pit_time].empty else None
-        after_pit = driver_positions[driver_positions['Seconds'] > pit_time]['Position'].iloc[0] if not driver_positions[driver_positions['Seconds'] > pit_time].empty else None
-        
-        if before_pit is not None and after_pit is not None:
-            position_change = before_pit - after_pit
-            csv_data.append({
-                'Driver': driver,
-                'PitStopTime': pit_time / 3600,  # Convert to hours
-                'PositionBefore': before_pit,
-                'PositionAfter': after_pit,
-                'PositionChange': position_change
-            })
-
-# Create a CSV file with position changes
-csv_df = pd.DataFrame(csv_data)
-csv_df.to_csv('../csv_generated/position_changes.csv', index=False)
-
-# Create a simplified line chart showing position changes
-plt.figure(figsize=(15, 10))
-plt.style.use('default')  # Use default style for white background
-
-# Add JetBrains Mono font
-font_path = '../fonts/JetBrainsMono-Regular.ttf'  # Update this path
-prop = fm.FontProperties(fname=font_path)
-plt.rcParams['font.family'] = 'sans-serif'
-plt.rcParams['font.sans-serif'] = prop.get_name()
-
-# Color palette for drivers
-color_palette = plt.cm.get_cmap('tab20')
-
-for idx, driver in enumerate(position_df['DriverName'].unique()):
-    driver_data = position_df[position_df['DriverName'] == driver].sort_values('Seconds')
-    plt.plot(driver_data['Seconds'] / 3600, driver_data['Position'], 
-             label=driver, color=color_palette(idx / 20), linewidth=2)
-
-    # Mark pit stops
-    driver_pit_stops = pit_stops[pit_stops['Driver'] == driver]
-    for pit_time in driver_pit_stops['Seconds']:
-        plt.plot(pit_time / 3600, driver_data[driver_data['Seconds'] >= pit_time]['Position'].iloc[0], 
-                 'o', color=color_palette(idx / 20), markersize=8)
-
-plt.gca().invert_yaxis()  # Invert y-axis so that position 1 is at the top
-plt.xlabel('Time (hours from race start)', fontproperties=prop, fontsize=12)
-plt.ylabel('Position', fontproperties=prop, fontsize=12)
-plt.title('Driver Positions Throughout the Race', fontproperties=prop, fontsize=16)
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.legend(prop=prop, loc='center left', bbox_to_anchor=(1, 0.5), fontsize=10)
-
-# Customize ticks
-plt.xticks(fontproperties=prop, fontsize=10)
-plt.yticks(range(1, len(position_df['DriverName'].unique()) + 1), fontproperties=prop, fontsize=10)
-
-plt.tight_layout()
-plt.savefig('../charts/position_changes.png', dpi=300, bbox_inches='tight')
-plt.close()
-
-print("Analysis complete. Results saved in 'position_changes.csv' and 'simplified_position_changes.png'.")
\ No newline at end of file
+from charts import chart, chart_path, load_font, parse_args, render
+from data_store import DATASET_DIR, load_laps
+from leaderboard import TABLES as LEADERBOARD_TABLES
+from leaderboard import sample_positions
+from position_index import build_position_index, lookup_positions
+from position_store import COLUMNS as STORE_COLUMNS
+from position_store import PositionStore, build_position_store
+from profiling import profiled
+from time_parsing import to_nanoseconds, to_timedelta
+
+# Tables and columns this analysis reads: the leaderboard's, for the running
+# order, and every column of the position store for the chart
+TABLES = {
+    'laps': sorted(set(LEADERBOARD_TABLES['laps']) | {'PitInTime'}),
+    'positions': sorted(set(LEADERBOARD_TABLES['positions']) | set(STORE_COLUMNS)),
+}
+OUTPUT = 'position_changes.csv'
+# Pit stop times are measured from the first position sample of the season,
+# so this stage always runs on the whole season at once
+PARTITION = 'season'
+
+
+# Put laps and position samples on a common clock and place every sample in
+# the running order of its event's leaderboard
+def prepare(laps, positions):
+    # Convert Time columns to timedelta
+    positions = positions.assign(Time=to_timedelta(positions['Time']))
+    laps = laps.assign(Time=to_timedelta(laps['Time']), LapTime=to_timedelta(laps['LapTime']))
+    positions['Position'] = sample_positions(laps, positions)
+
+    # Calculate the race start time
+    race_start = positions['Time'].min()
+
+    # Convert timedelta to seconds since race start
+    positions['Seconds'] = (positions['Time'] - race_start).dt.total_seconds()
+    laps['Seconds'] = (laps['Time'] - race_start).dt.total_seconds()
+
+    positions = positions.sort_values('Seconds')
+
+    # Identify pit stops
+    pit_stops = laps[laps['PitInTime'].notna()]
+    return positions, pit_stops
+
+
+# Look up the position just before and just after every pit stop in one batch
+def position_changes(position_index, pit_stops):
+    before_pit = lookup_positions(position_index, pit_stops['Driver'], pit_stops['Seconds'], direction='backward')
+    after_pit = lookup_positions(position_index, pit_stops['Driver'], pit_stops['Seconds'], direction='forward')
+
+    csv_df = pd.DataFrame({
+        'Driver': pit_stops['Driver'].to_numpy(),
+        'PitStopTime': pit_stops['Seconds'].to_numpy() / 3600,  # Convert to hours
+        'PositionBefore': before_pit,
+        'PositionAfter': after_pit,
+        'PositionChange': before_pit - after_pit
+    }).dropna(subset=['PositionBefore', 'PositionAfter'])
+    return csv_df
+
+
+# Pit stop laps timed against the first position sample in a position store,
+# as prepare() times them against the first row of the position table
+def store_pit_stops(laps, store):
+    pit_stops = laps[laps['PitInTime'].notna()]
+    times = to_timedelta(pit_stops['Time'])
+    return pit_stops.assign(Time=times, Seconds=(times - pd.Timedelta(store.start)).dt.total_seconds())
+
+
+# position_changes() against a position store, driver by driver, so each lookup
+# only reads that driver's blocks of the memory-mapped arrays
+def store_position_changes(store, pit_stops):
+    before_pit = np.full(len(pit_stops), np.nan)
+    after_pit = np.full(len(pit_stops), np.nan)
+    times = to_nanoseconds(pit_stops['Time'])
+    for driver, rows in pit_stops.groupby('Driver', observed=True).indices.items():
+        before_pit[rows] = store.lookup(driver, times[rows], direction='backward')
+        after_pit[rows] = store.lookup(driver, times[rows], direction='forward')
+
+    csv_df = pd.DataFrame({
+        'Driver': pit_stops['Driver'].to_numpy(),
+        'PitStopTime': pit_stops['Seconds'].to_numpy() / 3600,  # Convert to hours
+        'PositionBefore': before_pit,
+        'PositionAfter': after_pit,
+        'PositionChange': before_pit - after_pit
+    }).dropna(subset=['PositionBefore', 'PositionAfter'])
+    return csv_df
+
+
+@profiled()
+def summarize(laps, positions):
+    positions, pit_stops = prepare(laps, positions)
+    return position_changes(build_position_index(positions), pit_stops)
+
+
+@profiled()
+def finalize(partials):
+    return pd.concat(partials, ignore_index=True).sort_values(['Driver', 'PitStopTime'])
+
+
+# The position chart for f1strat run, from the laps and positions it already
+# holds: the season's position store is built from them on first use
+def lap_charts(laps, positions, season=2024, data_dir=DATASET_DIR):
+    path = build_position_store(season, data_dir, positions, laps)
+    return [chart(plot, path, store_pit_stops(laps, PositionStore(path)))]
+
+
+def plot(path, pit_stops):
+    import matplotlib.pyplot as plt
+
+    store = PositionStore(path)
+
+    # Create a simplified line chart showing position changes
+    plt.figure(figsize=(15, 10))
+    plt.style.use('default')  # Use default style for white background
+
+    # Add JetBrains Mono font
+    prop = load_font()
+    plt.rcParams['font.family'] = 'sans-serif'
+    plt.rcParams['font.sans-serif'] = prop.get_name()
+
+    # Color palette for drivers
+    color_palette = plt.get_cmap('tab20')
+
+    # Drivers in the order they first appear on track
+    drivers = sorted(store.driver_blocks, key=lambda driver: store.arrays['Time'][store.driver_blocks[driver][0][0]])
+    pit_rows = pit_stops.groupby('Driver', observed=True).indices
+    pit_times = to_nanoseconds(pit_stops['Time'])
+
+    for idx, driver in enumerate(drivers):
+        # The driver's samples of every event, in time order
+        blocks = store.driver_blocks[driver]
+        times = np.concatenate([store.arrays['Time'][lo:hi] for lo, hi in blocks])
+        positions = np.concatenate([store.arrays['Position'][lo:hi] for lo, hi in blocks])
+        order = np.argsort(times, kind='stable')
+        plt.plot((times[order] - store.start) / 3.6e12, positions[order],
+                 label=driver, color=color_palette(idx / 20), linewidth=2)
+
+        # Mark pit stops at the first sample at or after each stop
+        rows = pit_rows.get(driver)
+        if rows is not None:
+            marker_positions = store.lookup(driver, pit_times[rows], direction='forward', allow_exact_matches=True)
+            found = ~np.isnan(marker_positions)
+            plt.plot(pit_stops['Seconds'].to_numpy()[rows][found] / 3600, marker_positions[found],
+                     'o', color=color_palette(idx / 20), markersize=8, linestyle='none')
+
+    plt.gca().invert_yaxis()  # Invert y-axis so that position 1 is at the top
+    plt.xlabel('Time (hours from race start)', fontproperties=prop, fontsize=12)
+    plt.ylabel('Position', fontproperties=prop, fontsize=12)
+    plt.title('Driver Positions Throughout the Race', fontproperties=prop, fontsize=16)
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.legend(prop=prop, loc='center left', bbox_to_anchor=(1, 0.5), fontsize=10)
+
+    # Customize ticks
+    plt.xticks(fontproperties=prop, fontsize=10)
+    plt.yticks(range(1, len(drivers) + 1), fontproperties=prop, fontsize=10)
+
+    plt.tight_layout()
+    plt.savefig(chart_path('position_changes.png'), dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Position samples come from the memory-mapped store, built on first use
+    path = build_position_store()
+    store = PositionStore(path)
+    lap_df = load_laps(columns=TABLES['laps'])
+    pit_stops = store_pit_stops(lap_df, store)
+
+    # Create a CSV file with position changes
+    csv_df = finalize([store_position_changes(store, pit_stops)])
+    csv_df.to_csv('../csv_generated/position_changes.csv', index=False)
+
+    # Chart workers open the store themselves instead of receiving every sample
+    if args.charts:
+        render([chart(plot, path, pit_stops)], args.chart_workers)
+
+    print("Analysis complete. Results saved in 'position_changes.csv' and 'simplified_position_changes.png'.")
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+
+
+# Sort position samples by time once so every lookup is a binary search per driver
+def build_position_index(positions, driver='DriverName', time='Seconds', value='Position'):
+    index = positions[[driver, time, value]].dropna(subset=[driver, time])
+    index = index.sort_values(time, kind='stable').reset_index(drop=True)
+    index = index.rename(columns={driver: '_driver', time: '_time', value: '_value'})
+    return index.astype({'_time': float})
+
+
+# Resolve the sampled value for many (driver, time) queries in one batched merge_asof.
+# direction='backward' finds the last sample at or before each time, 'forward' the first
+# at or after it; allow_exact_matches=False makes both strict. Missing matches are NaN.
+def lookup_positions(index, drivers, times, direction='backward', allow_exact_matches=False):
+    queries = pd.DataFrame({
+        '_driver': pd.Series(np.asarray(drivers), dtype=index['_driver'].dtype),
+        '_time': np.asarray(times, dtype=float),
+        '_row': np.arange(len(drivers)),
+    })
+    queries = queries.dropna(subset=['_time']).sort_values('_time', kind='stable')
+
+    matched = pd.merge_asof(
+        queries, index,
+        on='_time', by='_driver',
+        direction=direction, allow_exact_matches=allow_exact_matches
+    )
+
+    values = np.full(len(drivers), np.nan)
+    values[matched['_row'].to_numpy()] = matched['_value'].to_numpy(dtype=float)
+    return values
@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATASET_DIR, cache_path, load_laps, load_positions
+from leaderboard import TABLES as LEADERBOARD_TABLES
+from leaderboard import sample_positions
+from time_parsing import NAT, to_nanoseconds, to_timedelta
+
+# Arrays of the store, one file each, all in (event, driver, time) order
+ARRAYS = {'Time': np.int64, 'Position': np.float32, 'X': np.float32, 'Y': np.float32, 'Z': np.float32}
+# Position columns the store is built from
+COLUMNS = ['Time', 'DriverName', 'EventName', 'X', 'Y', 'Z']
+
+
+# The store sits next to the table caches and shares the keys of the position
+# and lap caches, so it is rebuilt whenever either file changes: positions are
+# the running order of the leaderboard, which is built from the laps
+def store_path(season=2024, data_dir=DATASET_DIR):
+    keys = [os.path.basename(cache_path(table, season, data_dir)).rsplit('_', 1)[1].split('.')[0]
+            for table in ('positions', 'laps')]
+    return os.path.join(data_dir, '.cache', f'position_store_{season}_{"_".join(keys)}')
+
+
+# Write a season's position samples as flat arrays laid out by (event, driver)
+# with each block sorted by time, plus an index of the blocks. Position is the
+# running order of the event's leaderboard at each sample. Tables the caller
+# has already loaded (with the COLUMNS and the leaderboard's lap columns) are
+# used instead of reading them again. Returns the path.
+def build_position_store(season=2024, data_dir=DATASET_DIR, positions=None, laps=None):
+    path = store_path(season, data_dir)
+    if os.path.exists(path):
+        return path
+
+    if positions is None:
+        positions = load_positions(columns=COLUMNS, season=season, data_dir=data_dir)
+    if laps is None:
+        laps = load_laps(columns=LEADERBOARD_TABLES['laps'], season=season, data_dir=data_dir)
+    positions = positions[COLUMNS].assign(Time=to_timedelta(positions['Time']))
+    laps = laps.assign(Time=to_timedelta(laps['Time']), LapTime=to_timedelta(laps['LapTime']))
+
+    times = to_nanoseconds(positions['Time'])
+    timed = times != NAT
+    keep = timed & positions['DriverName'].notna().to_numpy() & positions['EventName'].notna().to_numpy()
+    first_sample = int(times[timed].min()) if timed.any() else 0
+    positions, times = positions[keep], times[keep]
+    ranks = sample_positions(laps, positions)
+
+    events = pd.Categorical(positions['EventName'].astype(object))
+    drivers = pd.Categorical(positions['DriverName'].astype(object))
+    order = np.lexsort((times, drivers.codes, events.codes))
+    arrays = {
+        'Time': times[order],
+        'Position': ranks[order],
+        'X': positions['X'].to_numpy(dtype=np.float32)[order],
+        'Y': positions['Y'].to_numpy(dtype=np.float32)[order],
+        'Z': positions['Z'].to_numpy(dtype=np.float32)[order],
+    }
+
+    event_codes, driver_codes = events.codes[order], drivers.codes[order]
+    starts = np.flatnonzero(np.r_[True, (event_codes[1:] != event_codes[:-1]) | (driver_codes[1:] != driver_codes[:-1])])
+    ends = np.r_[starts[1:], len(order)]
+    index = {
+        'start': first_sample,
+        'blocks': [
+            [events.categories[event_codes[s]], drivers.categories[driver_codes[s]], int(s), int(e)]
+            for s, e in zip(starts, ends)
+        ],
+    }
+
+    # Build in a scratch directory and move it in place, so readers never see half a store
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(f'position_store_{season}_') and name != os.path.basename(path):
+            shutil.rmtree(os.path.join(os.path.dirname(path), name), ignore_errors=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    os.makedirs(tmp, exist_ok=True)
+    for name, dtype in ARRAYS.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), arrays[name].astype(dtype, copy=False))
+    with open(os.path.join(tmp, 'index.json'), 'w') as f:
+        json.dump(index, f)
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another process finished the same store first
+        shutil.rmtree(tmp, ignore_errors=True)
+    return path
+
+
+def _nanoseconds(value):
+    if value is None:
+        return None
+    if isinstance(value, pd.Timedelta):
+        return value.value
+    return int(value)
+
+
+# Read-only view of a position store. Arrays are memory-mapped, so slicing a
+# driver's samples in a time window copies nothing and only the pages under
+# the slice are ever read from disk. Times are session times in nanoseconds.
+class PositionStore:
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'index.json')) as f:
+            index = json.load(f)
+        self.start = index['start']
+        self.blocks = {(event, driver): (start, end) for event, driver, start, end in index['blocks']}
+        self.arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAYS}
+
+        # Blocks of each driver over the season, in time order
+        self.driver_blocks = {}
+        for (event, driver), (start, end) in self.blocks.items():
+            self.driver_blocks.setdefault(driver, []).append((start, end))
+        for blocks in self.driver_blocks.values():
+            blocks.sort(key=lambda block: self.arrays['Time'][block[0]])
+
+    def events(self):
+        return sorted({event for event, _ in self.blocks})
+
+    def drivers(self, event=None):
+        return sorted({driver for e, driver in self.blocks if event is None or e == event})
+
+    # Row range of a driver's samples within [start, end] of an event
+    def _range(self, event, driver, start=None, end=None):
+        lo, hi = self.blocks.get((event, driver), (0, 0))
+        times = self.arrays['Time'][lo:hi]
+        first = 0 if start is None else np.searchsorted(times, _nanoseconds(start), side='left')
+        last = len(times) if end is None else np.searchsorted(times, _nanoseconds(end), side='right')
+        return lo + first, lo + last
+
+    # Zero-copy views of one driver's arrays between two session times (inclusive)
+    def slice(self, event, driver, start=None, end=None):
+        lo, hi = self._range(event, driver, start, end)
+        return {name: array[lo:hi] for name, array in self.arrays.items()}
+
+    # All drivers' samples of an event between two session times, as a frame
+    def window(self, event, start=None, end=None, columns=('Time', 'Position')):
+        frames = []
+        for driver in self.drivers(event):
+            values = self.slice(event, driver, start, end)
+            frames.append(pd.DataFrame({'DriverName': driver, **{name: values[name] for name in columns}}))
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['DriverName', *columns])
+
+    # Position of one driver at many session times, one binary search per block:
+    # 'backward' takes the last sample before each time, 'forward' the first one
+    # after it, both strict unless allow_exact_matches. With event=None every
+    # event of the driver is searched and the nearest sample wins, as in
+    # lookup_positions over a whole season.
+    def lookup(self, driver, times, event=None, direction='backward', allow_exact_matches=False):
+        times = np.asarray(times, dtype=np.int64)
+        best_time = np.full(len(times), NAT if direction == 'backward' else np.iinfo(np.int64).max)
+        values = np.full(len(times), np.nan)
+        blocks = self.driver_blocks.get(driver, []) if event is None else [self.blocks.get((event, driver), (0, 0))]
+        for lo, hi in blocks:
+            block_times = self.arrays['Time'][lo:hi]
+            if not len(block_times):
+                continue
+            if direction == 'backward':
+                i = np.searchsorted(block_times, times, side='right' if allow_exact_matches else 'left') - 1
+                found = i >= 0
+                candidate = np.where(found, block_times[np.clip(i, 0, None)], NAT)
+                better = found & (candidate > best_time)
+            else:
+                i = np.searchsorted(block_times, times, side='left' if allow_exact_matches else 'right')
+                found = i < len(block_times)
+                candidate = np.where(found, block_times[np.clip(i, None, len(block_times) - 1)], np.iinfo(np.int64).max)
+                better = found & (candidate < best_time)
+            best_time = np.where(better, candidate, best_time)
+            values[better] = self.arrays['Position'][lo + i[better]]
+        return values
+
+
+def open_position_store(season=2024, data_dir=DATASET_DIR):
+    return PositionStore(build_position_store(season, data_dir))
@@ -0,0 +1,283 @@
+import atexit
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from functools import wraps
+
+import pandas as pd
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Profiles are switched on by F1_PROFILE=json (or 1) or F1_PROFILE=folded, or
+# by a script's --profile flag, and written to F1_PROFILE_DIR on exit
+FORMATS = ('json', 'folded')
+PROFILE_DIR = '../benchmarks'
+
+_format = None
+_directory = PROFILE_DIR
+_stack = []
+_open = []
+_spans = []
+_started = None
+# Highest VmHWM read from /proc so far. Resetting VmHWM for a span also resets
+# ru_maxrss, so the process peak is kept here, read before every reset.
+_process_peak = None
+
+
+# One timed section. Callers may set `rows` inside the block; when profiling
+# is off the block gets a shared throwaway instance. peak_rss_mb is the highest
+# resident memory reached while the span was open and rss_delta_mb the change
+# in resident memory from its start to its end; pid tells spans recorded by
+# pool workers from those of this process.
+class Span:
+    __slots__ = ['name', 'path', 'rows', 'wall', 'cpu', 'peak_rss_mb', 'rss_delta_mb', 'start', 'pid']
+
+    def __init__(self, name, path=None, rows=None):
+        self.name = name
+        self.path = path
+        self.rows = rows
+        self.wall = self.cpu = self.peak_rss_mb = self.rss_delta_mb = self.start = None
+        self.pid = os.getpid()
+
+
+_OFF = Span('off')
+
+
+# Peak resident memory of the process so far, in MB (None where unavailable)
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+# Current and peak resident memory in MB from /proc/self/status, where the
+# peak (VmHWM) can be reset to the current size by writing 5 to
+# /proc/self/clear_refs. None for both on other systems.
+def _memory_mb():
+    try:
+        with open('/proc/self/status') as f:
+            fields = dict(line.split(':', 1) for line in f if line.startswith(('VmRSS', 'VmHWM')))
+        return int(fields['VmRSS'].split()[0]) / 1024, int(fields['VmHWM'].split()[0]) / 1024
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+# Note a VmHWM reading in the process peak and return it
+def _seen_peak(peak):
+    global _process_peak
+    if peak is not None:
+        _process_peak = peak if _process_peak is None else max(_process_peak, peak)
+    return peak
+
+
+def _reset_peak():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _rows(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def _script():
+    return os.path.splitext(os.path.basename(sys.argv[0] or 'python'))[0] or 'python'
+
+
+def enabled():
+    return _format is not None
+
+
+# Start recording spans; the profile is written when the process exits
+def enable(profile_format='json', directory=None):
+    global _format, _directory, _started
+    if profile_format not in FORMATS:
+        raise ValueError(f"unknown profile format {profile_format!r}; expected one of {FORMATS}")
+    if _format is None:
+        _started = (time.perf_counter(), time.process_time())
+        _seen_peak(_memory_mb()[1])
+        _hook_csv()
+        atexit.register(write)
+    _format = profile_format
+    _directory = directory or os.environ.get('F1_PROFILE_DIR', PROFILE_DIR)
+
+
+# Wall time, CPU time, memory and row count of a block, nested under the spans
+# open around it. The process's peak memory mark is reset when a span opens,
+# so each span sees its own peak; the mark reached so far is first handed to
+# the spans still open around it, and a span's peak to its parent when it ends.
+@contextmanager
+def span(name, rows=None):
+    if _format is None:
+        yield _OFF
+        return
+    rss, peak = _memory_mb()
+    _seen_peak(peak)
+    for parent in _open:
+        if parent.peak_rss_mb is not None and peak is not None:
+            parent.peak_rss_mb = max(parent.peak_rss_mb, peak)
+    _stack.append(name)
+    record = Span(name, ';'.join(_stack), rows)
+    _open.append(record)
+    if _reset_peak():
+        rss, record.peak_rss_mb = _memory_mb()
+    record.start = time.perf_counter() - _started[0]
+    wall, cpu = time.perf_counter(), time.process_time()
+    try:
+        yield record
+    finally:
+        record.wall = time.perf_counter() - wall
+        record.cpu = time.process_time() - cpu
+        end_rss, peak = _memory_mb()
+        _seen_peak(peak)
+        if record.peak_rss_mb is not None and peak is not None:
+            record.peak_rss_mb = max(record.peak_rss_mb, peak)
+            if len(_open) > 1:
+                _open[-2].peak_rss_mb = max(_open[-2].peak_rss_mb, record.peak_rss_mb)
+        if rss is not None and end_rss is not None:
+            record.rss_delta_mb = end_rss - rss
+        _open.pop()
+        _stack.pop()
+        _spans.append(record)
+
+
+# What a pool worker needs to record spans the way this process does: None
+# when profiling is off. Pass it to the worker with its task.
+def settings():
+    return None if _format is None else (_format, _started)
+
+
+# Record the spans of a task run in a pool worker. Workers forked from a
+# profiling process already record; others start here, without writing a
+# profile of their own on exit. The block gets a list holding the task's spans
+# once it ends, to be returned with the task's result and merged by the parent.
+@contextmanager
+def worker_spans(parent_settings):
+    global _format, _started
+    spans = []
+    if parent_settings is None:
+        yield spans
+        return
+    if _format is None:
+        _format, _started = parent_settings
+        _hook_csv()
+
+    # Spans the parent had open when it forked are not this task's parents
+    stack, open_spans, first = _stack[:], _open[:], len(_spans)
+    _stack.clear()
+    _open.clear()
+    try:
+        yield spans
+    finally:
+        spans.extend(_spans[first:])
+        del _spans[first:]
+        _stack[:] = stack
+        _open[:] = open_spans
+
+
+# Add spans recorded by pool workers to this process's profile
+def merge(spans):
+    if _format is not None:
+        _spans.extend(spans)
+
+
+# Decorator timing every call of a function as a span, with the length of
+# its result as the row count
+def profiled(name=None):
+    def decorate(function):
+        module = _script() if function.__module__ == '__main__' else function.__module__
+        label = name or f"{module}.{function.__name__}"
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _format is None:
+                return function(*args, **kwargs)
+            with span(label) as record:
+                result = function(*args, **kwargs)
+                record.rows = _rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+# Every CSV read and write, whichever script makes it, while profiling is on
+def _hook_csv():
+    read_csv, to_csv = pd.read_csv, pd.DataFrame.to_csv
+
+    @wraps(read_csv)
+    def profiled_read_csv(*args, **kwargs):
+        with span('read_csv') as record:
+            result = read_csv(*args, **kwargs)
+            record.rows = _rows(result) if isinstance(result, pd.DataFrame) else None
+        return result
+
+    @wraps(to_csv)
+    def profiled_to_csv(self, *args, **kwargs):
+        with span('to_csv', len(self)):
+            return to_csv(self, *args, **kwargs)
+
+    pd.read_csv = profiled_read_csv
+    pd.DataFrame.to_csv = profiled_to_csv
+
+
+# The recorded spans as JSON (one object per span, in start order) or as
+# folded stacks of self wall time in microseconds, for flamegraph.pl/speedscope.
+# Spans merged from pool workers ran alongside this process, so they are
+# folded under a separate `workers` frame instead of into its wall time.
+def write():
+    if _format is None:
+        return None
+    os.makedirs(_directory, exist_ok=True)
+    script = _script()
+    path = os.path.join(_directory, f'profile_{script}_{os.getpid()}.{_format}')
+    wall = time.perf_counter() - _started[0]
+    cpu = time.process_time() - _started[1]
+    spans = sorted(_spans, key=lambda record: record.start)
+    # ru_maxrss only holds when /proc was not there to read (or reset)
+    peak = _seen_peak(_memory_mb()[1])
+    peak = _process_peak if peak is not None else _peak_rss_mb()
+
+    if _format == 'json':
+        report = {
+            'script': script,
+            'argv': sys.argv,
+            'wall': wall,
+            'cpu': cpu,
+            'peak_rss_mb': peak,
+            'spans': [{key: getattr(record, key) for key in Span.__slots__} for record in spans],
+        }
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        # Self time: each span's wall time minus that of the spans directly inside it
+        own = defaultdict(float)
+        pid = os.getpid()
+        for record in spans:
+            root = script if record.pid == pid else f'{script};workers'
+            own[f'{root};{record.path}'] += record.wall
+            parent = record.path.rpartition(';')[0]
+            if parent:
+                own[f'{root};{parent}'] -= record.wall
+        own[script] = wall - sum(record.wall for record in spans if ';' not in record.path and record.pid == pid)
+        with open(path, 'w') as f:
+            for stack, seconds in own.items():
+                f.write(f'{stack} {max(int(seconds * 1e6), 0)}\n')
+    return path
+
+
+if os.environ.get('F1_PROFILE'):
+    enable('json' if os.environ['F1_PROFILE'] == '1' else os.environ['F1_PROFILE'])
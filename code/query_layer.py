@@ -0,0 +1,222 @@
+import argparse
+import time
+
+import pandas as pd
+
+import average_positions_compound
+import pit_stops_vs_position
+import weather_tire_analysis
+from data_store import DATASET_DIR, SCHEMAS, SOURCE_FILES, TIMEDELTA, cached_table, load_table, table_columns
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+# Column holding the driver's abbreviation in each table
+DRIVER_COLUMNS = {'laps': 'Driver', 'positions': 'DriverName', 'results': 'Abbreviation'}
+
+
+# Filters on EventName and the driver column as SQL conditions with named
+# parameters; tables without a driver column are only filtered by event, and
+# tables without EventName (by_event=False) not by event
+def _conditions(table, event=None, driver=None, by_event=True):
+    conditions, params = [], {}
+    if event is not None and by_event:
+        conditions.append(f'{table}.EventName = $event')
+        params['event'] = event
+    if driver is not None and table in DRIVER_COLUMNS:
+        conditions.append(f'{table}.{DRIVER_COLUMNS[table]} = $driver')
+        params['driver'] = driver
+    return conditions, params
+
+
+def _where(conditions):
+    return ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
+
+# Each query as SQL over the laps, positions, weather and results views. The
+# filters go inside the scans, so DuckDB pushes them down to the parquet row groups.
+# results_by_event says whether the results carry EventName; like the pandas
+# analysis, results without it are matched to each driver's stops of all events.
+def _sql(name, event=None, driver=None, results_by_event=True):
+    lap_filters, params = _conditions('laps', event, driver)
+    laps = _where(lap_filters)
+    if name == 'average_positions':
+        return f"""
+            SELECT Driver, Compound, avg(Position) AS Position
+            FROM laps {laps}
+            GROUP BY Driver, Compound
+            ORDER BY Driver, Compound
+        """, params
+    if name == 'pit_stops_vs_position':
+        results = _where(_conditions('results', event, driver, results_by_event)[0])
+        if results_by_event:
+            pit_stops, join = 'SELECT * FROM races', 'results.EventName = pit_stops.EventName AND '
+        else:
+            pit_stops, join = 'SELECT Driver, sum(PitStops) AS PitStops FROM races GROUP BY Driver', ''
+        return f"""
+            WITH stints AS (
+                SELECT EventName, Driver, Stint,
+                       lag(Stint) OVER (PARTITION BY EventName, Driver ORDER BY LapNumber) AS PreviousStint
+                FROM laps {_where(lap_filters + ['laps.Stint IS NOT NULL'])}
+            ),
+            stops AS (
+                SELECT EventName, Driver, count(*) FILTER (WHERE Stint <> PreviousStint) AS PitStops
+                FROM stints
+                GROUP BY EventName, Driver
+                UNION ALL
+                SELECT DISTINCT EventName, Driver, 0 AS PitStops
+                FROM laps {laps}
+            ),
+            races AS (
+                SELECT EventName, Driver, max(PitStops) AS PitStops
+                FROM stops
+                GROUP BY EventName, Driver
+            ),
+            pit_stops AS ({pit_stops})
+            SELECT CASE WHEN PitStops <= 2 THEN '1-2' WHEN PitStops <= 4 THEN '3-4' ELSE '5+' END AS PitStopRange,
+                   avg(results.Position) AS Position
+            FROM pit_stops
+            JOIN (SELECT * FROM results {results}) AS results
+              ON {join}results.Abbreviation = pit_stops.Driver
+            GROUP BY PitStopRange
+            ORDER BY PitStopRange
+        """, params
+    if name in ('weather_tire', 'weather_by_compound'):
+        weather = _where(_conditions('weather', event)[0])
+        rows = f"""
+            SELECT laps.EventName, laps.Time, laps.Driver, laps.Compound,
+                   weather.AirTemp, weather.TrackTemp, weather.Humidity, weather.Rainfall
+            FROM (SELECT * FROM laps {laps}) AS laps
+            ASOF LEFT JOIN (SELECT * FROM weather {weather}) AS weather
+              ON laps.EventName = weather.EventName AND laps.Time >= weather.Time
+        """
+        if name == 'weather_tire':
+            return rows + ' ORDER BY laps.Time', params
+        return f"""
+            SELECT Compound, count(*) AS Laps, avg(AirTemp) AS AirTemp,
+                   avg(TrackTemp) AS TrackTemp, avg(Humidity) AS Humidity
+            FROM ({rows})
+            GROUP BY Compound
+            ORDER BY Compound
+        """, params
+    raise KeyError(name)
+
+
+# A table's rows for one event and/or driver. The filters are handed to the
+# parquet reader, which skips row groups that cannot match.
+def read(table, columns=None, event=None, driver=None, season=2024, data_dir=DATASET_DIR):
+    filters = []
+    if event is not None and 'EventName' in table_columns(table, season, data_dir):
+        filters.append(('EventName', '=', event))
+    if driver is not None and table in DRIVER_COLUMNS:
+        filters.append((DRIVER_COLUMNS[table], '=', driver))
+
+    path = cached_table(table, season, data_dir)
+    if path is not None:
+        df = pd.read_parquet(path, columns=columns, filters=filters or None)
+    else:
+        df = load_table(table, season, columns, data_dir)
+        for column, _, value in filters:
+            df = df[df[column] == value]
+    return df.reset_index(drop=True)
+
+
+# The analysis behind each query
+ANALYSES = {
+    'average_positions': average_positions_compound,
+    'pit_stops_vs_position': pit_stops_vs_position,
+    'weather_tire': weather_tire_analysis,
+    'weather_by_compound': weather_tire_analysis,
+}
+QUERIES = list(ANALYSES)
+
+
+# The same queries through the analysis modules themselves, on filtered reads
+def _run_pandas(name, event=None, driver=None, season=2024, data_dir=DATASET_DIR):
+    module = ANALYSES[name]
+    tables = {
+        table: read(table, columns, event, driver, season, data_dir)
+        for table, columns in module.TABLES.items()
+    }
+    result = module.finalize([module.summarize(**tables)])
+
+    if name == 'weather_by_compound':
+        result = result.groupby('Compound', observed=True).agg(
+            Laps=('Time', 'size'), AirTemp=('AirTemp', 'mean'),
+            TrackTemp=('TrackTemp', 'mean'), Humidity=('Humidity', 'mean'),
+        )
+    return result.reset_index(drop=name != 'weather_by_compound')
+
+
+# Open databases by the cache files their views read, so repeated queries
+# reuse one connection until a source file changes
+_connections = {}
+
+
+# An in-process DuckDB database with one view per table over its columnar cache
+# (or its CSV when the cache cannot be built)
+def connect(season=2024, data_dir=DATASET_DIR):
+    if duckdb is None:
+        raise ImportError('duckdb is not installed; install it or use query(), which falls back to pandas')
+    paths = {table: cached_table(table, season, data_dir) for table in SOURCE_FILES}
+    key = (season, data_dir, tuple(paths.values()))
+    if key in _connections:
+        return _connections[key]
+
+    con = duckdb.connect()
+    for table, path in paths.items():
+        if path is not None:
+            con.execute(f"CREATE VIEW {table} AS SELECT * FROM read_parquet('{path}')")
+        else:
+            con.register(table, load_table(table, season, data_dir=data_dir))
+    _connections[key] = con
+    return con
+
+
+# DuckDB reads the cache's duration columns as integer nanoseconds; turn them
+# back into the timedeltas the tables load with
+def _durations(df):
+    durations = {column for schema in SCHEMAS.values() for column, dtype in schema.items() if dtype == TIMEDELTA}
+    for column in df.columns:
+        if column in durations and df[column].dtype.kind in 'iu':
+            df[column] = pd.to_timedelta(df[column], unit='ns')
+    return df
+
+
+# Run one of the named analyses, optionally for a single event and/or driver.
+# Uses DuckDB when it is installed, otherwise the analysis code on filtered
+# parquet reads; both return a DataFrame.
+def query(name, event=None, driver=None, season=2024, data_dir=DATASET_DIR, con=None):
+    if name not in QUERIES:
+        raise KeyError(f"unknown query {name!r}; expected one of {QUERIES}")
+    if duckdb is None:
+        return _run_pandas(name, event, driver, season, data_dir)
+    con = con or connect(season, data_dir)
+    text, params = _sql(name, event, driver, 'EventName' in table_columns('results', season, data_dir))
+    return _durations(con.execute(text, params).df())
+
+
+# Ad-hoc SQL over the laps, positions, weather and results views
+def sql(text, params=None, season=2024, data_dir=DATASET_DIR, con=None):
+    con = con or connect(season, data_dir)
+    return _durations(con.execute(text, params or {}).df())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run an analysis as a query, optionally for one event or driver.')
+    parser.add_argument('query', help=f"one of {', '.join(QUERIES)}, or a SQL statement (needs duckdb)")
+    parser.add_argument('--event', default=None)
+    parser.add_argument('--driver', default=None)
+    parser.add_argument('--season', type=int, default=2024)
+    parser.add_argument('--data-dir', default=DATASET_DIR)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.query in QUERIES:
+        result = query(args.query, args.event, args.driver, args.season, args.data_dir)
+    else:
+        result = sql(args.query, season=args.season, data_dir=args.data_dir)
+    print(result.to_string(index=False))
+    print(f"{len(result)} rows in {(time.perf_counter() - start) * 1000:.1f} ms")
@@ -1,74 +1,114 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
-from collections import Counter
-
-# Load the data
-lap_data = pd.read_csv('../dataset/lap_2024.csv')
-
-# Group by EventName and Driver
-grouped = lap_data.groupby(['EventName', 'Driver'])
-
-# Calculate statistics
-race_stats = []
-for (event, driver), group in grouped:
-    total_laps = group['LapNumber'].max()
-    pit_stops = group['Stint'].nunique() - 1  # Subtract 1 because the first stint doesn't count as a pit stop
-    tire_choices = group['Compound'].value_counts().index[0]  # Most common tire
-    race_stats.append({
-        'EventName': event,
-        'Driver': driver,
-        'TotalLaps': total_laps,
-        'PitStops': pit_stops,
-        'MostCommonTire': tire_choices
-    })
-
-race_stats_df = pd.DataFrame(race_stats)
+from charts import chart, chart_path, load_font, parse_args, render
+from data_store import load_laps
+from pit_stops import LAP_COLUMNS, count_pit_stops, extract_pit_stops
+from profiling import profiled
+
+# Tables and columns this analysis reads
+TABLES = {'laps': LAP_COLUMNS}
+OUTPUT = 'race_length_stats.csv'
+
+
+# One row of statistics per (EventName, Driver) race, computed for all races at once
+@profiled()
+def summarize(laps):
+    keys = ['EventName', 'Driver']
+    race_stats_df = laps.groupby(keys, observed=True)['LapNumber'].max().rename('TotalLaps').reset_index()
+
+    # Most common tire of each race; ties go to the first compound in category order,
+    # as value_counts() would pick them
+    tire_counts = laps.groupby(keys + ['Compound'], observed=True).size().rename('Laps').reset_index()
+    tire_counts = tire_counts.sort_values('Laps', ascending=False, kind='stable').drop_duplicates(keys)
+    race_stats_df['MostCommonTire'] = race_stats_df.merge(
+        tire_counts[keys + ['Compound']], on=keys, how='left')['Compound'].astype(object)
+
+    # Length of every stint, then its spread over each race
+    stint_laps = laps.groupby(keys + ['Stint'], observed=True).size().rename('StintLength').reset_index()
+    stint_stats = stint_laps.groupby(keys, observed=True)['StintLength'].agg(
+        Stints='count', MinStintLength='min', AvgStintLength='mean', MaxStintLength='max').reset_index()
+    race_stats_df = race_stats_df.merge(stint_stats, on=keys, how='left')
+
+    # Add the number of pit stops from the shared stops table
+    pit_stops = count_pit_stops(laps, extract_pit_stops(laps))
+    return race_stats_df.merge(pit_stops, on=keys, how='left')
+
 
 # Calculate averages by race length
-race_length_stats = race_stats_df.groupby('TotalLaps').agg({
-    'PitStops': 'mean',
-    'MostCommonTire': lambda x: Counter(x).most_common(1)[0][0]
-}).reset_index()
-
-race_length_stats.columns = ['RaceLength', 'AvgPitStops', 'MostCommonTire']
-
-# Save to CSV
-race_length_stats.to_csv('../csv_generated/race_length_stats.csv', index=False)
-
-# Plotting
-plt.figure(figsize=(12, 8))
-plt.rcParams['font.family'] = 'sans-serif'
-plt.rcParams['font.sans-serif'] = ['JetBrains Mono']
-
-jetbrains_mono = FontProperties(fname="../fonts/JetBrainsMono-Regular.ttf")
-plt.title(plt.gca().get_title(), fontproperties=jetbrains_mono)
-plt.xlabel(plt.gca().get_xlabel(), fontproperties=jetbrains_mono)
-plt.ylabel(plt.gca().get_ylabel(), fontproperties=jetbrains_mono)
-for label in plt.gca().get_xticklabels() + plt.gca().get_yticklabels():
-    label.set_fontproperties(jetbrains_mono)
-
-# # Set the style and color palette
-# plt.style.use('dark_background')
-# sns.set_palette("husl")
-
-# Create a scatter plot
-for tire in race_length_stats['MostCommonTire'].unique():
-    data = race_length_stats[race_length_stats['MostCommonTire'] == tire]
-    plt.scatter(data['RaceLength'], data['AvgPitStops'], 
-                label=tire, s=100, alpha=0.7)
-
-plt.xlabel('Race Length (Laps)', fontproperties=jetbrains_mono)
-plt.ylabel('Average Number of Pit Stops', fontproperties=jetbrains_mono)
-plt.title('Pit Stops vs Race Length by Most Common Tire', fontproperties=jetbrains_mono)
-plt.legend(prop=jetbrains_mono, title="Most Common Tire")
-
-# Customize the plot
-plt.grid(True, linestyle='--', alpha=0.7)
-plt.tight_layout()
-
-# Save the plot
-plt.savefig('../charts/race_analysis_plot_improved.png', facecolor='white', edgecolor='none')
-plt.close()
-
-print("Analysis complete. Results saved to 'race_length_stats.csv' and 'race_analysis_plot_improved.png'.")
\ No newline at end of file
+@profiled()
+def finalize(partials):
+    race_stats_df = pd.concat(partials, ignore_index=True)
+    race_length_stats = race_stats_df.groupby('TotalLaps').agg(
+        AvgPitStops=('PitStops', 'mean'),
+        AvgStintLength=('AvgStintLength', 'mean'),
+        MaxStintLength=('MaxStintLength', 'max'),
+    )
+
+    # Most common tire per race length; ties go to the tire seen first, like Counter.most_common
+    tires = race_stats_df[['TotalLaps', 'MostCommonTire']].dropna().reset_index(names='Order')
+    tires = tires.groupby(['TotalLaps', 'MostCommonTire']).agg(Races=('Order', 'size'), First=('Order', 'min'))
+    tires = tires.reset_index().sort_values(['TotalLaps', 'Races', 'First'], ascending=[True, False, True])
+    race_length_stats['MostCommonTire'] = tires.drop_duplicates('TotalLaps').set_index('TotalLaps')['MostCommonTire']
+
+    race_length_stats = race_length_stats.reset_index()
+    race_length_stats.columns = ['RaceLength', 'AvgPitStops', 'AvgStintLength', 'MaxStintLength', 'MostCommonTire']
+    return race_length_stats[['RaceLength', 'AvgPitStops', 'MostCommonTire', 'AvgStintLength', 'MaxStintLength']]
+
+
+def plot(race_length_stats):
+    import matplotlib.pyplot as plt
+
+    # Plotting
+    plt.figure(figsize=(12, 8))
+    plt.rcParams['font.family'] = 'sans-serif'
+    plt.rcParams['font.sans-serif'] = ['JetBrains Mono']
+
+    jetbrains_mono = load_font()
+    plt.title(plt.gca().get_title(), fontproperties=jetbrains_mono)
+    plt.xlabel(plt.gca().get_xlabel(), fontproperties=jetbrains_mono)
+    plt.ylabel(plt.gca().get_ylabel(), fontproperties=jetbrains_mono)
+    for label in plt.gca().get_xticklabels() + plt.gca().get_yticklabels():
+        label.set_fontproperties(jetbrains_mono)
+
+    # # Set the style and color palette
+    # plt.style.use('dark_background')
+    # sns.set_palette("husl")
+
+    # Create a scatter plot
+    for tire in race_length_stats['MostCommonTire'].unique():
+        data = race_length_stats[race_length_stats['MostCommonTire'] == tire]
+        plt.scatter(data['RaceLength'], data['AvgPitStops'],
+                    label=tire, s=100, alpha=0.7)
+
+    plt.xlabel('Race Length (Laps)', fontproperties=jetbrains_mono)
+    plt.ylabel('Average Number of Pit Stops', fontproperties=jetbrains_mono)
+    plt.title('Pit Stops vs Race Length by Most Common Tire', fontproperties=jetbrains_mono)
+    plt.legend(prop=jetbrains_mono, title="Most Common Tire")
+
+    # Customize the plot
+    plt.grid(True, linestyle='--', alpha=0.7)
+    plt.tight_layout()
+
+    # Save the plot
+    plt.savefig(chart_path('race_analysis_plot_improved.png'), facecolor='white', edgecolor='none')
+    plt.close()
+
+
+def charts(race_length_stats, partials=None):
+    return [chart(plot, race_length_stats)]
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Load the data
+    lap_data = load_laps(columns=TABLES['laps'])
+
+    race_length_stats = finalize([summarize(lap_data)])
+
+    # Save to CSV
+    race_length_stats.to_csv('../csv_generated/race_length_stats.csv', index=False)
+
+    if args.charts:
+        render(charts(race_length_stats), args.chart_workers)
+
+    print("Analysis complete. Results saved to 'race_length_stats.csv' and 'race_analysis_plot_improved.png'.")
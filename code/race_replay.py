@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import json
+import math
+import time
+
+import numpy as np
+
+from data_store import DATASET_DIR
+from live_timing import WINDOW, LiveTiming, event_records
+
+# Producers hand records over in batches of this many, to keep the event loop
+# responsive when replaying as fast as possible
+BATCH = 500
+
+
+# A record as a JSON object: time values become FastF1 strings, NaN becomes null
+def _jsonable(table, record):
+    values = {'table': table}
+    for key, value in record.items():
+        if hasattr(value, 'total_seconds'):
+            value = None if value != value else str(value)
+        elif isinstance(value, float) and math.isnan(value):
+            value = None
+        elif hasattr(value, 'item'):
+            value = value.item()
+        values[key] = value
+    return values
+
+
+# Feed one event's records to `send` at `speed` times real time (0: no delay).
+# Each record goes out with the time it was due, so the sink can measure latency.
+async def replay_event(clock, records, send, speed, began):
+    start = clock[0] if len(clock) else 0.0
+    for i, record in enumerate(records):
+        due = time.monotonic()
+        if speed > 0 and not np.isnan(clock[i]):
+            due = began + (clock[i] - start) / speed
+            delay = due - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+        await send(record, due)
+        if (i + 1) % BATCH == 0:
+            await asyncio.sleep(0)
+
+
+# In-process sink: a queue drained by a LiveTiming consumer. Latency runs from
+# the moment a record was due to the moment its update finished. A record whose
+# update fails is counted and skipped, so the queue keeps draining; close()
+# raises the first failure once every record has been handled.
+class LocalSink:
+
+    def __init__(self, window=WINDOW):
+        self.queue = asyncio.Queue(maxsize=10 * BATCH)
+        self.state = LiveTiming(window)
+        self.latencies = []
+        self.errors = []
+
+    async def send(self, record, due):
+        await self.queue.put((record, due))
+
+    async def consume(self):
+        while True:
+            (table, record), due = await self.queue.get()
+            try:
+                self.state.update(table, record)
+                self.latencies.append(time.monotonic() - due)
+            except Exception as error:
+                self.errors.append(error)
+            finally:
+                self.queue.task_done()
+
+    async def close(self):
+        await self.queue.join()
+        if self.errors:
+            raise RuntimeError(f"{len(self.errors)} records failed to update the live state") from self.errors[0]
+
+
+# Socket sink: JSON lines to a live_timing.py socket listener. Latency runs from
+# the moment a record was due to the moment the socket took it.
+class SocketSink:
+
+    def __init__(self, host, port):
+        self.host, self.port = host, port
+        self.writer = None
+        self.latencies = []
+
+    async def open(self):
+        _, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def send(self, record, due):
+        table, values = record
+        self.writer.write((json.dumps(_jsonable(table, values)) + '\n').encode())
+        await self.writer.drain()
+        self.latencies.append(time.monotonic() - due)
+
+    async def consume(self):
+        pass
+
+    async def close(self):
+        self.writer.close()
+        await self.writer.wait_closed()
+
+
+# Replay the events concurrently, `concurrency` at a time, into one sink
+async def replay(events, sink, speed=0.0, concurrency=None):
+    limit = asyncio.Semaphore(concurrency or len(events) or 1)
+    if isinstance(sink, SocketSink):
+        await sink.open()
+    consumer = asyncio.create_task(sink.consume())
+
+    async def run_event(clock, records):
+        async with limit:
+            await replay_event(clock, records, sink.send, speed, time.monotonic())
+
+    began = time.monotonic()
+    try:
+        await asyncio.gather(*(run_event(clock, records) for _, clock, records in events))
+        await sink.close()
+    finally:
+        consumer.cancel()
+    return time.monotonic() - began
+
+
+# Throughput and latency percentiles of a finished replay
+def report(sink, elapsed):
+    latencies = np.array(sink.latencies) * 1000
+    return {
+        'records': len(latencies),
+        'seconds': elapsed,
+        'records_per_second': len(latencies) / elapsed if elapsed > 0 else math.inf,
+        'latency_p50_ms': np.percentile(latencies, 50) if len(latencies) else math.nan,
+        'latency_p95_ms': np.percentile(latencies, 95) if len(latencies) else math.nan,
+        'latency_p99_ms': np.percentile(latencies, 99) if len(latencies) else math.nan,
+        'latency_max_ms': latencies.max() if len(latencies) else math.nan,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replay the season CSVs concurrently to load-test live processing.')
+    parser.add_argument('--season', type=int, default=2024)
+    parser.add_argument('--data-dir', default=DATASET_DIR)
+    parser.add_argument('--events', nargs='*', default=None, help='events to replay (default: all)')
+    parser.add_argument('--speed', type=float, default=0.0, help='times real time; 0 for as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=None, help='events replayed at once (default: all)')
+    parser.add_argument('--host', default=None, help='send to a live_timing.py socket instead of in process')
+    parser.add_argument('--port', type=int, default=9099)
+    args = parser.parse_args()
+
+    events = [
+        (event, clock, records) for event, clock, records in event_records(args.season, args.data_dir)
+        if not args.events or event in args.events
+    ]
+    sink = SocketSink(args.host, args.port) if args.host else LocalSink()
+    elapsed = asyncio.run(replay(events, sink, args.speed, args.concurrency))
+
+    for key, value in report(sink, elapsed).items():
+        print(f"{key:<20} {value:,.3f}" if isinstance(value, float) else f"{key:<20} {value:,}")
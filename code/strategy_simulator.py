@@ -0,0 +1,210 @@
+import argparse
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATASET_DIR, load_laps
+from pit_stops import LAP_COLUMNS, extract_pit_stops
+from tyre_model import DegradationModel, fit
+
+# Slick compounds a dry strategy is built from; at least two must be used
+DRY_COMPOUNDS = ['SOFT', 'MEDIUM', 'HARD']
+MAX_STOPS = 3
+MIN_STINT = 5
+
+# Used when an event (and the whole season) has no timed pit stop
+DEFAULT_PIT_LOSS = 22.0
+DEFAULT_PIT_SPREAD = 2.0
+
+# A stop made under the safety car loses this share of a green-flag stop
+SAFETY_CAR_PIT_SHARE = 0.5
+DEFAULT_SAFETY_CAR_LAPS = 4
+
+
+# Every sequence of 2 to MAX_STOPS + 1 stints using at least two compounds
+def compound_sequences(compounds=DRY_COMPOUNDS, max_stops=MAX_STOPS):
+    sequences = []
+    for stints in range(2, max_stops + 2):
+        for sequence in itertools.product(compounds, repeat=stints):
+            if len(set(sequence)) > 1:
+                sequences.append(sequence)
+    return sequences
+
+
+# Stint lengths that minimise the expected tyre time of a sequence over race_laps.
+# With linear degradation a stint of n laps costs Base * n + Degradation * n(n+1)/2,
+# so at the optimum every stint's marginal lap Base + Degradation * (n + 1/2) is the
+# same; stints that would come out shorter than MIN_STINT are pinned to it.
+def stint_lengths(sequence, model, race_laps):
+    coefficients = np.array([model.coefficients[compound] for compound in sequence])
+    base, degradation = coefficients[:, 0], np.maximum(coefficients[:, 1], 1e-3)
+    lengths = np.full(len(sequence), float(MIN_STINT))
+    free = np.ones(len(sequence), dtype=bool)
+    for _ in range(len(sequence)):
+        laps_left = race_laps - MIN_STINT * (~free).sum()
+        marginal = (laps_left + (base[free] / degradation[free] + 0.5).sum()) / (1 / degradation[free]).sum()
+        lengths[free] = (marginal - base[free]) / degradation[free] - 0.5
+        short = free & (lengths < MIN_STINT)
+        if not short.any():
+            break
+        lengths[short] = MIN_STINT
+        free &= ~short
+
+    # Round down, then hand the laps left over to the stints that lost the most
+    rounded = np.floor(lengths).astype(int)
+    extra = race_laps - rounded.sum()
+    rounded[np.argsort(rounded - lengths)[:extra]] += 1
+    return rounded
+
+
+# Figures of the whole season, computed once and shared by its events: the
+# pit time of every stop, for events without a timed stop, and the safety car
+# odds and length, since one race only shows one draw
+def season_parameters(laps, stops):
+    # Track status codes list every flag shown during the lap; 4 is the safety car
+    safety_car = laps['TrackStatus'].astype(str).str.contains('4')
+    neutralised = laps.loc[safety_car].groupby('EventName', observed=True)['LapNumber'].nunique()
+    neutralised = neutralised.reindex(laps['EventName'].dropna().unique(), fill_value=0)
+
+    return {
+        'pit_time': stops['PitTime'].dropna(),
+        'safety_car_odds': (neutralised > 0).mean(),
+        'safety_car_laps': neutralised[neutralised > 0].mean() if (neutralised > 0).any() else DEFAULT_SAFETY_CAR_LAPS,
+    }
+
+
+# Pit stop time and race length of an event from its own laps and stops, with
+# the season's figures from season_parameters()
+def race_parameters(event_laps, event_stops, season):
+    pit_time = event_stops['PitTime'].dropna()
+    if pit_time.empty:
+        pit_time = season['pit_time']
+
+    return {
+        'race_laps': int(event_laps['LapNumber'].max()),
+        'pit_loss': pit_time.mean() if len(pit_time) else DEFAULT_PIT_LOSS,
+        'pit_spread': pit_time.std() if len(pit_time) > 1 else DEFAULT_PIT_SPREAD,
+        'safety_car_odds': season['safety_car_odds'],
+        'safety_car_laps': season['safety_car_laps'],
+    }
+
+
+# Random race conditions shared by every strategy, so strategies are compared on
+# the same races: the safety car window (start lap, or 0 for none) and the
+# duration of each potential stop
+def draw_races(params, simulations, rng):
+    race_laps = params['race_laps']
+    has_safety_car = rng.random(simulations) < params['safety_car_odds']
+    start = np.where(has_safety_car, rng.integers(1, race_laps, size=simulations), 0)
+    length = np.maximum(1, rng.poisson(params['safety_car_laps'], size=simulations))
+    pit_loss = rng.normal(params['pit_loss'], params['pit_spread'], size=(simulations, MAX_STOPS))
+    return {'start': start, 'end': np.where(has_safety_car, start + length, 0),
+            'pit_loss': np.clip(pit_loss, 0.5 * params['pit_loss'], None)}
+
+
+# Race times of a batch of strategies over all simulated races: tyre time from
+# the degradation model, lap by lap, plus each stop's pit loss, reduced when the
+# in-lap falls inside the safety car window.
+# Returns the pit laps of each strategy and a (strategies, simulations) array.
+def simulate_strategies(sequences, model, params, races):
+    race_laps = params['race_laps']
+    lap = np.arange(1, race_laps + 1)
+    pit_laps = []
+    times = np.empty((len(sequences), len(races['start'])))
+    for i, sequence in enumerate(sequences):
+        lengths = stint_lengths(sequence, model, race_laps)
+        starts = np.r_[0, np.cumsum(lengths)[:-1]]
+        compounds = np.repeat([model.codes[compound] for compound in sequence], lengths)
+        tyre_life = lap - np.repeat(starts, lengths)
+        tyre_time = model.predict(compounds, tyre_life, lap).sum()
+
+        in_laps = np.cumsum(lengths)[:-1]
+        under_safety_car = (in_laps >= races['start'][:, None]) & (in_laps < races['end'][:, None])
+        stop_loss = races['pit_loss'][:, :len(in_laps)] * np.where(under_safety_car, SAFETY_CAR_PIT_SHARE, 1.0)
+        times[i] = tyre_time + stop_loss.sum(axis=1)
+        pit_laps.append(in_laps)
+    return pit_laps, times
+
+
+COLUMNS = ['EventName', 'Rank', 'Strategy', 'Stops', 'PitLaps', 'MeanTime', 'StdTime', 'P10Time', 'P90Time',
+           'WinShare', 'Gap']
+
+
+# Rank every strategy of one event by its mean race time over `simulations`
+# randomized races. Strategies are split over `workers` processes; with one
+# worker everything runs in process. An event with fewer than two dry
+# compounds fitted (a wet race) has no strategy and gets an empty ranking.
+def rank_strategies(event, model, params, simulations=5000, seed=0, workers=1):
+    sequences = [sequence for sequence in compound_sequences() if set(sequence) <= set(model.compounds)]
+    if not sequences:
+        return pd.DataFrame(columns=COLUMNS)
+    races = draw_races(params, simulations, np.random.default_rng(seed))
+
+    workers = max(1, min(len(sequences), workers or os.cpu_count() or 1))
+    if workers == 1:
+        pit_laps, times = simulate_strategies(sequences, model, params, races)
+    else:
+        batches = [sequences[i::workers] for i in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(simulate_strategies, batches, itertools.repeat(model),
+                                    itertools.repeat(params), itertools.repeat(races)))
+        order = np.argsort(np.concatenate([np.arange(len(sequences))[i::workers] for i in range(workers)]))
+        pit_laps = [laps for result in results for laps in result[0]]
+        pit_laps = [pit_laps[i] for i in order]
+        times = np.concatenate([result[1] for result in results])[order]
+
+    fastest = np.bincount(times.argmin(axis=0), minlength=len(sequences))
+    ranking = pd.DataFrame({
+        'EventName': event,
+        'Strategy': ['-'.join(sequence) for sequence in sequences],
+        'Stops': [len(sequence) - 1 for sequence in sequences],
+        'PitLaps': ['/'.join(map(str, laps)) for laps in pit_laps],
+        'MeanTime': times.mean(axis=1),
+        'StdTime': times.std(axis=1),
+        'P10Time': np.percentile(times, 10, axis=1),
+        'P90Time': np.percentile(times, 90, axis=1),
+        'WinShare': fastest / simulations,
+    }).sort_values('MeanTime', ignore_index=True)
+    ranking['Gap'] = ranking['MeanTime'] - ranking['MeanTime'].iloc[0]
+    ranking.insert(1, 'Rank', np.arange(1, len(ranking) + 1))
+    return ranking
+
+
+def simulate_season(events=None, season=2024, data_dir=DATASET_DIR, simulations=5000, seed=0, workers=1):
+    laps = load_laps(columns=sorted(set(LAP_COLUMNS) | {'TrackStatus'}), season=season, data_dir=data_dir)
+    stops = extract_pit_stops(laps)
+    coefficients = fit(season, data_dir)
+    events = events or sorted(laps['EventName'].dropna().unique())
+    season_params = season_parameters(laps, stops)
+    event_laps = dict(list(laps.groupby('EventName', observed=True)))
+    event_stops = dict(list(stops.groupby('EventName', observed=True)))
+
+    rankings = []
+    for event in events:
+        model = DegradationModel(coefficients, event)
+        params = race_parameters(event_laps.get(event, laps.iloc[0:0]), event_stops.get(event, stops.iloc[0:0]),
+                                 season_params)
+        rankings.append(rank_strategies(event, model, params, simulations, seed, workers))
+    rankings = [ranking for ranking in rankings if len(ranking)]
+    if not rankings:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(rankings, ignore_index=True)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Rank 1-3 stop strategies with Monte Carlo race simulations.')
+    parser.add_argument('events', nargs='*', help='events to simulate (default: every event of the season)')
+    parser.add_argument('--season', type=int, default=2024)
+    parser.add_argument('--simulations', type=int, default=5000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help='processes to split the strategies over')
+    parser.add_argument('--data-dir', default=DATASET_DIR)
+    args = parser.parse_args()
+
+    rankings = simulate_season(args.events, args.season, args.data_dir, args.simulations, args.seed, args.workers)
+    rankings.to_csv('../csv_generated/strategy_simulator.csv', index=False)
+    print(rankings.groupby('EventName', sort=False).head(3).to_string(index=False))
+    print("Simulation complete. Results saved to 'strategy_simulator.csv'.")
@@ -0,0 +1,232 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import SOURCE_FILES
+
+# 2024 calendar; larger scales repeat it with numbered copies of each event
+EVENTS = [
+    'Bahrain Grand Prix', 'Saudi Arabian Grand Prix', 'Australian Grand Prix', 'Japanese Grand Prix',
+    'Chinese Grand Prix', 'Miami Grand Prix', 'Emilia Romagna Grand Prix', 'Monaco Grand Prix',
+    'Canadian Grand Prix', 'Spanish Grand Prix', 'Austrian Grand Prix', 'British Grand Prix',
+    'Hungarian Grand Prix', 'Belgian Grand Prix', 'Dutch Grand Prix', 'Italian Grand Prix',
+    'Azerbaijan Grand Prix', 'Singapore Grand Prix', 'United States Grand Prix', 'Mexico City Grand Prix',
+    'São Paulo Grand Prix', 'Las Vegas Grand Prix', 'Qatar Grand Prix', 'Abu Dhabi Grand Prix',
+]
+
+# (abbreviation, number, team)
+DRIVERS = [
+    ('VER', 1, 'Red Bull Racing'), ('PER', 11, 'Red Bull Racing'),
+    ('LEC', 16, 'Ferrari'), ('SAI', 55, 'Ferrari'),
+    ('NOR', 4, 'McLaren'), ('PIA', 81, 'McLaren'),
+    ('HAM', 44, 'Mercedes'), ('RUS', 63, 'Mercedes'),
+    ('ALO', 14, 'Aston Martin'), ('STR', 18, 'Aston Martin'),
+    ('GAS', 10, 'Alpine'), ('OCO', 31, 'Alpine'),
+    ('ALB', 23, 'Williams'), ('SAR', 2, 'Williams'),
+    ('TSU', 22, 'RB'), ('RIC', 3, 'RB'),
+    ('HUL', 27, 'Haas F1 Team'), ('MAG', 20, 'Haas F1 Team'),
+    ('BOT', 77, 'Kick Sauber'), ('ZHO', 24, 'Kick Sauber'),
+]
+
+COMPOUNDS = np.array(['SOFT', 'MEDIUM', 'HARD'])
+
+# Pace offset (s) and degradation (s per lap of tyre life) of each compound
+COMPOUND_PACE = np.array([0.0, 0.4, 0.8])
+COMPOUND_DEG = np.array([0.08, 0.05, 0.03])
+
+RACE_START = 3600.0
+PIT_LOSS = 22.0
+
+
+# FastF1 exports times as e.g. "0 days 01:02:03.456000". The digits are written
+# straight into a byte matrix; formatting through pandas is far too slow at
+# 100x scale. Session times stay below ten days.
+def format_times(seconds):
+    seconds = np.asarray(seconds, dtype=float)
+    missing = np.isnan(seconds)
+    micros = np.round(np.where(missing, 0, seconds) * 1e6).astype(np.int64)
+    mat = np.frombuffer(b'0 days 00:00:00.000000' * len(micros), dtype=np.uint8).reshape(-1, 22).copy()
+    fields = [
+        (0, 1, micros // 86_400_000_000),
+        (7, 2, micros // 3_600_000_000 % 24),
+        (10, 2, micros // 60_000_000 % 60),
+        (13, 2, micros // 1_000_000 % 60),
+        (16, 6, micros % 1_000_000),
+    ]
+    for start, width, value in fields:
+        for i in range(width):
+            mat[:, start + width - 1 - i] += (value // 10 ** i % 10).astype(np.uint8)
+    strings = mat.view('S22').ravel().astype(str).astype(object)
+    strings[missing] = None
+    return strings
+
+
+def event_names(scale):
+    n = max(1, int(round(scale * len(EVENTS))))
+    return [EVENTS[i % len(EVENTS)] + ('' if i < len(EVENTS) else f' #{i // len(EVENTS) + 1}') for i in range(n)]
+
+
+# Race laps for every driver of every event, with one to three stops per race
+def generate_laps(events, rng):
+    n_events, n_drivers = len(events), len(DRIVERS)
+    race_laps = rng.integers(44, 72, size=n_events)
+
+    # One row per (event, driver, lap)
+    races = np.repeat(np.arange(n_events * n_drivers), np.repeat(race_laps, n_drivers))
+    event = races // n_drivers
+    driver = races % n_drivers
+    starts = np.r_[0, np.cumsum(np.repeat(race_laps, n_drivers))[:-1]]
+    lap = np.arange(len(races)) - starts[races] + 1
+    laps_in_race = race_laps[event]
+
+    # Pit on laps picked so that every race has between one and three stops
+    stop_share = rng.integers(1, 4, size=n_events * n_drivers) / laps_in_race[starts]
+    pit_in = (rng.random(len(races)) < stop_share[races]) & (lap > 5) & (lap < laps_in_race - 3)
+    pit_in |= lap == (laps_in_race // 2)
+    stops_before = np.r_[0, np.cumsum(pit_in)[:-1]]
+    stint = 1 + stops_before - stops_before[starts][races]
+    pit_out = np.r_[False, pit_in[:-1]] & (lap > 1)
+
+    # Tyre life counts laps since the stint started
+    row = np.arange(len(races))
+    stint_start = np.maximum.accumulate(np.where((lap == 1) | pit_out, row, 0))
+    tyre_life = row - stint_start + 1
+    compound = rng.integers(0, 3, size=(n_events * n_drivers, 4))[races, np.minimum(stint - 1, 3)]
+
+    lap_time = (
+        90.0 + 2.0 * rng.random(n_events)[event]
+        + 0.05 * driver
+        + COMPOUND_PACE[compound] + COMPOUND_DEG[compound] * tyre_life
+        - 0.03 * lap
+        + rng.normal(0, 0.4, size=len(races))
+        + np.where(pit_in, PIT_LOSS / 2, 0) + np.where(pit_out, PIT_LOSS / 2, 0)
+    )
+    lap_time[lap == 1] += 5.0
+
+    # Session time at the end of each lap
+    elapsed = np.cumsum(lap_time)
+    time = RACE_START + 0.2 * driver + elapsed - (elapsed - lap_time)[starts][races]
+    lap_start = time - lap_time
+
+    df = pd.DataFrame({
+        'Time': time,
+        'Driver': np.array([d[0] for d in DRIVERS])[driver],
+        'DriverNumber': np.array([d[1] for d in DRIVERS])[driver],
+        'LapTime': np.where(rng.random(len(races)) < 0.005, np.nan, lap_time),
+        'LapNumber': lap.astype(float),
+        'Stint': stint.astype(float),
+        'PitOutTime': np.where(pit_out, lap_start + PIT_LOSS / 2, np.nan),
+        'PitInTime': np.where(pit_in, time - 1.0, np.nan),
+        'Compound': COMPOUNDS[compound],
+        'TyreLife': tyre_life.astype(float),
+        'FreshTyre': True,
+        'Team': np.array([d[2] for d in DRIVERS])[driver],
+        'LapStartTime': lap_start,
+        'TrackStatus': rng.choice(['1', '2', '4', '12', '671'], size=len(races), p=[0.9, 0.04, 0.03, 0.02, 0.01]),
+        'Deleted': False,
+        'IsAccurate': True,
+        'EventName': np.array(events)[event],
+        '_race': races,
+    })
+    df['LapStartDate'] = (pd.Timestamp('2024-03-02 15:00') + pd.to_timedelta(lap_start - RACE_START, unit='s')).astype(str)
+    df['Position'] = df.groupby(['EventName', 'LapNumber'])['Time'].rank(method='first')
+    return df
+
+
+# Position samples every `interval` seconds of each driver's race
+def generate_positions(laps, interval, rng):
+    bounds = laps.groupby('_race').agg(Start=('LapStartTime', 'min'), End=('Time', 'max'),
+                                       Driver=('Driver', 'first'), EventName=('EventName', 'first'))
+    counts = ((bounds['End'] - bounds['Start']) // interval).astype(int) + 1
+    race = np.repeat(np.arange(len(bounds)), counts)
+    offset = np.arange(len(race)) - np.r_[0, np.cumsum(counts)[:-1]][race]
+    time = bounds['Start'].to_numpy()[race] + offset * interval + rng.random(len(race))
+    angle = rng.random(len(race)) * 2 * np.pi
+    return pd.DataFrame({
+        'Time': format_times(time),
+        'X': np.cos(angle) * 5000,
+        'Y': np.sin(angle) * 3000,
+        'Z': 0.0,
+        'Status': 'OnTrack',
+        'DriverName': bounds['Driver'].to_numpy()[race],
+        'EventName': bounds['EventName'].to_numpy()[race],
+    })
+
+
+# One weather reading a minute from before the start to after the flag
+def generate_weather(laps, rng):
+    bounds = laps.groupby('EventName', sort=False)['Time'].max()
+    counts = ((bounds.to_numpy() - RACE_START + 600) // 60).astype(int) + 1
+    event = np.repeat(np.arange(len(bounds)), counts)
+    offset = np.arange(len(event)) - np.r_[0, np.cumsum(counts)[:-1]][event]
+    air = 18 + 15 * rng.random(len(bounds))
+    return pd.DataFrame({
+        'Time': format_times(RACE_START - 600 + 60.0 * offset),
+        'AirTemp': np.round(air[event] + rng.normal(0, 0.3, len(event)), 1),
+        'Humidity': np.round(40 + 30 * rng.random(len(bounds))[event] + rng.normal(0, 1, len(event)), 1),
+        'Pressure': np.round(1010 + rng.normal(0, 2, len(event)), 1),
+        'Rainfall': rng.random(len(bounds))[event] < 0.1,
+        'TrackTemp': np.round(air[event] + 12 + rng.normal(0, 0.5, len(event)), 1),
+        'WindDirection': rng.integers(0, 360, len(event)),
+        'WindSpeed': np.round(rng.random(len(event)) * 4, 1),
+        'EventName': bounds.index.to_numpy()[event],
+    })
+
+
+# Classification of each race from the drivers' final session times
+def generate_results(laps, rng):
+    final = laps.groupby('_race').agg(Time=('Time', 'max'), Driver=('Driver', 'first'),
+                                      DriverNumber=('DriverNumber', 'first'), Team=('Team', 'first'),
+                                      EventName=('EventName', 'first'))
+    position = final.groupby('EventName')['Time'].rank(method='first')
+    retired = rng.random(len(final)) < 0.05
+    return pd.DataFrame({
+        'DriverNumber': final['DriverNumber'].to_numpy(),
+        'Abbreviation': final['Driver'].to_numpy(),
+        'TeamName': final['Team'].to_numpy(),
+        'Position': position.to_numpy(),
+        'ClassifiedPosition': np.where(retired, 'R', position.astype(int).astype(str)),
+        'GridPosition': rng.permutation(len(final)) % len(DRIVERS) + 1.0,
+        'Status': np.where(retired, 'Retired', 'Finished'),
+        'EventName': final['EventName'].to_numpy(),
+    })
+
+
+# Lap, position, weather and result tables for `scale` seasons' worth of races,
+# with the columns and time formats of the real CSV exports
+def generate_season(scale=1, seed=0, position_interval=5.0):
+    rng = np.random.default_rng(seed)
+    laps = generate_laps(event_names(scale), rng)
+    tables = {
+        'positions': generate_positions(laps, position_interval, rng),
+        'weather': generate_weather(laps, rng),
+        'results': generate_results(laps, rng),
+    }
+    for column in ['Time', 'LapTime', 'PitOutTime', 'PitInTime', 'LapStartTime']:
+        laps[column] = format_times(laps[column])
+    tables['laps'] = laps.drop(columns='_race')
+    return tables
+
+
+def write_season(data_dir, season=2024, scale=1, seed=0, position_interval=5.0):
+    os.makedirs(data_dir, exist_ok=True)
+    tables = generate_season(scale, seed, position_interval)
+    for table, df in tables.items():
+        df.to_csv(os.path.join(data_dir, SOURCE_FILES[table].format(season=season)), index=False)
+    return {table: len(df) for table, df in tables.items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Write a synthetic season of lap, position, weather and result CSVs.')
+    parser.add_argument('data_dir')
+    parser.add_argument('--season', type=int, default=2024)
+    parser.add_argument('--scale', type=float, default=1, help='number of seasons worth of races')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--position-interval', type=float, default=5.0, help='seconds between position samples')
+    args = parser.parse_args()
+
+    rows = write_season(args.data_dir, args.season, args.scale, args.seed, args.position_interval)
+    for table, n in rows.items():
+        print(f"{table}: {n} rows")
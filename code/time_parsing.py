@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+from profiling import profiled
+
+NAT = np.iinfo(np.int64).min
+
+# Rows are parsed in blocks so the byte matrix stays small on position-sized columns
+CHUNK_ROWS = 1 << 20
+
+_DAYS = np.frombuffer(b' days ', dtype=np.uint8)
+_ZERO = ord('0')
+
+
+# Parse rows whose first ':' sits at column `colon` of the byte matrix, i.e. all share
+# one "D days HH:MM:SS[.fffffffff]" layout, so every field is a fixed column slice.
+# Returns nanoseconds and a mask of the rows that really matched that layout.
+def _parse_layout(mat, colon):
+    n = len(mat)
+    days_end = colon - 8
+    if days_end < 1:
+        return np.full(n, NAT, dtype=np.int64), np.zeros(n, dtype=bool)
+
+    ok = np.ones(n, dtype=bool)
+
+    def number(columns):
+        value = np.zeros(n, dtype=np.int64)
+        for column in columns:
+            digit = mat[:, column].astype(np.int64) - _ZERO
+            ok[:] &= (digit >= 0) & (digit <= 9)
+            value = value * 10 + digit
+        return value
+
+    for k, byte in enumerate(_DAYS):
+        ok &= mat[:, days_end + k] == byte
+    ok &= mat[:, colon + 3] == ord(':')
+    days = number(range(days_end))
+    hours = number([colon - 2, colon - 1])
+    minutes = number([colon + 1, colon + 2])
+    seconds = number([colon + 4, colon + 5])
+    ok &= (minutes < 60) & (seconds < 60)
+
+    # Optional fraction of up to nine digits after the seconds
+    frac_len = (mat[:, colon + 6:] != 0).sum(axis=1) - 1
+    has_frac = frac_len > 0
+    ok &= np.where(has_frac, (mat[:, colon + 6] == ord('.')) & (frac_len <= 9), frac_len == -1)
+    frac = np.zeros(n, dtype=np.int64)
+    for k in range(9):
+        inside = k < frac_len
+        digit = mat[:, colon + 7 + k].astype(np.int64) - _ZERO
+        ok &= ((digit >= 0) & (digit <= 9)) | ~inside
+        frac += np.where(inside, digit * 10 ** (8 - k), 0)
+
+    ns = (((days * 24 + hours) * 60 + minutes) * 60 + seconds) * 1_000_000_000 + frac
+    return np.where(ok, ns, NAT), ok
+
+
+# Parse a block of strings by treating them as a 2-D byte matrix, one pass per
+# distinct layout (almost always a single one for a given export)
+def _parse_block(strings):
+    n = len(strings)
+    ns = np.full(n, NAT, dtype=np.int64)
+    ok = np.zeros(n, dtype=bool)
+    try:
+        raw = strings.astype('S')
+    except UnicodeEncodeError:
+        return ns, ok
+
+    # Pad on the right so every offset below stays inside the matrix
+    width = raw.dtype.itemsize
+    mat = np.zeros((n, width + 16), dtype=np.uint8)
+    mat[:, :width] = raw.view(np.uint8).reshape(n, width)
+
+    colons = np.argmax(mat == ord(':'), axis=1)
+    for colon in np.flatnonzero(np.bincount(colons)):
+        rows = colons == colon
+        if rows.all():
+            ns, ok = _parse_layout(mat, colon)
+        else:
+            ns[rows], ok[rows] = _parse_layout(mat[rows], colon)
+    return ns, ok
+
+
+def _parse_strings(values):
+    ns = np.full(len(values), NAT, dtype=np.int64)
+    present = np.flatnonzero(~pd.isna(values))
+    for start in range(0, len(present), CHUNK_ROWS):
+        idx = present[start:start + CHUNK_ROWS]
+        parsed, ok = _parse_block(values[idx])
+        ns[idx] = parsed
+
+        # Anything outside the FastF1 layout (negative values, bare clock times,
+        # malformed text) goes through pandas, which turns garbage into NaT
+        if not ok.all():
+            other = pd.to_timedelta(pd.Series(values[idx[~ok]]), errors='coerce')
+            ns[idx[~ok]] = other.astype('timedelta64[ns]').to_numpy().view(np.int64)
+    return ns
+
+
+# Convert a column of "0 days 01:02:03.456" strings to nanosecond timedeltas in one pass.
+# Plain numbers are taken as seconds; NaN and malformed values become NaT.
+@profiled('parse_times')
+def to_timedelta(values):
+    values = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_timedelta64_dtype(values):
+        return values.astype('timedelta64[ns]')
+    if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+        return pd.to_timedelta(values, unit='s', errors='coerce').astype('timedelta64[ns]')
+
+    ns = _parse_strings(values.to_numpy(dtype=object))
+    return pd.Series(ns.view('timedelta64[ns]'), index=values.index, name=values.name)
+
+
+# Float seconds with NaN for missing values
+def to_seconds(values):
+    return to_timedelta(values).dt.total_seconds()
+
+
+# Raw int64 nanoseconds; missing values hold NaT's sentinel (the int64 minimum)
+def to_nanoseconds(values):
+    return to_timedelta(values).to_numpy().view(np.int64)
@@ -1,77 +1,124 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib import font_manager
+from charts import chart, chart_path, load_font, parse_args, render
+from data_store import load_laps
+from partials import combine, mean, moments
+from profiling import profiled
+from time_parsing import to_seconds
 
-# Add JetBrains Mono font
-font_path = '../fonts/JetBrainsMono-Regular.ttf' 
-font_manager.fontManager.addfont(font_path)
-plt.rcParams['font.family'] = 'JetBrains Mono'
+# Tables and columns this analysis reads
+TABLES = {'laps': ['Driver', 'Compound', 'LapTime', 'LapNumber', 'TyreLife']}
+OUTPUT = 'tire_compound_analysis.csv'
 
-# Set the plotting style
-plt.style.use('ggplot')
 
-# Increase the default font size
-plt.rcParams['font.size'] = 12
-plt.rcParams['axes.labelsize'] = 14
-plt.rcParams['axes.titlesize'] = 16
-plt.rcParams['xtick.labelsize'] = 12
-plt.rcParams['ytick.labelsize'] = 12
+# Lap time totals and lap counts for each driver and compound
+@profiled()
+def summarize(laps):
+    laps = laps.assign(LapTimeSeconds=to_seconds(laps['LapTime']))
+    partial = moments(laps, ['Driver', 'Compound'], 'LapTimeSeconds')
+    laps_per_group = laps.groupby(['Driver', 'Compound'], observed=True)['LapNumber'].count()
+    return partial.merge(laps_per_group.rename('Laps').reset_index(), on=['Driver', 'Compound'])
 
-# Read the CSV file
-df = pd.read_csv('../dataset/lap_2024.csv', low_memory=False)
 
-# Convert LapTime to seconds
-df['LapTimeSeconds'] = pd.to_timedelta(df['LapTime']).dt.total_seconds()
+# Average lap time and total laps for each driver and compound
+@profiled()
+def finalize(partials):
+    totals = combine(partials, ['Driver', 'Compound'])
+    tire_analysis = totals[['Driver', 'Compound']].assign(AverageLapTime=mean(totals), TotalLaps=totals['Laps'])
+    return tire_analysis.reset_index(drop=True)
 
-# Group by Driver and Compound, calculate average lap time and total laps
-tire_analysis = df.groupby(['Driver', 'Compound']).agg({
-    'LapTimeSeconds': 'mean',
-    'LapNumber': 'count'
-}).reset_index()
-
-# Rename columns
-tire_analysis.columns = ['Driver', 'Compound', 'AverageLapTime', 'TotalLaps']
-
-# Save the results to a CSV file
-tire_analysis.to_csv('../csv_generated/tire_compound_analysis.csv', index=False)
 
 def create_high_quality_chart(fig, ax, title, xlabel, ylabel, filename):
+    import matplotlib.pyplot as plt
+
     ax.set_title(title, fontsize=20, fontweight='bold')
     ax.set_xlabel(xlabel, fontsize=16)
     ax.set_ylabel(ylabel, fontsize=16)
     ax.tick_params(axis='both', which='major', labelsize=12)
     ax.grid(axis='both', linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig(f'../charts/{filename}.png', dpi=300, bbox_inches='tight')
-    plt.savefig(f'../charts/{filename}.svg', format='svg', bbox_inches='tight')
+    plt.savefig(chart_path(f'{filename}.png'), dpi=300, bbox_inches='tight')
+    plt.savefig(chart_path(f'{filename}.svg'), format='svg', bbox_inches='tight')
     plt.close(fig)
 
-# Create a box plot to compare lap times across tire compounds
-fig, ax = plt.subplots(figsize=(15, 12))
-sns.boxplot(x='Compound', y='LapTimeSeconds', data=df, ax=ax)
-create_high_quality_chart(
-    fig, ax,
-    'Lap Times Across Tire Compounds',
-    'Compound',
-    'Lap Time (seconds)',
-    'lap_times_boxplot'
-)
-
-# Create a scatter plot showing tire degradation over time
-fig, ax = plt.subplots(figsize=(15, 12))
-for compound in df['Compound'].unique():
-    compound_data = df[df['Compound'] == compound]
-    ax.scatter(compound_data['TyreLife'], compound_data['LapTimeSeconds'], 
-               label=compound, alpha=0.5)
-
-ax.legend()
-create_high_quality_chart(
-    fig, ax,
-    'Tire Degradation Over Time',
-    'Tire Life (laps)',
-    'Lap Time (seconds)',
-    'tire_degradation_scatter'
-)
-
-print("Analysis complete. Results saved to tire_compound_analysis.csv and charts saved as PNG and SVG files.")
\ No newline at end of file
+
+def set_style():
+    import matplotlib.pyplot as plt
+
+    # Add JetBrains Mono font
+    load_font()
+    plt.rcParams['font.family'] = 'JetBrains Mono'
+
+    # Set the plotting style
+    plt.style.use('ggplot')
+
+    # Increase the default font size
+    plt.rcParams['font.size'] = 12
+    plt.rcParams['axes.labelsize'] = 14
+    plt.rcParams['axes.titlesize'] = 16
+    plt.rcParams['xtick.labelsize'] = 12
+    plt.rcParams['ytick.labelsize'] = 12
+
+
+def plot_boxplot(df):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    set_style()
+
+    # Create a box plot to compare lap times across tire compounds
+    fig, ax = plt.subplots(figsize=(15, 12))
+    sns.boxplot(x='Compound', y='LapTimeSeconds', data=df, ax=ax)
+    create_high_quality_chart(
+        fig, ax,
+        'Lap Times Across Tire Compounds',
+        'Compound',
+        'Lap Time (seconds)',
+        'lap_times_boxplot'
+    )
+
+
+def plot_degradation(df):
+    import matplotlib.pyplot as plt
+
+    set_style()
+
+    # Create a scatter plot showing tire degradation over time
+    fig, ax = plt.subplots(figsize=(15, 12))
+    for compound in df['Compound'].unique():
+        compound_data = df[df['Compound'] == compound]
+        ax.scatter(compound_data['TyreLife'], compound_data['LapTimeSeconds'],
+                   label=compound, alpha=0.5)
+
+    ax.legend()
+    create_high_quality_chart(
+        fig, ax,
+        'Tire Degradation Over Time',
+        'Tire Life (laps)',
+        'Lap Time (seconds)',
+        'tire_degradation_scatter'
+    )
+
+
+# Both charts are drawn from lap-level data rather than the output, so only this
+# script and f1strat run, which hold every lap, draw them. season and data_dir
+# are part of the lap_charts() hook and not needed here.
+def lap_charts(laps, season=None, data_dir=None):
+    df = laps[['Compound', 'TyreLife']].assign(LapTimeSeconds=to_seconds(laps['LapTime']))
+    return [chart(plot_boxplot, df), chart(plot_degradation, df)]
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Read the CSV file
+    df = load_laps(columns=TABLES['laps'])
+
+    # Group by Driver and Compound, calculate average lap time and total laps
+    tire_analysis = finalize([summarize(df)])
+
+    # Save the results to a CSV file
+    tire_analysis.to_csv('../csv_generated/tire_compound_analysis.csv', index=False)
+
+    if args.charts:
+        render(lap_charts(df), args.chart_workers)
+
+    print("Analysis complete. Results saved to tire_compound_analysis.csv and charts saved as PNG and SVG files.")
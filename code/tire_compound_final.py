@@ -1,61 +1,98 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-from matplotlib.font_manager import FontProperties
+from charts import chart, chart_path, load_font, parse_args, render
+from data_store import load_laps, load_results
+from partials import combine, mean, moments
+from profiling import profiled
 
-# Read the CSV files
-result_df = pd.read_csv('../dataset/result_2024.csv')
-lap_df = pd.read_csv('../dataset/lap_2024.csv')
+# Tables and columns this analysis reads
+TABLES = {'laps': ['EventName', 'DriverNumber', 'LapNumber', 'Compound'], 'results': None}
+OUTPUT = 'tire_average_position.csv'
 
-# Convert ClassifiedPosition to numeric, replacing any non-numeric values with NaN
-result_df['ClassifiedPosition'] = pd.to_numeric(result_df['ClassifiedPosition'], errors='coerce')
 
-# Merge the dataframes to get starting tire information
-merged_df = pd.merge(result_df, lap_df[lap_df['LapNumber'] == 1][['DriverNumber', 'Compound']], 
-                     on='DriverNumber', how='left')
+# Final position totals for each starting tire compound
+@profiled()
+def summarize(laps, results):
+    # Convert ClassifiedPosition to numeric, replacing any non-numeric values with NaN
+    results = results.assign(ClassifiedPosition=pd.to_numeric(results['ClassifiedPosition'], errors='coerce'))
+
+    # Merge the dataframes to get starting tire information, race by race when
+    # possible. The original merge on DriverNumber alone paired every result with
+    # the driver's starting tire in every race of the season; with EventName in
+    # the results each result gets the tire of its own race, so the averages in
+    # tire_average_position.csv differ from those of the original script.
+    keys = ['EventName', 'DriverNumber'] if 'EventName' in results.columns else ['DriverNumber']
+    starting_tires = laps.loc[laps['LapNumber'] == 1, keys + ['Compound']]
+    merged_df = pd.merge(results, starting_tires, on=keys, how='left')
+    return moments(merged_df, ['Compound'], 'ClassifiedPosition')
+
 
 # Calculate average final position for each tire compound
-tire_avg_position = merged_df.groupby('Compound')['ClassifiedPosition'].mean().reset_index()
-
-# Sort by average position (ascending order)
-tire_avg_position = tire_avg_position.sort_values('ClassifiedPosition')
-
-# Save to CSV
-tire_avg_position.to_csv('../csv_generated/tire_average_position.csv', index=False, 
-                         columns=['Compound', 'ClassifiedPosition'])
-
-# Create bar chart
-plt.figure(figsize=(10, 6))
-plt.bar(tire_avg_position['Compound'], tire_avg_position['ClassifiedPosition'], 
-        color='black', edgecolor='white')
-
-# Customize the chart
-plt.title('Average Final Position by Starting Tire Compound', fontsize=16, fontweight='bold')
-plt.xlabel('Tire Compound', fontsize=12)
-plt.ylabel('Average Final Position', fontsize=12)
-plt.gca().invert_yaxis()  # Invert y-axis so lower positions (better) are higher on the chart
-
-# Set JetBrains Mono font
-jetbrains_mono = FontProperties(fname="../fonts/JetBrainsMono-Regular.ttf")
-plt.title(plt.gca().get_title(), fontproperties=jetbrains_mono)
-plt.xlabel(plt.gca().get_xlabel(), fontproperties=jetbrains_mono)
-plt.ylabel(plt.gca().get_ylabel(), fontproperties=jetbrains_mono)
-for label in plt.gca().get_xticklabels() + plt.gca().get_yticklabels():
-    label.set_fontproperties(jetbrains_mono)
-
-# Add value labels on top of each bar
-for i, v in enumerate(tire_avg_position['ClassifiedPosition']):
-    plt.text(i, v, f'{v:.2f}', ha='center', va='bottom')
-
-# Set background color to white
-plt.gca().set_facecolor('white')
-
-# Remove top and right spines
-plt.gca().spines['top'].set_visible(False)
-plt.gca().spines['right'].set_visible(False)
-
-# Save the chart
-plt.tight_layout()
-plt.savefig('../charts/tire_average_position_chart.png', dpi=300, bbox_inches='tight')
-plt.close()
-
-print("Analysis complete. Results saved to 'tire_average_position.csv' and 'tire_average_position_chart.png'.")
\ No newline at end of file
+@profiled()
+def finalize(partials):
+    totals = combine(partials, ['Compound'])
+    tire_avg_position = totals[['Compound']].assign(ClassifiedPosition=mean(totals))
+
+    # Sort by average position (ascending order)
+    return tire_avg_position.sort_values('ClassifiedPosition').reset_index(drop=True)
+
+
+def plot(tire_avg_position):
+    import matplotlib.pyplot as plt
+
+    # Create bar chart
+    plt.figure(figsize=(10, 6))
+    plt.bar(tire_avg_position['Compound'], tire_avg_position['ClassifiedPosition'],
+            color='black', edgecolor='white')
+
+    # Customize the chart
+    plt.title('Average Final Position by Starting Tire Compound', fontsize=16, fontweight='bold')
+    plt.xlabel('Tire Compound', fontsize=12)
+    plt.ylabel('Average Final Position', fontsize=12)
+    plt.gca().invert_yaxis()  # Invert y-axis so lower positions (better) are higher on the chart
+
+    # Set JetBrains Mono font
+    jetbrains_mono = load_font()
+    plt.title(plt.gca().get_title(), fontproperties=jetbrains_mono)
+    plt.xlabel(plt.gca().get_xlabel(), fontproperties=jetbrains_mono)
+    plt.ylabel(plt.gca().get_ylabel(), fontproperties=jetbrains_mono)
+    for label in plt.gca().get_xticklabels() + plt.gca().get_yticklabels():
+        label.set_fontproperties(jetbrains_mono)
+
+    # Add value labels on top of each bar
+    for i, v in enumerate(tire_avg_position['ClassifiedPosition']):
+        plt.text(i, v, f'{v:.2f}', ha='center', va='bottom')
+
+    # Set background color to white
+    plt.gca().set_facecolor('white')
+
+    # Remove top and right spines
+    plt.gca().spines['top'].set_visible(False)
+    plt.gca().spines['right'].set_visible(False)
+
+    # Save the chart
+    plt.tight_layout()
+    plt.savefig(chart_path('tire_average_position_chart.png'), dpi=300, bbox_inches='tight')
+    plt.close()
+
+
+def charts(tire_avg_position, partials=None):
+    return [chart(plot, tire_avg_position)]
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Read the CSV files
+    result_df = load_results()
+    lap_df = load_laps(columns=TABLES['laps'])
+
+    tire_avg_position = finalize([summarize(lap_df, result_df)])
+
+    # Save to CSV
+    tire_avg_position.to_csv('../csv_generated/tire_average_position.csv', index=False,
+                             columns=['Compound', 'ClassifiedPosition'])
+
+    if args.charts:
+        render(charts(tire_avg_position), args.chart_workers)
+
+    print("Analysis complete. Results saved to 'tire_average_position.csv' and 'tire_average_position_chart.png'.")
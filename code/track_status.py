@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+import external_events
+from charts import parse_args, render
+from data_store import load_laps
+from partials import combine, mean, moments
+from profiling import profiled
+from time_parsing import to_seconds
+
+# Tables and columns this analysis reads
+TABLES = {'laps': ['EventName', 'Driver', 'LapTime', 'TrackStatus', 'IsAccurate']}
+OUTPUT = 'external_events.csv'
+
+# Track status digits and the condition each one means. A lap's status lists
+# every digit shown during the lap (e.g. '2671'); the lap takes the most
+# severe of them, in this order.
+CONDITIONS = {
+    'RED': '5',
+    'SC': '4',
+    'VSC': '67',
+    'YELLOW': '2',
+    'GREEN': '1',
+}
+
+
+# Condition of every lap in one pass: the first condition, by severity, whose
+# digits appear in the lap's status. Laps without a status count as green.
+def track_condition(laps):
+    status = laps['TrackStatus'].astype(str).where(laps['TrackStatus'].notna(), '1')
+    return pd.Series(np.select(
+        [status.str.contains(f'[{codes}]', regex=True).to_numpy(dtype=bool) for codes in CONDITIONS.values()],
+        list(CONDITIONS),
+        'GREEN',
+    ), index=laps.index)
+
+
+# Lap time moments of each driver under each condition, split by whether the
+# lap was timed accurately, as CONDITION_True / CONDITION_False
+@profiled()
+def summarize(laps):
+    laps = laps.assign(
+        LapTimeSeconds=to_seconds(laps['LapTime']),
+        Condition=track_condition(laps) + '_' + laps['IsAccurate'].fillna(False).astype(bool).astype(str),
+    )
+    return moments(laps, ['Driver', 'Condition'], 'LapTimeSeconds')
+
+
+# Average lap time matrix, one row per driver and one column per condition
+@profiled()
+def finalize(partials):
+    totals = combine(partials, ['Driver', 'Condition'])
+    matrix = totals.assign(LapTime=mean(totals)).pivot(index='Driver', columns='Condition', values='LapTime')
+    columns = [f'{condition}_{accurate}' for condition in sorted(CONDITIONS) for accurate in (False, True)]
+    matrix = matrix.reindex(columns=columns).sort_index()
+    matrix.index.name = 'Driver'
+    matrix.columns.name = None
+    return matrix
+
+
+# The heatmap of external_events.py, drawn from this stage's matrix
+def charts(matrix, partials=None):
+    return external_events.charts(matrix)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Load the data
+    lap_data = load_laps(columns=TABLES['laps'])
+
+    matrix = finalize([summarize(lap_data)])
+    matrix.to_csv('../csv_generated/external_events.csv')
+
+    if args.charts:
+        render(charts(matrix), args.chart_workers)
+
+    print("Analysis complete. Results saved to 'external_events.csv'.")
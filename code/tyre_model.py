@@ -0,0 +1,146 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATASET_DIR, load_laps
+from partial_store import load_partial, partition_key, save_partial, stage_version
+from partials import combine
+from profiling import profiled
+from time_parsing import to_seconds
+
+# Tables and columns this analysis reads
+TABLES = {'laps': ['EventName', 'Compound', 'TyreLife', 'LapNumber', 'LapTime', 'PitInTime', 'PitOutTime']}
+OUTPUT = 'tyre_model.csv'
+
+KEYS = ['EventName', 'Compound']
+
+# The slow lap filter compares each lap with its whole event, which the row
+# chunks of batch_runner --stream would split, so this stage is never streamed
+STREAM = False
+
+# Laps slower than this share of their event's median lap (safety car, traffic,
+# spins) say nothing about the tyres
+SLOW_LAP = 1.07
+
+# Sums of the normal equations of LapTime = Base + Degradation * TyreLife + Fuel * LapNumber:
+# products of the regressors (1, T = TyreLife, L = LapNumber) and of the lap time Y.
+# Like the other partials they add up across events and chunks.
+SUMS = ['N', 'T', 'L', 'TT', 'TL', 'LL', 'Y', 'TY', 'LY', 'YY']
+
+
+# Normal equation sums for each event and compound, from racing laps only
+@profiled()
+def summarize(laps):
+    lap_time = to_seconds(laps['LapTime'])
+    median = lap_time.groupby(laps['EventName'], observed=True).transform('median')
+    racing = (
+        lap_time.notna()
+        & laps['TyreLife'].notna()
+        & (laps['LapNumber'] > 1)
+        & laps['PitInTime'].isna()
+        & laps['PitOutTime'].isna()
+        & (lap_time <= SLOW_LAP * median)
+    )
+    t = laps['TyreLife'][racing].astype('float64')
+    l = laps['LapNumber'][racing].astype('float64')
+    y = lap_time[racing].astype('float64')
+    values = laps.loc[racing, KEYS].assign(N=1.0, T=t, L=l, TT=t * t, TL=t * l, LL=l * l, Y=y, TY=t * y, LY=l * y,
+                                           YY=y * y)
+    return values.groupby(KEYS, observed=True)[SUMS].sum().reset_index()
+
+
+# Least squares coefficients of every group at once from its sums. Groups where
+# tyre age and lap number move together (a single stint) are solved with the
+# pseudo-inverse, which splits the slope between the two instead of failing.
+def solve(sums):
+    s = {column: sums[column].to_numpy(dtype='float64') for column in SUMS}
+    gram = np.stack([
+        np.stack([s['N'], s['T'], s['L']], axis=-1),
+        np.stack([s['T'], s['TT'], s['TL']], axis=-1),
+        np.stack([s['L'], s['TL'], s['LL']], axis=-1),
+    ], axis=1)
+    moment = np.stack([s['Y'], s['TY'], s['LY']], axis=-1)
+    beta = np.einsum('gij,gj->gi', np.linalg.pinv(gram), moment)
+
+    # Residual sum of squares: Y'Y - 2 b'X'Y + b'X'X b
+    rss = s['YY'] - 2 * np.einsum('gi,gi->g', beta, moment) + np.einsum('gi,gij,gj->g', beta, gram, beta)
+    dof = s['N'] - 3
+    rmse = np.sqrt(np.clip(rss, 0, None) / np.where(dof > 0, dof, np.nan))
+
+    coefficients = sums[KEYS].copy()
+    coefficients['Base'] = beta[:, 0]
+    coefficients['Degradation'] = beta[:, 1]
+    coefficients['Fuel'] = beta[:, 2]
+    coefficients['Laps'] = s['N'].astype(int)
+    coefficients['RMSE'] = rmse
+    return coefficients
+
+
+# One row of coefficients per event and compound
+@profiled()
+def finalize(partials):
+    return solve(combine(partials, KEYS)).sort_values(KEYS, ignore_index=True)
+
+
+# Coefficients for a season, refitting only events whose laps changed since the
+# last fit. Sums are stored per event with the batch runner's partials, so the
+# runner and this function share one cache.
+def fit(season=2024, data_dir=DATASET_DIR, reuse=True):
+    laps = load_laps(columns=TABLES['laps'], season=season, data_dir=data_dir)
+    version = stage_version(sys.modules[__name__])
+    partials = []
+    for event, event_laps in laps.groupby('EventName', sort=True, observed=True):
+        key = version + partition_key({'laps': event_laps})
+        partial = load_partial('tyre_model', season, event, key, data_dir) if reuse else None
+        if partial is None:
+            partial = summarize(event_laps)
+            save_partial(partial, 'tyre_model', season, event, key, data_dir)
+        partials.append(partial)
+    return finalize(partials)
+
+
+# Lap time predictions from fitted coefficients, for one event or, with
+# event=None, averaged over the events weighted by their laps per compound.
+# predict() takes a compound name with scalar tyre life and lap (plain float
+# arithmetic, for simulators calling it in a loop) or arrays of compounds and
+# numbers (one gather and a multiply-add per element). Array compounds may be
+# names or integer codes from `codes`, which skips the name lookup.
+class DegradationModel:
+
+    def __init__(self, coefficients, event=None):
+        if event is not None:
+            coefficients = coefficients[coefficients['EventName'] == event]
+            if coefficients.empty:
+                raise KeyError(f"no tyre model for {event!r}")
+        fitted = coefficients.dropna(subset=['Base', 'Degradation', 'Fuel'])
+        weights = fitted['Laps'].to_numpy(dtype='float64')
+        weighted = fitted[['Base', 'Degradation', 'Fuel']].mul(weights, axis=0).assign(Laps=weights)
+        totals = weighted.groupby(fitted['Compound'].astype(str)).sum()
+        table = totals[['Base', 'Degradation', 'Fuel']].div(totals['Laps'], axis=0)
+
+        self.compounds = list(table.index)
+        self.codes = {compound: code for code, compound in enumerate(self.compounds)}
+        self.table = table.to_numpy()
+        self.coefficients = {compound: tuple(row) for compound, row in zip(self.compounds, self.table.tolist())}
+
+    def predict(self, compound, tyre_life, lap):
+        if isinstance(compound, str):
+            base, degradation, fuel = self.coefficients[compound]
+            return base + degradation * tyre_life + fuel * lap
+        codes = np.asarray(compound)
+        if codes.dtype.kind not in 'iu':
+            codes = pd.Categorical(codes.astype(object), categories=self.compounds).codes
+            if (codes < 0).any():
+                raise KeyError(f"no tyre model for {set(np.asarray(compound, dtype=object)[codes < 0])}")
+        rows = self.table[codes]
+        tyre_life = np.asarray(tyre_life, dtype='float64')
+        lap = np.asarray(lap, dtype='float64')
+        return rows[:, 0] + rows[:, 1] * tyre_life + rows[:, 2] * lap
+
+
+if __name__ == '__main__':
+    coefficients = fit()
+    coefficients.to_csv('../csv_generated/tyre_model.csv', index=False)
+    print(coefficients.groupby('Compound', observed=True)[['Degradation', 'Fuel']].median())
+    print("Analysis complete. Results saved to 'tyre_model.csv'.")
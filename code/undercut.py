@@ -0,0 +1,185 @@
+import numpy as np
+import pandas as pd
+from charts import parse_args
+from data_store import load_laps, load_positions
+from leaderboard import board_values, leaderboard
+from leaderboard import TABLES as LEADERBOARD_TABLES
+from pit_stops import LAP_COLUMNS, extract_pit_stops
+from profiling import profiled
+
+# Tables and columns this analysis reads
+TABLES = {
+    'laps': sorted(set(LAP_COLUMNS) | set(LEADERBOARD_TABLES['laps'])),
+    'positions': LEADERBOARD_TABLES['positions'],
+}
+OUTPUT = 'undercut.csv'
+
+# Rivals are the cars within this many seconds of the stopping car, ahead or
+# behind, when it starts its in-lap
+GAP_WINDOW = 3.0
+# A rival's stop answers one if it comes within this many laps after it
+RESPONSE_LAPS = 5
+# Laps of pace compared before and after the stop window
+PACE_LAPS = 3
+
+COLUMNS = ['EventName', 'Driver', 'StopNumber', 'InLap', 'Rival', 'RivalInLap',
+           'GapBefore', 'GapAfter', 'PaceBefore', 'StopDelta', 'PaceAfter', 'Outcome']
+
+
+# Session time at the end of every lap of one event as a dense (driver, lap)
+# array, NaN where a lap has no time; row i is drivers[i], column j lap j
+def lap_end_table(laps, drivers):
+    ends = laps[['Driver', 'LapNumber', 'Time']].dropna()
+    rows = pd.Categorical(ends['Driver'].astype(object), categories=drivers).codes
+    lap_numbers = ends['LapNumber'].to_numpy(dtype=float)
+    keep = (rows >= 0) & (lap_numbers >= 0) & (lap_numbers == np.round(lap_numbers))
+    rows, columns = rows[keep], lap_numbers[keep].astype(int)
+    width = columns.max() + 1 if len(columns) else 0
+    table = np.full((len(drivers), width), np.nan)
+
+    # The first row of a (driver, lap) pair wins, as a left merge on deduplicated
+    # rows would give; fancy assignment makes no promise about repeated cells
+    _, first = np.unique(rows.astype(np.int64) * width + columns, return_index=True)
+    table[rows[first], columns[first]] = ends['Time'].dt.total_seconds().to_numpy()[keep][first]
+    return table
+
+
+# Session time at the end of many (driver, lap) pairs, NaN when missing;
+# drivers are row numbers of the table
+def lap_ends(table, rows, lap_numbers):
+    lap_numbers = np.asarray(lap_numbers, dtype=float)
+    found = (rows >= 0) & (lap_numbers >= 0) & (lap_numbers < table.shape[1]) & (lap_numbers == np.round(lap_numbers))
+    values = np.full(len(lap_numbers), np.nan)
+    values[found] = table[rows[found], lap_numbers[found].astype(int)]
+    return values
+
+
+# Every stop of one event paired with the rivals close to it on track. Gaps
+# are taken from the leaderboard; lap time differences over a range of laps
+# come from the lap end times, as the change in the gap at the line.
+def event_pairs(event, stops, laps, positions):
+    board = leaderboard(laps, positions)
+    ends = lap_end_table(laps, board['drivers'])
+
+    # Gap of every car to the leader when each stopping car starts its in-lap
+    drivers = np.asarray(board['drivers'], dtype=object)
+    stop_drivers = stops['Driver'].astype(object).to_numpy()
+    stop_rows = pd.Categorical(stop_drivers, categories=board['drivers']).codes
+    in_laps = stops['InLap'].to_numpy(dtype=float)
+    start = lap_ends(ends, stop_rows, in_laps - 1)
+    ticks = np.searchsorted(board['time'], start, side='right') - 1
+    known = ~np.isnan(start) & (ticks >= 0)
+    gaps = board['gap'][:, ticks.clip(0, None)] if board['gap'].shape[1] else np.full((len(drivers), len(stops)), np.nan)
+    own = board_values(board, 'gap', stop_rows, start)
+
+    # All (rival, stop) pairs within the gap window in one comparison
+    close = (np.abs(gaps - own) <= GAP_WINDOW) & known & (drivers[:, None] != stop_drivers[None, :])
+    rival, stop = np.nonzero(close)
+    pairs = pd.DataFrame({
+        'Stop': stop,
+        'Driver': stop_drivers[stop],
+        'StopNumber': stops['StopNumber'].to_numpy()[stop],
+        'InLap': in_laps[stop],
+        'Start': start[stop],
+        'Rival': drivers[rival],
+        'RivalRow': rival,
+    })
+
+    # The rival's first stop from the same lap on answers this one; a stop the
+    # rival made shortly before means this one is the answer, counted with it
+    rival_stops = pd.DataFrame({
+        'Rival': stop_drivers,
+        'RivalInLap': in_laps,
+        'RivalOutLap': stops['OutLap'].to_numpy(dtype=float),
+    }).sort_values('RivalInLap')
+    pairs = pairs.sort_values('InLap', kind='stable')
+    pairs = pd.merge_asof(pairs, rival_stops, left_on='InLap', right_on='RivalInLap', by='Rival',
+                          direction='forward', tolerance=RESPONSE_LAPS)
+    answered = pd.merge_asof(pairs[['InLap', 'Rival']], rival_stops, left_on='InLap', right_on='RivalInLap',
+                             by='Rival', direction='backward', allow_exact_matches=False, tolerance=RESPONSE_LAPS)
+    pairs = pairs[answered['RivalInLap'].isna().to_numpy()]
+
+    # The window runs from the in-lap to the rival's out-lap, or RESPONSE_LAPS
+    # laps when the rival stays out
+    driver, rival = pairs['Driver'].to_numpy(), pairs['Rival'].to_numpy()
+    driver_rows, rival_rows = stop_rows[pairs['Stop'].to_numpy()], pairs['RivalRow'].to_numpy()
+    first = pairs['InLap'].to_numpy()
+    last = pairs['RivalOutLap'].fillna(pairs['InLap'] + RESPONSE_LAPS).to_numpy()
+
+    # Seconds the stopping car lost to the rival over laps a..b
+    def lost(a, b):
+        return (lap_ends(ends, driver_rows, b) - lap_ends(ends, driver_rows, a - 1)) - (
+            lap_ends(ends, rival_rows, b) - lap_ends(ends, rival_rows, a - 1))
+
+    # np.maximum keeps NaN, so the finish is unknown unless both cars completed the lap
+    finish = np.maximum(lap_ends(ends, driver_rows, last), lap_ends(ends, rival_rows, last))
+    start = pairs['Start'].to_numpy()
+    gap_before = board_values(board, 'gap', driver_rows, start) - board_values(board, 'gap', rival_rows, start)
+    gap_after = board_values(board, 'gap', driver_rows, finish) - board_values(board, 'gap', rival_rows, finish)
+
+    pairs = pairs.assign(
+        GapBefore=gap_before,
+        GapAfter=gap_after,
+        PaceBefore=lost(first - PACE_LAPS, first - 1) / PACE_LAPS,
+        StopDelta=lost(first, last),
+        PaceAfter=lost(last + 1, last + PACE_LAPS) / PACE_LAPS,
+    )
+
+    # A positive gap difference means the stopping car is behind its rival
+    pairs['Outcome'] = np.select(
+        [
+            pairs['RivalInLap'].isna().to_numpy(),
+            (pairs['RivalInLap'] == pairs['InLap']).to_numpy(),
+            np.isnan(gap_before) | np.isnan(gap_after),
+            (gap_before > 0) & (gap_after < 0),
+            (gap_before < 0) & (gap_after > 0),
+        ],
+        ['no_response', 'same_lap', 'unresolved', 'undercut', 'overcut'],
+        'held',
+    )
+
+    # Stops with nobody close enough to race
+    alone = np.setdiff1d(np.arange(len(stops)), stop)
+    clear = pd.DataFrame({
+        'Driver': stop_drivers[alone],
+        'StopNumber': stops['StopNumber'].to_numpy()[alone],
+        'InLap': in_laps[alone],
+        'Outcome': np.where(known[alone], 'clear_air', 'unresolved'),
+    })
+    return pd.concat([pairs, clear], ignore_index=True).assign(EventName=event).reindex(columns=COLUMNS)
+
+
+# Every stop of the slice with its rivals and the outcome of each duel
+@profiled()
+def summarize(laps, positions):
+    stops = extract_pit_stops(laps)
+    samples = dict(list(positions.groupby('EventName', sort=False, observed=True)))
+    event_stops = dict(list(stops.groupby('EventName', sort=False, observed=True)))
+    frames = [
+        event_pairs(event, event_stops[event], event_laps, samples.get(event))
+        for event, event_laps in laps.groupby('EventName', sort=False, observed=True)
+        if event in event_stops
+    ]
+    if not frames:
+        return pd.DataFrame(columns=COLUMNS)
+    return pd.concat(frames, ignore_index=True)
+
+
+@profiled()
+def finalize(partials):
+    undercut_df = pd.concat(partials, ignore_index=True)
+    return undercut_df.sort_values(['EventName', 'Driver', 'StopNumber', 'Rival']).reset_index(drop=True)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Load the data
+    lap_df = load_laps(columns=TABLES['laps'])
+    position_df = load_positions(columns=TABLES['positions'])
+
+    undercut_df = finalize([summarize(lap_df, position_df)])
+    undercut_df.to_csv('../csv_generated/undercut.csv', index=False)
+
+    print(undercut_df['Outcome'].value_counts().to_string())
+    print("Analysis complete. Results saved to 'undercut.csv'.")
@@ -0,0 +1,112 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from data_store import DATASET_DIR, cache_path, load_laps, load_weather, pyarrow
+from time_parsing import NAT, to_nanoseconds
+
+WEATHER_COLUMNS = ['AirTemp', 'TrackTemp', 'Humidity', 'Rainfall']
+
+# Laps are identified by these columns in the cached lap-to-weather mapping
+LAP_KEYS = ['EventName', 'Driver', 'LapNumber']
+
+
+# Weather samples of each event as time-sorted arrays:
+# {event: {'Time': int64 nanoseconds, column: values, ...}}
+def build_weather_index(weather, columns=WEATHER_COLUMNS):
+    times = to_nanoseconds(weather['Time'])
+    events = pd.Categorical(weather['EventName'])
+    keep = (times != NAT) & (events.codes >= 0)
+    codes, times = events.codes[keep], times[keep]
+    order = np.lexsort((times, codes))
+    bounds = np.r_[0, np.flatnonzero(np.diff(codes[order])) + 1, len(order)]
+
+    arrays = {column: weather[column].to_numpy()[keep][order] for column in columns}
+    index = {}
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        if start == end:
+            continue
+        event = events.categories[codes[order[start]]]
+        index[event] = {'Time': times[order[start:end]]}
+        index[event].update({column: values[start:end] for column, values in arrays.items()})
+    return index
+
+
+# Weather at many (event, time) points, one binary search per event. By default
+# each point takes the last sample at or before it (like merge_asof backward);
+# with interpolate=True numeric columns are linearly interpolated between the
+# samples around it. Points before an event's first sample, or in events
+# without weather, are NaN. Returns a frame aligned with the inputs.
+def lookup_weather(index, events, times, columns=WEATHER_COLUMNS, interpolate=False):
+    # Group the points by event through categorical codes; unknown events get -1
+    codes = pd.Series(events).astype(pd.CategoricalDtype(list(index))).cat.codes.to_numpy()
+    times = to_nanoseconds(pd.Series(times))
+    codes = np.where(times == NAT, -1, codes)
+    order = np.argsort(codes, kind='stable')
+    bounds = np.r_[0, np.cumsum(np.bincount(codes + 1, minlength=len(index) + 1))]
+
+    values = {}
+    for column in columns:
+        numeric = any(samples[column].dtype.kind in 'iuf' for samples in index.values())
+        values[column] = np.full(len(codes), np.nan, dtype=float if numeric else object)
+    for code, samples in enumerate(index.values()):
+        rows = order[bounds[code + 1]:bounds[code + 2]]
+        if not len(rows):
+            continue
+        sample_times = samples['Time']
+        previous = np.searchsorted(sample_times, times[rows], side='right') - 1
+        found = previous >= 0
+        rows, previous = rows[found], previous[found]
+
+        following = np.minimum(previous + 1, len(sample_times) - 1)
+        span = (sample_times[following] - sample_times[previous]).astype(float)
+        weight = np.divide(times[rows] - sample_times[previous], span, out=np.zeros(len(rows)), where=span > 0)
+
+        for column in columns:
+            sample_values = samples[column]
+            if interpolate and sample_values.dtype.kind in 'iuf':
+                before, after = sample_values[previous], sample_values[following]
+                values[column][rows] = before + (after - before) * weight
+            else:
+                values[column][rows] = sample_values[previous]
+
+    # Flags such as Rainfall come back as bool, or object when some points have no sample
+    return pd.DataFrame({column: pd.Series(values[column]).infer_objects() for column in columns})
+
+
+def _mapping_path(season, data_dir, interpolate):
+    laps_key = os.path.basename(cache_path('laps', season, data_dir)).rsplit('_', 1)[1].split('.')[0]
+    weather_key = os.path.basename(cache_path('weather', season, data_dir)).rsplit('_', 1)[1].split('.')[0]
+    mode = 'interp' if interpolate else 'asof'
+    return os.path.join(data_dir, '.cache', f'lap_weather_{season}_{mode}_{laps_key}{weather_key}.parquet')
+
+
+# Weather at the end of every lap of a season, keyed on EventName, Driver and
+# LapNumber. The mapping is cached next to the table caches and rebuilt only
+# when the lap or weather file changes, so analyses can join on the lap keys
+# instead of redoing the time join.
+def lap_weather(season=2024, data_dir=DATASET_DIR, columns=WEATHER_COLUMNS, interpolate=False):
+    path = _mapping_path(season, data_dir, interpolate) if pyarrow is not None else None
+    if path is not None and os.path.exists(path):
+        return pd.read_parquet(path, columns=LAP_KEYS + columns)
+
+    laps = load_laps(columns=LAP_KEYS + ['Time'], season=season, data_dir=data_dir)
+    weather = load_weather(columns=['EventName', 'Time'] + WEATHER_COLUMNS, season=season, data_dir=data_dir)
+    conditions = lookup_weather(build_weather_index(weather), laps['EventName'], laps['Time'],
+                                interpolate=interpolate)
+    mapping = pd.concat([laps[LAP_KEYS].reset_index(drop=True), conditions], axis=1)
+
+    if path is not None:
+        # Drop mappings built from older versions of the source files
+        prefix = os.path.basename(path).rsplit('_', 1)[0] + '_'
+        for name in os.listdir(os.path.dirname(path)):
+            if name.startswith(prefix) and name != os.path.basename(path):
+                try:
+                    os.remove(os.path.join(os.path.dirname(path), name))
+                except FileNotFoundError:
+                    pass
+        tmp = f'{path}.{os.getpid()}.tmp'
+        mapping.to_parquet(tmp, index=False)
+        os.replace(tmp, path)
+    return mapping[LAP_KEYS + columns]
@@ -1,85 +1,115 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from matplotlib import font_manager
+from charts import chart, chart_path, load_font, parse_args, render
+from data_store import load_laps
+from profiling import profiled
+from time_parsing import to_timedelta
+from weather_index import LAP_KEYS, build_weather_index, lap_weather, lookup_weather
 
-# Add JetBrains Mono font
-font_path = '../fonts/JetBrainsMono-Regular.ttf'
-font_manager.fontManager.addfont(font_path)
-plt.rcParams['font.family'] = 'JetBrains Mono'
+# Tables and columns this analysis reads
+TABLES = {
+    'laps': ['EventName', 'Time', 'Driver', 'Compound'],
+    'weather': ['EventName', 'Time', 'AirTemp', 'TrackTemp', 'Humidity', 'Rainfall'],
+}
+OUTPUT = 'weather_tire_analysis.csv'
 
-# Set the plotting style
-plt.style.use('ggplot')
 
-# Increase the default font size
-plt.rcParams['font.size'] = 12
-plt.rcParams['axes.labelsize'] = 14
-plt.rcParams['axes.titlesize'] = 16
-plt.rcParams['xtick.labelsize'] = 12
-plt.rcParams['ytick.labelsize'] = 12
+COLUMNS = ['EventName', 'Time', 'Driver', 'Compound', 'AirTemp', 'TrackTemp', 'Humidity', 'Rainfall']
 
-# Read the CSV files
-weather_df = pd.read_csv('../dataset/weather_2024.csv')
-lap_df = pd.read_csv('../dataset/lap_2024.csv')
 
-# Convert Time columns to datetime
-weather_df['Time'] = pd.to_timedelta(weather_df['Time'])
-lap_df['Time'] = pd.to_timedelta(lap_df['Time'])
+# Weather conditions at the end of every lap
+@profiled()
+def summarize(laps, weather):
+    # Convert Time columns to timedelta
+    laps = laps.assign(Time=to_timedelta(laps['Time'])).reset_index(drop=True)
 
-# Merge the dataframes based on the closest time
-merged_df = pd.merge_asof(lap_df.sort_values('Time'), 
-                          weather_df.sort_values('Time'), 
-                          on='Time', 
-                          by='EventName')
+    # Look up the last weather sample of the same event before each lap ended
+    conditions = lookup_weather(build_weather_index(weather), laps['EventName'], laps['Time'])
+    merged_df = pd.concat([laps, conditions], axis=1)
 
-# Select relevant columns
-output_df = merged_df[['EventName', 'Time', 'Driver', 'Compound', 'AirTemp', 'TrackTemp', 'Humidity', 'Rainfall']]
+    # Select relevant columns
+    return merged_df[COLUMNS]
+
+
+# summarize() for the whole season from the cached lap-to-weather mapping,
+# which is only rebuilt when the lap or weather file changes
+@profiled()
+def summarize_season(laps, season=2024):
+    mapping = lap_weather(season).drop_duplicates(LAP_KEYS)
+    merged_df = laps.merge(mapping, on=LAP_KEYS, how='left')
+    return merged_df[COLUMNS]
+
+
+@profiled()
+def finalize(partials):
+    return pd.concat(partials, ignore_index=True).sort_values('Time', kind='stable')
 
-# Save the results to a CSV file
-output_df.to_csv('../csv_generated/weather_tire_analysis.csv', index=False)
 
 def create_high_quality_chart(fig, ax, title, xlabel, ylabel, filename):
+    import matplotlib.pyplot as plt
+
     ax.set_title(title, fontsize=20, fontweight='bold')
     ax.set_xlabel(xlabel, fontsize=16)
     ax.set_ylabel(ylabel, fontsize=16)
     ax.tick_params(axis='both', which='major', labelsize=12)
     ax.grid(axis='both', linestyle='--', alpha=0.7)
     plt.tight_layout()
-    plt.savefig(f'../charts/{filename}.png', dpi=300, bbox_inches='tight')
-    plt.savefig(f'../charts/{filename}.svg', format='svg', bbox_inches='tight')
+    plt.savefig(chart_path(f'{filename}.png'), dpi=300, bbox_inches='tight')
+    plt.savefig(chart_path(f'{filename}.svg'), format='svg', bbox_inches='tight')
     plt.close(fig)
 
-# Create a scatter plot for Track Temperature vs Tire Compound
-fig, ax = plt.subplots(figsize=(15, 12))
-sns.scatterplot(data=output_df, x='TrackTemp', y='Compound', hue='Driver', ax=ax, alpha=0.6)
-create_high_quality_chart(
-    fig, ax,
-    'Track Temperature vs Tire Compound',
-    'Track Temperature (°C)',
-    'Tire Compound',
-    'track_temp_vs_compound'
-)
-
-# Create a scatter plot for Air Temperature vs Tire Compound
-fig, ax = plt.subplots(figsize=(15, 12))
-sns.scatterplot(data=output_df, x='AirTemp', y='Compound', hue='Driver', ax=ax, alpha=0.6)
-create_high_quality_chart(
-    fig, ax,
-    'Air Temperature vs Tire Compound',
-    'Air Temperature (°C)',
-    'Tire Compound',
-    'air_temp_vs_compound'
-)
-
-# Create a scatter plot for Humidity vs Tire Compound
-fig, ax = plt.subplots(figsize=(15, 12))
-sns.scatterplot(data=output_df, x='Humidity', y='Compound', hue='Driver', ax=ax, alpha=0.6)
-create_high_quality_chart(
-    fig, ax,
-    'Humidity vs Tire Compound',
-    'Humidity (%)',
-    'Tire Compound',
-    'humidity_vs_compound'
-)
-
-print("Analysis complete. Results saved to weather_tire_analysis.csv and charts saved as PNG and SVG files.")
\ No newline at end of file
+
+def set_style():
+    import matplotlib.pyplot as plt
+
+    # Add JetBrains Mono font
+    load_font()
+    plt.rcParams['font.family'] = 'JetBrains Mono'
+
+    # Set the plotting style
+    plt.style.use('ggplot')
+
+    # Increase the default font size
+    plt.rcParams['font.size'] = 12
+    plt.rcParams['axes.labelsize'] = 14
+    plt.rcParams['axes.titlesize'] = 16
+    plt.rcParams['xtick.labelsize'] = 12
+    plt.rcParams['ytick.labelsize'] = 12
+
+
+# Scatter plot of one weather reading vs Tire Compound
+def plot(output_df, x, title, xlabel, filename):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    set_style()
+    fig, ax = plt.subplots(figsize=(15, 12))
+    sns.scatterplot(data=output_df, x=x, y='Compound', hue='Driver', ax=ax, alpha=0.6)
+    create_high_quality_chart(fig, ax, title, xlabel, 'Tire Compound', filename)
+
+
+def charts(output_df, partials=None):
+    return [
+        chart(plot, output_df[['TrackTemp', 'Compound', 'Driver']], 'TrackTemp',
+              'Track Temperature vs Tire Compound', 'Track Temperature (°C)', 'track_temp_vs_compound'),
+        chart(plot, output_df[['AirTemp', 'Compound', 'Driver']], 'AirTemp',
+              'Air Temperature vs Tire Compound', 'Air Temperature (°C)', 'air_temp_vs_compound'),
+        chart(plot, output_df[['Humidity', 'Compound', 'Driver']], 'Humidity',
+              'Humidity vs Tire Compound', 'Humidity (%)', 'humidity_vs_compound'),
+    ]
+
+
+if __name__ == '__main__':
+    args = parse_args()
+
+    # Read the laps; the weather comes with the cached lap-to-weather mapping
+    lap_df = load_laps(columns=TABLES['laps'] + ['LapNumber'])
+
+    output_df = finalize([summarize_season(lap_df)])
+
+    # Save the results to a CSV file
+    output_df.to_csv('../csv_generated/weather_tire_analysis.csv', index=False)
+
+    if args.charts:
+        render(charts(output_df), args.chart_workers)
+
+    print("Analysis complete. Results saved to weather_tire_analysis.csv and charts saved as PNG and SVG files.")
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The analysis scripts import each other by bare module name from code/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'code'))
@@ -0,0 +1,72 @@
+import os
+
+import pandas as pd
+import pytest
+
+import batch_runner
+from data_store import align_chunks
+from synthetic_season import write_season
+
+STAGES = sorted(batch_runner.STAGES)
+
+
+# One small synthetic season, written once for the module
+@pytest.fixture(scope='module')
+def data_dir(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp('dataset'))
+    write_season(data_dir, scale=0.2, seed=1, position_interval=30)
+    return data_dir
+
+
+def outputs(data_dir, output_dir, **options):
+    written = batch_runner.run(STAGES, [2024], data_dir=data_dir, output_dir=str(output_dir), workers=2,
+                               reuse=False, **options)
+    return {os.path.basename(path): pd.read_csv(path) for path in written}
+
+
+def assert_same_outputs(expected, actual):
+    assert sorted(actual) == sorted(expected)
+    for name, frame in expected.items():
+        pd.testing.assert_frame_equal(actual[name], frame, check_exact=False, obj=name)
+
+
+# The outputs of the default run, one task per event
+@pytest.fixture(scope='module')
+def per_event(data_dir, tmp_path_factory):
+    return outputs(data_dir, tmp_path_factory.mktemp('event'))
+
+
+def test_season_partition_matches_per_event(data_dir, per_event, tmp_path):
+    assert len(per_event) == len(STAGES)
+    assert_same_outputs(per_event, outputs(data_dir, tmp_path, partition='season'))
+
+
+# Chunks far smaller than a race, so nearly every one is re-cut
+def test_stream_matches_per_event(data_dir, per_event, tmp_path):
+    assert any(batch_runner.streamable(name) for name in STAGES)
+    assert_same_outputs(per_event, outputs(data_dir, tmp_path, stream=True, chunk_rows=500))
+
+
+def chunks(df, rows):
+    return (df.iloc[start:start + rows] for start in range(0, len(df), rows))
+
+
+def test_aligned_chunks_keep_each_race_whole():
+    laps = pd.DataFrame({
+        'EventName': ['Bahrain Grand Prix'] * 7 + ['Monaco Grand Prix'] * 5,
+        'Driver': list('AAABBBC') + list('AACCC'),
+        'LapNumber': [1, 2, 3, 1, 2, 3, 1, 1, 2, 1, 2, 3],
+    })
+    for rows in (1, 2, 5, 12, 20):
+        aligned = list(align_chunks(chunks(laps, rows), ['EventName', 'Driver']))
+        pd.testing.assert_frame_equal(pd.concat(aligned, ignore_index=True), laps)
+        races = [set(map(tuple, chunk[['EventName', 'Driver']].drop_duplicates().values)) for chunk in aligned]
+        assert sum(len(chunk_races) for chunk_races in races) == 5
+
+
+@pytest.mark.parametrize('drivers', [list('AABBA'), list('ABABB')])
+def test_scattered_races_are_refused(drivers):
+    laps = pd.DataFrame({'EventName': 'Bahrain Grand Prix', 'Driver': drivers})
+    for rows in (1, 2, 5):
+        with pytest.raises(ValueError, match='not grouped'):
+            list(align_chunks(chunks(laps, rows), ['EventName', 'Driver']))
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+import benchmark_suite
+from benchmark_suite import STAGES, regressions, run_benchmarks
+
+
+def test_every_stage_runs_on_a_small_season(tmp_path, capsys):
+    report = run_benchmarks(scales=[0.1], repeat=1, position_interval=60, data_root=str(tmp_path))
+    assert [result['stage'] for result in report['results']] == list(STAGES)
+    for result in report['results']:
+        assert result['scale'] == 0.1
+        assert result['seconds'] > 0 and result['peak_mb'] > 0
+        assert result['rows'] == report['results'][0]['rows']
+    assert report['repeat'] == 1
+    # The report is saved as JSON and the synthetic season is removed afterwards
+    json.dumps(report)
+    assert list(tmp_path.iterdir()) == []
+    assert len(capsys.readouterr().out.splitlines()) == len(STAGES)
+
+
+def test_stages_can_be_picked(tmp_path, monkeypatch):
+    calls = []
+    monkeypatch.setitem(STAGES, 'load', lambda data_dir, tables: calls.append(sorted(tables)))
+    report = run_benchmarks(scales=[0.1, 0.2], stages=['load'], repeat=2, position_interval=60,
+                            data_root=str(tmp_path))
+    assert [(result['scale'], result['stage']) for result in report['results']] == [(0.1, 'load'), (0.2, 'load')]
+    # Each scale: the timed runs and one more under tracemalloc
+    assert len(calls) == 6
+    assert calls[0] == sorted(benchmark_suite.SOURCE_FILES)
+    assert report['results'][0]['rows'] != report['results'][1]['rows']
+
+
+def report(*seconds):
+    return {'results': [{'scale': 1, 'stage': stage, 'seconds': value}
+                        for stage, value in zip(['load', 'tyre_delta', 'race_length'], seconds)]}
+
+
+def test_regressions_are_stages_slower_than_the_tolerance():
+    previous = report(1.0, 2.0, 0.5)
+    slower = regressions(report(1.1, 3.0, 0.2), previous)
+    assert [(result['stage'], result['ratio']) for result in slower] == [('tyre_delta', pytest.approx(1.5))]
+    assert slower[0]['previous_seconds'] == 2.0
+    assert regressions(report(1.1, 3.0, 0.2), previous, tolerance=2.0) == []
+    # Stages missing from the previous report are not compared
+    assert regressions(report(1.0, 2.0, 0.5), {'results': []}) == []
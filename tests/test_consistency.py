@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+import pandas as pd
+
+from consistency import SCALE_WINDOW, ConsistencyTracker, lap_consistency
+
+
+def stints(lap_times):
+    n_stints, laps = lap_times.shape
+    return pd.DataFrame({
+        'EventName': 'Test Grand Prix',
+        'Driver': np.repeat([f'D{i:04d}' for i in range(n_stints)], laps),
+        'Stint': 1,
+        'Compound': 'MEDIUM',
+        'LapNumber': np.tile(np.arange(2, laps + 2), n_stints),
+        'LapTime': pd.to_timedelta(lap_times.ravel(), unit='s'),
+        'PitInTime': pd.NaT,
+        'PitOutTime': pd.NaT,
+        'TrackStatus': '1',
+    })
+
+
+def gaussian(n_stints, laps, sigma=0.5, degradation=0.05, seed=0):
+    rng = np.random.default_rng(seed)
+    return 90 + degradation * np.arange(laps) + rng.normal(0, sigma, (n_stints, laps))
+
+
+def test_false_positive_rate_on_gaussian_laps():
+    # 60k laps of pure noise around a degrading pace: a 3-sigma rule should flag about 0.3%
+    for laps in (15, 30, 60):
+        flags = lap_consistency(stints(gaussian(60_000 // laps, laps)))['Flag']
+        assert (flags == 'outlier').mean() < 0.006
+
+
+def test_slow_lap_is_flagged():
+    lap_times = gaussian(200, 20, seed=1)
+    lap_times[:, 12] += 6.0
+    flags = lap_consistency(stints(lap_times))['Flag'].to_numpy().reshape(200, 20)
+    assert (flags[:, 12] == 'outlier').mean() > 0.95
+
+
+def test_tracker_matches_batch():
+    lap_df = lap_consistency(stints(gaussian(50, 25, seed=2)))
+    tracker = ConsistencyTracker()
+    for lap in lap_df.itertuples():
+        key = (lap.EventName, lap.Driver, lap.Stint)
+        assert tracker.update(key, lap.LapTimeSeconds) == lap.Flag
+        state = tracker.stint(key)
+        assert math.isclose(state.median, lap.RollingMedian) or (math.isnan(state.median) and math.isnan(lap.RollingMedian))
+        assert math.isclose(state.mad, lap.ResidualMAD) or (math.isnan(state.mad) and math.isnan(lap.ResidualMAD))
+
+
+def test_tracker_matches_batch_on_long_stints_with_gaps():
+    laps = stints(gaussian(20, 120, seed=3))
+    # Safety car laps leave holes in the residuals
+    laps.loc[np.random.default_rng(3).random(len(laps)) < 0.1, 'TrackStatus'] = '4'
+    lap_df = lap_consistency(laps)
+    tracker = ConsistencyTracker()
+    for lap in lap_df.itertuples():
+        key = (lap.EventName, lap.Driver, lap.Stint)
+        flag = '' if lap.Flag == 'outlier' else lap.Flag
+        assert tracker.update(key, lap.LapTimeSeconds, flag) == lap.Flag
+        state = tracker.stint(key)
+        # The scale is kept over a bounded number of residuals
+        assert len(state.residuals) <= SCALE_WINDOW
+        assert math.isclose(state.mad, lap.ResidualMAD) or (math.isnan(state.mad) and math.isnan(lap.ResidualMAD))
@@ -0,0 +1,100 @@
+import io
+import os
+
+import pandas as pd
+import pytest
+
+import data_store
+from data_store import cache_path, cached_table, failed_path, load_laps, load_table, load_weather
+from weather_tire_analysis import TABLES, finalize, summarize
+
+LAPS = """Time,Driver,LapNumber,Compound,EventName
+0 days 01:01:32.072,VER,1.0,SOFT,Bahrain Grand Prix
+0 days 01:03:04.120,VER,2.0,SOFT,Bahrain Grand Prix
+"""
+
+WEATHER = """Time,AirTemp,Humidity,Pressure,Rainfall,TrackTemp,WindDirection,WindSpeed,EventName
+0 days 01:00:00.000,44.3,30.9,1010.2,False,62.2,250,1.1,Bahrain Grand Prix
+0 days 01:02:00.000,44.1,31.7,1010.3,False,61.9,245,0.9,Bahrain Grand Prix
+"""
+
+EXPECTED = """EventName,Time,Driver,Compound,AirTemp,TrackTemp,Humidity,Rainfall
+Bahrain Grand Prix,0 days 01:01:32.072000,VER,SOFT,44.3,62.2,30.9,False
+Bahrain Grand Prix,0 days 01:03:04.120000,VER,SOFT,44.1,61.9,31.7,False
+"""
+
+
+# Measurements keep the digits of the source file in the written outputs
+def test_weather_measurements_are_written_as_read(tmp_path):
+    (tmp_path / 'lap_2024.csv').write_text(LAPS)
+    (tmp_path / 'weather_2024.csv').write_text(WEATHER)
+
+    # Once from the CSV and once from the columnar cache built by the first load
+    for _ in range(2):
+        laps = load_laps(columns=TABLES['laps'], data_dir=str(tmp_path))
+        weather = load_weather(columns=TABLES['weather'], data_dir=str(tmp_path))
+        output = io.StringIO()
+        finalize([summarize(laps, weather)]).to_csv(output, index=False)
+        assert output.getvalue() == EXPECTED
+
+
+def write_laps(data_dir, text=LAPS):
+    path = data_dir / 'lap_2024.csv'
+    path.write_text(text)
+    return path
+
+
+def test_cache_is_keyed_on_the_source_content(tmp_path):
+    pytest.importorskip('pyarrow')
+    source = write_laps(tmp_path)
+    first = cached_table('laps', data_dir=str(tmp_path))
+    assert first == cache_path('laps', data_dir=str(tmp_path)) and os.path.exists(first)
+
+    # Rewriting the same bytes keeps the cache; new content gets a new one and drops the old
+    write_laps(tmp_path)
+    os.utime(source, ns=(0, os.stat(source).st_mtime_ns + 1_000_000_000))
+    assert cached_table('laps', data_dir=str(tmp_path)) == first
+    write_laps(tmp_path, LAPS + '0 days 01:04:36.300,VER,3.0,SOFT,Bahrain Grand Prix\n')
+    second = cached_table('laps', data_dir=str(tmp_path))
+    assert second != first
+    assert os.listdir(tmp_path / '.cache') == [os.path.basename(second)]
+    assert len(load_laps(data_dir=str(tmp_path))) == 3
+
+
+def test_cached_and_csv_loads_are_equal(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    write_laps(tmp_path)
+    for columns in (None, ['Driver', 'LapNumber', 'Time']):
+        cached = load_table('laps', columns=columns, data_dir=str(tmp_path))
+        with monkeypatch.context() as patch:
+            patch.setattr(data_store, 'pyarrow', None)
+            read = load_table('laps', columns=columns, data_dir=str(tmp_path))
+        pd.testing.assert_frame_equal(cached, read)
+    assert cached.columns.tolist() == ['Driver', 'LapNumber', 'Time']
+
+
+# A table pyarrow cannot write is read from the CSV, and the build is not tried again
+def test_failed_cache_falls_back_to_the_csv(tmp_path, monkeypatch):
+    pytest.importorskip('pyarrow')
+    attempts = []
+
+    def to_parquet(df, path, **kwargs):
+        attempts.append(path)
+        open(path, 'w').close()
+        raise ValueError('cannot convert column')
+
+    monkeypatch.setattr(pd.DataFrame, 'to_parquet', to_parquet)
+    write_laps(tmp_path)
+    for _ in range(2):
+        laps = load_laps(data_dir=str(tmp_path))
+        assert laps['LapNumber'].tolist() == [1, 2]
+        assert str(laps['Driver'].dtype) == 'category'
+    target = cache_path('laps', data_dir=str(tmp_path))
+    assert len(attempts) == 1
+    assert os.listdir(tmp_path / '.cache') == [os.path.basename(failed_path(target))]
+
+    # A new source file gets a fresh attempt
+    write_laps(tmp_path, LAPS + '0 days 01:04:36.300,VER,3.0,SOFT,Bahrain Grand Prix\n')
+    assert len(load_laps(data_dir=str(tmp_path))) == 3
+    assert len(attempts) == 2
+    assert not os.path.exists(failed_path(target))
@@ -0,0 +1,51 @@
+import numpy as np
+import pandas as pd
+
+from leaderboard import sample_positions
+from position_due_pitstops import prepare
+
+START = 3600.0
+LAPS = 5
+# Drivers whose running order is the reverse of their names
+LAP_TIMES = {'ZHO': 90.0, 'BOT': 91.0, 'ALB': 92.0}
+# Each car's position samples start at its own fraction of a second
+OFFSETS = {'ZHO': 0.1, 'BOT': 0.37, 'ALB': 0.71}
+
+
+def race():
+    laps = pd.DataFrame([
+        {'Driver': driver, 'LapNumber': lap, 'EventName': 'Test Grand Prix',
+         'Time': pd.Timedelta(seconds=START + lap * lap_time), 'LapTime': pd.Timedelta(seconds=lap_time)}
+        for driver, lap_time in LAP_TIMES.items() for lap in range(1, LAPS + 1)
+    ])
+    samples = []
+    for driver, lap_time in LAP_TIMES.items():
+        elapsed = np.arange(OFFSETS[driver], LAPS * lap_time, 1.0)
+        angle = 2 * np.pi * elapsed / lap_time
+        samples.append(pd.DataFrame({
+            'Time': pd.to_timedelta(START + elapsed, unit='s'),
+            'X': 1000 * np.cos(angle),
+            'Y': 1000 * np.sin(angle),
+            'DriverName': driver,
+            'EventName': 'Test Grand Prix',
+        }))
+    return laps.assign(PitInTime=pd.NaT), pd.concat(samples, ignore_index=True)
+
+
+def test_unaligned_samples_get_the_running_order():
+    laps, positions = race()
+    # No two cars share a timestamp, so ranking names per timestamp would put everyone first
+    assert not positions['Time'].duplicated().any()
+
+    values = sample_positions(laps, positions)
+    racing = (positions['Time'].dt.total_seconds() > START + 30).to_numpy()
+    expected = positions['DriverName'].map({'ZHO': 1, 'BOT': 2, 'ALB': 3}).to_numpy()
+    np.testing.assert_array_equal(values[racing], expected[racing])
+
+
+def test_position_changes_use_the_running_order():
+    laps, positions = race()
+    ranked, _ = prepare(laps, positions)
+    racing = ranked[ranked['Seconds'] > 30]
+    assert (racing.groupby('DriverName')['Position'].agg(['min', 'max']).to_dict('index')
+            == {'ALB': {'min': 3, 'max': 3}, 'BOT': {'min': 2, 'max': 2}, 'ZHO': {'min': 1, 'max': 1}})
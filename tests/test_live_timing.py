@@ -0,0 +1,46 @@
+import itertools
+import socket
+import threading
+
+from live_timing import LiveTiming, listen, run
+
+LINES = [
+    b'{"table": "weather", "EventName": "Bahrain Grand Prix", "AirTemp": 24.1}',
+    b'{"table": "laps", "EventName": "Bahrain Grand Prix", "Driver": "VER", "LapNumber": 1',
+    b'{"EventName": "Bahrain Grand Prix", "Driver": "VER"}',
+    b'[1, 2, 3]',
+    b'\xff\xfe',
+    b'{"table": "positions", "EventName": "Bahrain Grand Prix", "DriverName": "VER", "Time": "0 days 01:00:01"}',
+]
+
+
+def free_port():
+    with socket.socket() as probe:
+        probe.bind(('127.0.0.1', 0))
+        return probe.getsockname()[1]
+
+
+def send(port, lines):
+    for _ in range(100):
+        try:
+            client = socket.create_connection(('127.0.0.1', port))
+            break
+        except ConnectionRefusedError:
+            threading.Event().wait(0.05)
+    with client:
+        client.sendall(b'\n'.join(lines) + b'\n')
+
+
+# Malformed and table-less lines are skipped and counted; the feed goes on
+def test_bad_socket_lines_do_not_stop_the_feed(tmp_path):
+    port = free_port()
+    client = threading.Thread(target=send, args=(port, LINES))
+    client.start()
+    items = itertools.islice((item for item in listen(port=port, poll=0.05) if item is not None), len(LINES))
+    state = run(items, LiveTiming(), str(tmp_path / 'live_timing.csv'))
+    client.join()
+
+    assert state.records == 2
+    assert state.skipped == 4
+    assert state.weather['Bahrain Grand Prix'][0] == 24.1
+    assert state.drivers[('Bahrain Grand Prix', 'VER')].sample == (3601.0, None)
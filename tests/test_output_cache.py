@@ -0,0 +1,104 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+import batch_runner
+import output_cache
+
+STAGE = """import pandas as pd
+from toy_helper import SCALE
+
+TABLES = {'laps': ['Driver', 'LapNumber']}
+OUTPUT = 'toy.csv'
+
+
+def summarize(laps):
+    return laps.groupby('Driver', observed=True)['LapNumber'].max().mul(SCALE).reset_index()
+
+
+def finalize(partials):
+    return pd.concat(partials).groupby('Driver')['LapNumber'].max().reset_index()
+"""
+
+LAPS = """Driver,LapNumber,EventName
+VER,1,Bahrain Grand Prix
+VER,2,Bahrain Grand Prix
+LEC,1,Bahrain Grand Prix
+"""
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    # Make sure the edit is seen even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+# A stage of its own in a scratch code directory, over a one-event dataset
+@pytest.fixture
+def toy(tmp_path, monkeypatch):
+    code_dir, data_dir, output_dir = tmp_path / 'code', tmp_path / 'dataset', tmp_path / 'csv_generated'
+    code_dir.mkdir()
+    data_dir.mkdir()
+    write(code_dir / 'toy_stage.py', STAGE)
+    write(code_dir / 'toy_helper.py', 'SCALE = 1\n')
+    write(data_dir / 'lap_2024.csv', LAPS)
+    monkeypatch.syspath_prepend(str(code_dir))
+    monkeypatch.setitem(batch_runner.STAGES, 'toy', 'toy_stage')
+    yield code_dir, str(data_dir), str(output_dir)
+    for name in ('toy_stage', 'toy_helper'):
+        sys.modules.pop(name, None)
+
+
+def build(toy):
+    _, data_dir, output_dir = toy
+    return output_cache.build(['toy'], data_dir=data_dir, output_dir=output_dir, workers=1)['toy']
+
+
+def test_unchanged_inputs_skip_the_stage(toy):
+    output = os.path.join(toy[2], 'toy.csv')
+    assert build(toy) == 'built'
+    written = os.stat(output).st_mtime_ns
+    assert build(toy) == 'cached'
+    assert os.stat(output).st_mtime_ns == written
+    assert pd.read_csv(output).to_dict('list') == {'Driver': ['LEC', 'VER'], 'LapNumber': [1, 2]}
+
+
+def test_changed_data_rebuilds(toy):
+    assert build(toy) == 'built'
+    write(os.path.join(toy[1], 'lap_2024.csv'), LAPS + 'LEC,2,Bahrain Grand Prix\nLEC,3,Bahrain Grand Prix\n')
+    assert build(toy) == 'built'
+    assert pd.read_csv(os.path.join(toy[2], 'toy.csv'))['LapNumber'].tolist() == [3, 2]
+    assert build(toy) == 'cached'
+
+
+def test_changed_code_rebuilds(toy):
+    assert build(toy) == 'built'
+    write(toy[0] / 'toy_helper.py', 'SCALE = 2\n')
+    assert build(toy) == 'built'
+    assert build(toy) == 'cached'
+
+
+def test_edited_or_missing_output_rebuilds(toy):
+    output = os.path.join(toy[2], 'toy.csv')
+    assert build(toy) == 'built'
+    write(output, 'Driver,LapNumber\nVER,99\n')
+    assert build(toy) == 'built'
+    assert pd.read_csv(output)['LapNumber'].tolist() == [1, 2]
+    os.remove(output)
+    assert build(toy) == 'built'
+
+
+# A script reading an output gets it built by the stage producing it on demand
+def test_require_builds_the_producing_stage(toy):
+    _, data_dir, output_dir = toy
+    path = output_cache.require('toy.csv', data_dir=data_dir, output_dir=output_dir)
+    assert path == os.path.join(output_dir, 'toy.csv')
+    assert os.path.exists(path)
+    manifest = output_cache.load_manifest(output_dir)
+    assert set(manifest['stages']) == {'toy'}
+    with pytest.raises(FileNotFoundError):
+        output_cache.require('nothing.csv', data_dir=data_dir, output_dir=output_dir)
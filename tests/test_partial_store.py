@@ -0,0 +1,34 @@
+import os
+import types
+
+import pandas as pd
+
+from partial_store import load_partial, save_partial, stage_version
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    # Make sure the edit is seen even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_editing_an_imported_helper_invalidates_partials(tmp_path):
+    write(tmp_path / 'helper.py', 'SCALE = 1\n')
+    write(tmp_path / 'other.py', 'UNUSED = 1\n')
+    write(tmp_path / 'stage.py', 'import pandas as pd\nfrom helper import SCALE\n')
+    stage = types.SimpleNamespace(__file__=str(tmp_path / 'stage.py'))
+
+    key = stage_version(stage) + 'event'
+    save_partial(pd.DataFrame({'x': [1]}), 'stage', 2024, 'Some Grand Prix', key, str(tmp_path))
+    assert load_partial('stage', 2024, 'Some Grand Prix', key, str(tmp_path)) is not None
+
+    # A module the stage does not import leaves the key alone
+    write(tmp_path / 'other.py', 'UNUSED = 2\n')
+    assert stage_version(stage) + 'event' == key
+
+    write(tmp_path / 'helper.py', 'SCALE = 2\n')
+    new_key = stage_version(stage) + 'event'
+    assert new_key != key
+    assert load_partial('stage', 2024, 'Some Grand Prix', new_key, str(tmp_path)) is None
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+
+from partials import combine, mean, moments, std
+
+KEYS = ['Driver', 'Compound']
+
+
+def laps(seed=0, n=2_000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'EventName': rng.choice(['Bahrain Grand Prix', 'Monaco Grand Prix', 'Italian Grand Prix'], n),
+        'Driver': rng.choice(['VER', 'LEC', 'HAM', 'NOR'], n),
+        'Compound': pd.Categorical(rng.choice(['SOFT', 'MEDIUM', 'HARD'], n)),
+        'Position': rng.integers(1, 21, n).astype('int8'),
+        'LapTime': rng.normal(90, 1.5, n).astype('float32'),
+    })
+
+
+def test_event_partials_add_up_to_the_season():
+    df = laps()
+    whole = moments(df, KEYS, 'LapTime')
+    merged = combine([moments(event, KEYS, 'LapTime') for _, event in df.groupby('EventName')], KEYS)
+    pd.testing.assert_frame_equal(merged[['Count']], whole[['Count']])
+    pd.testing.assert_frame_equal(merged[['Sum', 'SumSq']], whole[['Sum', 'SumSq']], rtol=1e-12)
+
+
+def test_mean_and_std_match_pandas():
+    df = laps(seed=1)
+    merged = combine([moments(df.iloc[start:start + 300], KEYS, 'Position') for start in range(0, len(df), 300)], KEYS)
+    expected = df.astype({'Position': 'float64'}).groupby(KEYS, observed=True)['Position'].agg(['mean', 'std'])
+    np.testing.assert_allclose(mean(merged), expected['mean'].to_numpy(), rtol=1e-12)
+    np.testing.assert_allclose(std(merged), expected['std'].to_numpy(), rtol=1e-9)
+
+
+def test_small_groups():
+    partial = moments(pd.DataFrame({'Driver': ['VER', 'LEC', 'LEC'], 'LapTime': [90.0, np.nan, 91.0]}),
+                      ['Driver'], 'LapTime')
+    assert partial['Count'].tolist() == [1, 1]
+    assert mean(partial).tolist() == [91.0, 90.0]
+    # One value has no sample standard deviation
+    assert std(partial).isna().all()
+    empty = partial.assign(Sum=0.0, SumSq=0.0, Count=0)
+    assert mean(empty).isna().all()
+
+
+def test_other_reductions():
+    partials = [
+        pd.DataFrame({'Driver': ['VER', 'LEC'], 'Laps': [10, 5], 'Longest': [30, 12]}),
+        pd.DataFrame({'Driver': ['VER'], 'Laps': [7], 'Longest': [25]}),
+    ]
+    merged = combine(partials, ['Driver'], agg={'Longest': 'max'})
+    assert merged.to_dict('list') == {'Driver': ['LEC', 'VER'], 'Laps': [5, 17], 'Longest': [12, 30]}
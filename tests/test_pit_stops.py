@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import pit_stop_analysis
+from pit_stops import count_pit_stops, extract_pit_stops
+from synthetic_season import generate_season
+
+
+def lap(event, driver, number, stint, compound='SOFT', pit_in=None, pit_out=None):
+    return {'EventName': event, 'Driver': driver, 'LapNumber': number, 'Stint': stint, 'Compound': compound,
+            'PitInTime': pit_in, 'PitOutTime': pit_out}
+
+
+LAPS = pd.DataFrame([
+    # Two stops; the second one too long to be a real stop
+    lap('Bahrain Grand Prix', 'VER', 3, 2, 'HARD', pit_out='0 days 01:05:22.000'),
+    lap('Bahrain Grand Prix', 'VER', 1, 1),
+    lap('Bahrain Grand Prix', 'VER', 2, 1, pit_in='0 days 01:05:00.000'),
+    lap('Bahrain Grand Prix', 'VER', 4, 2, 'HARD', pit_in='0 days 01:07:00.000'),
+    lap('Bahrain Grand Prix', 'VER', 5, 3, 'MEDIUM', pit_out='0 days 01:09:00.000'),
+    # A stint change without pit times, and a lap without a stint
+    lap('Bahrain Grand Prix', 'LEC', 1, 1),
+    lap('Bahrain Grand Prix', 'LEC', 2, np.nan),
+    lap('Bahrain Grand Prix', 'LEC', 3, 2, 'HARD'),
+    # No stop: the stint differs from the previous row, but that is another race
+    lap('Saudi Arabian Grand Prix', 'VER', 1, 1),
+    lap('Saudi Arabian Grand Prix', 'VER', 2, 1),
+])
+
+
+def test_stops_are_stint_changes_within_a_race():
+    stops = extract_pit_stops(LAPS)
+    assert stops[['EventName', 'Driver', 'StopNumber', 'InLap', 'OutLap']].values.tolist() == [
+        ['Bahrain Grand Prix', 'LEC', 1, 1, 3],
+        ['Bahrain Grand Prix', 'VER', 1, 2, 3],
+        ['Bahrain Grand Prix', 'VER', 2, 4, 5],
+    ]
+    assert stops['CompoundAfter'].tolist() == ['HARD', 'HARD', 'MEDIUM']
+    assert np.isnan(stops['PitTime'][0])
+    assert stops['PitTime'][1] == 22.0
+    # 120 s is outside the reasonable range
+    assert np.isnan(stops['PitTime'][2])
+
+
+def test_races_without_stops_count_zero():
+    counts = count_pit_stops(LAPS, extract_pit_stops(LAPS))
+    assert counts.values.tolist() == [
+        ['Bahrain Grand Prix', 'LEC', 1],
+        ['Bahrain Grand Prix', 'VER', 2],
+        ['Saudi Arabian Grand Prix', 'VER', 0],
+    ]
+
+
+# The row-by-row loop pit_stop_analysis.py used to run over each driver's laps:
+# the number of stops and the times of those in the reasonable range
+def calculate_pit_stats(group):
+    pit_stops, pit_times, prev = 0, [], None
+    for row in group.itertuples():
+        if prev is not None and row.Stint != prev.Stint:
+            pit_stops += 1
+            if pd.notnull(prev.PitInTime) and pd.notnull(row.PitOutTime):
+                pit_time = (row.PitOutTime - prev.PitInTime).total_seconds()
+                if 10 <= pit_time <= 60:
+                    pit_times.append(pit_time)
+        prev = row
+    return pit_stops, pit_times
+
+
+def test_driver_stats_match_the_row_loop():
+    season_laps = generate_season(scale=0.2, seed=4, position_interval=600)['laps']
+    stats = pit_stop_analysis.finalize([pit_stop_analysis.summarize(season_laps)]).set_index('Driver')
+
+    laps = season_laps.assign(PitInTime=pd.to_timedelta(season_laps['PitInTime']),
+                              PitOutTime=pd.to_timedelta(season_laps['PitOutTime']))
+    assert stats['PitStops'].sum() > 0
+    for driver, driver_laps in laps.groupby('Driver'):
+        # One race at a time, as stints restart at every event
+        races = [calculate_pit_stats(race.sort_values('LapNumber')) for _, race in driver_laps.groupby('EventName')]
+        pit_times = [pit_time for _, times in races for pit_time in times]
+        assert stats.loc[driver, 'PitStops'] == sum(stops for stops, _ in races)
+        assert stats.loc[driver, 'TotalPitTime'] == pytest.approx(sum(pit_times))
+        assert stats.loc[driver, 'AvgPitTime'] == pytest.approx(np.mean(pit_times) if pit_times else np.nan, nan_ok=True)
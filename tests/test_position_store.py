@@ -0,0 +1,92 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from position_index import build_position_index, lookup_positions
+from position_store import PositionStore, build_position_store, store_path
+from synthetic_season import write_season
+
+SECOND = 1_000_000_000
+
+
+@pytest.fixture(scope='module')
+def data_dir(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp('dataset'))
+    write_season(data_dir, scale=0.2, seed=2, position_interval=20)
+    return data_dir
+
+
+@pytest.fixture(scope='module')
+def store(data_dir):
+    return PositionStore(build_position_store(data_dir=data_dir))
+
+
+# Every sample of the store as one frame
+def samples(store):
+    return pd.concat([store.window(event, columns=('Time', 'Position')).assign(EventName=event)
+                      for event in store.events()], ignore_index=True)
+
+
+def test_arrays_are_memory_mapped(store):
+    event = store.events()[0]
+    driver = store.drivers(event)[0]
+    for name, array in store.slice(event, driver).items():
+        assert isinstance(array, np.memmap), name
+        assert np.shares_memory(array, store.arrays[name])
+
+
+def test_slices_keep_a_time_window(store):
+    event = store.events()[-1]
+    driver = store.drivers(event)[1]
+    times = store.slice(event, driver)['Time']
+    assert len(times) > 10 and np.all(np.diff(times) > 0)
+
+    start, end = pd.Timedelta(int(times[3]), 'ns'), int(times[8]) + SECOND // 2
+    window = store.slice(event, driver, start, end)
+    np.testing.assert_array_equal(window['Time'], times[3:9])
+    assert len(window['Position']) == 6
+
+    assert len(store.slice(event, driver, times[-1] + 1)['Time']) == 0
+    assert len(store.slice(event, 'Nobody')['Time']) == 0
+
+    frame = store.window(event, start, end)
+    assert list(frame.columns) == ['DriverName', 'Time', 'Position']
+    assert frame['Time'].between(int(times[3]), end).all()
+    assert set(frame['DriverName']) == set(store.drivers(event))
+
+
+@pytest.mark.parametrize('direction', ['backward', 'forward'])
+@pytest.mark.parametrize('exact', [False, True])
+def test_lookup_matches_lookup_positions(store, direction, exact):
+    everything = samples(store)
+    rng = np.random.default_rng(0)
+    driver = store.drivers()[0]
+    driver_times = everything.loc[everything['DriverName'] == driver, 'Time'].to_numpy()
+    # Random times and the sample times themselves, where exact matches matter
+    times = np.r_[rng.integers(driver_times.min() - 60 * SECOND, driver_times.max() + 60 * SECOND, 200),
+                  driver_times[::25]]
+
+    season = build_position_index(everything, time='Time')
+    expected = lookup_positions(season, [driver] * len(times), times, direction, exact)
+    np.testing.assert_array_equal(store.lookup(driver, times, direction=direction, allow_exact_matches=exact),
+                                  expected)
+
+    event = store.events()[0]
+    event_index = build_position_index(everything[everything['EventName'] == event], time='Time')
+    expected = lookup_positions(event_index, [driver] * len(times), times, direction, exact)
+    np.testing.assert_array_equal(
+        store.lookup(driver, times, event=event, direction=direction, allow_exact_matches=exact), expected)
+
+
+def test_changed_source_builds_a_new_store(tmp_path):
+    write_season(str(tmp_path), scale=0.1, seed=3, position_interval=60)
+    first = build_position_store(data_dir=str(tmp_path))
+    assert build_position_store(data_dir=str(tmp_path)) == first
+
+    write_season(str(tmp_path), scale=0.1, seed=4, position_interval=60)
+    path = store_path(data_dir=str(tmp_path))
+    assert path != first
+    assert build_position_store(data_dir=str(tmp_path)) == path
+    assert not os.path.exists(first)
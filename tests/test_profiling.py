@@ -0,0 +1,36 @@
+import json
+import time
+
+import numpy as np
+import pytest
+
+import profiling
+
+
+@pytest.fixture
+def recording(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, '_format', 'json')
+    monkeypatch.setattr(profiling, '_directory', str(tmp_path))
+    monkeypatch.setattr(profiling, '_started', (time.perf_counter(), time.process_time()))
+    monkeypatch.setattr(profiling, '_spans', [])
+    monkeypatch.setattr(profiling, '_process_peak', profiling._memory_mb()[1])
+    return tmp_path
+
+
+# Later spans reset the peak memory mark, which must not hide an earlier peak
+# from the process total
+def test_process_peak_outlives_span_resets(recording):
+    if profiling._memory_mb()[1] is None:
+        pytest.skip('needs /proc/self/status')
+    with profiling.span('allocate') as record:
+        before = profiling._memory_mb()[0]
+        block = np.ones(200 << 17)  # 200 MB, every page touched
+        del block
+    with profiling.span('after'):
+        pass
+
+    with open(profiling.write()) as f:
+        report = json.load(f)
+    assert record.peak_rss_mb >= before + 150
+    assert report['peak_rss_mb'] >= record.peak_rss_mb
+    assert [span['name'] for span in report['spans']] == ['allocate', 'after']
@@ -0,0 +1,44 @@
+import os
+
+import pandas as pd
+import pytest
+
+import query_layer
+from data_store import SOURCE_FILES
+from synthetic_season import write_season
+
+duckdb = pytest.importorskip('duckdb')
+
+
+@pytest.fixture(scope='module', params=['by_event', 'single_race'])
+def data_dir(request, tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp(request.param))
+    write_season(data_dir, scale=0.2, position_interval=60.0)
+    if request.param == 'single_race':
+        # The baseline result export: one race, without an EventName column
+        path = os.path.join(data_dir, SOURCE_FILES['results'].format(season=2024))
+        results = pd.read_csv(path)
+        first = results['EventName'].iloc[0]
+        results[results['EventName'] == first].drop(columns='EventName').to_csv(path, index=False)
+    return data_dir
+
+
+def same(sql_result, pandas_result):
+    pd.testing.assert_frame_equal(
+        sql_result.reset_index(drop=True), pandas_result.reset_index(drop=True),
+        check_dtype=False, check_categorical=False, check_exact=False, rtol=1e-5)
+
+
+@pytest.mark.parametrize('name', query_layer.QUERIES)
+@pytest.mark.parametrize('event', [None, 'Bahrain Grand Prix'])
+def test_duckdb_and_pandas_return_the_same_frames(data_dir, name, event):
+    sql_result = query_layer.query(name, event=event, data_dir=data_dir)
+    pandas_result = query_layer._run_pandas(name, event=event, data_dir=data_dir)
+    same(sql_result, pandas_result)
+
+
+def test_driver_filter_matches(data_dir):
+    driver = pd.read_csv(os.path.join(data_dir, SOURCE_FILES['laps'].format(season=2024)))['Driver'].iloc[0]
+    for name in query_layer.QUERIES:
+        same(query_layer.query(name, driver=driver, data_dir=data_dir),
+             query_layer._run_pandas(name, driver=driver, data_dir=data_dir))
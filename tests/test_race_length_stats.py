@@ -0,0 +1,71 @@
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import race_length_stats
+from data_store import apply_schema
+from pit_stops import LAP_COLUMNS, count_pit_stops, extract_pit_stops
+from synthetic_season import generate_season
+
+
+@pytest.fixture(scope='module')
+def laps():
+    season_laps = generate_season(scale=0.3, seed=5, position_interval=600)['laps'][LAP_COLUMNS]
+    return apply_schema(season_laps, 'laps')
+
+
+# The loop over every (EventName, Driver) race summarize() replaced
+def race_loop(laps):
+    race_stats = []
+    for (event, driver), group in laps.groupby(['EventName', 'Driver'], observed=True):
+        stint_lengths = group.groupby('Stint').size()
+        race_stats.append({
+            'EventName': event,
+            'Driver': driver,
+            'TotalLaps': group['LapNumber'].max(),
+            'MostCommonTire': group['Compound'].value_counts().index[0],
+            'Stints': len(stint_lengths),
+            'MinStintLength': stint_lengths.min(),
+            'AvgStintLength': stint_lengths.mean(),
+            'MaxStintLength': stint_lengths.max(),
+        })
+    pit_stops = count_pit_stops(laps, extract_pit_stops(laps))
+    return pd.DataFrame(race_stats).merge(pit_stops, on=['EventName', 'Driver'], how='left')
+
+
+def test_race_stats_match_the_loop(laps):
+    race_stats = race_length_stats.summarize(laps).astype({'EventName': object, 'Driver': object})
+    pd.testing.assert_frame_equal(race_stats, race_loop(laps), check_dtype=False)
+
+
+def test_race_length_stats_match_the_loop(laps):
+    races = race_loop(laps)
+    stats = race_length_stats.finalize([race_length_stats.summarize(event_laps)
+                                        for _, event_laps in laps.groupby('EventName', observed=True)])
+    for row in stats.itertuples():
+        length = races[races['TotalLaps'] == row.RaceLength]
+        assert row.AvgPitStops == pytest.approx(length['PitStops'].mean())
+        assert row.MostCommonTire == Counter(length['MostCommonTire']).most_common(1)[0][0]
+        assert row.AvgStintLength == pytest.approx(length['AvgStintLength'].mean())
+        assert row.MaxStintLength == length['MaxStintLength'].max()
+    assert sorted(stats['RaceLength']) == sorted(races['TotalLaps'].unique())
+
+
+def test_tire_ties_go_to_the_first_seen():
+    laps = pd.DataFrame({
+        'EventName': 'Bahrain Grand Prix',
+        'Driver': ['VER'] * 4 + ['LEC'] * 4,
+        'LapNumber': [1, 2, 3, 4] * 2,
+        'Stint': [1, 1, 2, 2] * 2,
+        'Compound': pd.Categorical(['HARD', 'HARD', 'SOFT', 'SOFT', 'SOFT', 'SOFT', 'MEDIUM', 'MEDIUM'],
+                                   categories=['HARD', 'MEDIUM', 'SOFT']),
+        'PitInTime': pd.NaT,
+        'PitOutTime': pd.NaT,
+    })
+    stats = race_length_stats.summarize(laps).set_index('Driver')
+    assert stats['MostCommonTire'].to_dict() == {'LEC': 'MEDIUM', 'VER': 'HARD'}
+    assert stats['PitStops'].to_dict() == {'LEC': 1, 'VER': 1}
+    assert np.all(stats['AvgStintLength'] == 2.0)
+    assert race_length_stats.finalize([stats.reset_index()])['MostCommonTire'].tolist() == ['MEDIUM']
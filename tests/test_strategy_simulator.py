@@ -0,0 +1,54 @@
+import pandas as pd
+
+from strategy_simulator import COLUMNS, race_parameters, rank_strategies, season_parameters
+from tyre_model import DegradationModel
+
+PARAMS = {'race_laps': 50, 'pit_loss': 22.0, 'pit_spread': 2.0, 'safety_car_odds': 0.5, 'safety_car_laps': 4}
+
+
+def coefficients(event, compounds):
+    return pd.DataFrame({
+        'EventName': event,
+        'Compound': compounds,
+        'Base': [90.0 + i for i in range(len(compounds))],
+        'Degradation': [0.08 - 0.02 * i for i in range(len(compounds))],
+        'Fuel': -0.05,
+        'Laps': 100,
+        'RMSE': 0.5,
+    })
+
+
+def test_wet_event_gets_an_empty_ranking():
+    model = DegradationModel(coefficients('Wet Grand Prix', ['INTERMEDIATE', 'SOFT']), 'Wet Grand Prix')
+    for workers in (1, 4, None):
+        ranking = rank_strategies('Wet Grand Prix', model, PARAMS, simulations=100, workers=workers)
+        assert ranking.empty
+        assert list(ranking.columns) == COLUMNS
+
+
+def test_dry_event_ranks_the_same_in_any_number_of_workers():
+    model = DegradationModel(coefficients('Dry Grand Prix', ['SOFT', 'MEDIUM', 'HARD']), 'Dry Grand Prix')
+    single = rank_strategies('Dry Grand Prix', model, PARAMS, simulations=200, workers=1)
+    split = rank_strategies('Dry Grand Prix', model, PARAMS, simulations=200, workers=3)
+    assert list(single.columns) == COLUMNS
+    assert single['Rank'].tolist() == list(range(1, len(single) + 1))
+    pd.testing.assert_frame_equal(single, split)
+
+
+def test_season_figures_are_shared_by_every_event():
+    laps = pd.DataFrame({
+        'EventName': ['A'] * 3 + ['B'] * 3,
+        'LapNumber': [1, 2, 3, 1, 2, 3],
+        'TrackStatus': ['1', '41', '4', '1', '1', '1'],
+    })
+    stops = pd.DataFrame({'EventName': ['A', 'A'], 'PitTime': [20.0, 24.0]})
+    season = season_parameters(laps, stops)
+    assert season['safety_car_odds'] == 0.5
+    assert season['safety_car_laps'] == 2
+
+    a = race_parameters(laps[laps['EventName'] == 'A'], stops, season)
+    # An event without timed stops takes the season's pit time
+    b = race_parameters(laps[laps['EventName'] == 'B'], stops.iloc[0:0], season)
+    assert a['race_laps'] == b['race_laps'] == 3
+    assert a['pit_loss'] == b['pit_loss'] == 22.0
+    assert a['safety_car_odds'] == b['safety_car_odds'] == 0.5
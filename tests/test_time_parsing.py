@@ -0,0 +1,68 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import time_parsing
+from time_parsing import NAT, to_nanoseconds, to_seconds, to_timedelta
+
+VALUES = [
+    '0 days 01:02:03.456000000',
+    '0 days 00:01:32.072450059',
+    '0 days 01:00:00',
+    '0 days 00:00:00.5',
+    '1 days 23:59:59.999999999',
+    '12 days 00:00:01.1',
+    '-1 days +23:59:59.500000',
+    '01:02:03',
+    '0 days 01:60:00',
+    '0 days 1:02:03',
+    '0 days 01:02:03.1234567890',
+    '0 days 01:02:03.',
+    'garbage',
+    '',
+    '   ',
+    None,
+    np.nan,
+]
+
+
+def reference(values):
+    return pd.Series([pd.to_timedelta(value, errors='coerce') for value in values], dtype='timedelta64[ns]')
+
+
+def test_strings_parse_like_pandas():
+    values = pd.Series(VALUES, dtype=object)
+    pd.testing.assert_series_equal(to_timedelta(values), reference(VALUES), check_names=False)
+
+
+@pytest.mark.parametrize('rows', [1, 3, 7])
+def test_blocks_of_any_size_parse_the_same(monkeypatch, rows):
+    monkeypatch.setattr(time_parsing, 'CHUNK_ROWS', rows)
+    values = pd.Series(VALUES * 3, dtype=object)
+    pd.testing.assert_series_equal(to_timedelta(values), reference(VALUES * 3), check_names=False)
+
+
+def test_non_ascii_text_falls_back_to_pandas():
+    values = ['0 days 01:02:03', '0 days 01:02:03é', '0 days 00:00:01.25']
+    pd.testing.assert_series_equal(to_timedelta(pd.Series(values)), reference(values), check_names=False)
+
+
+def test_empty_and_all_missing_columns():
+    assert len(to_timedelta(pd.Series([], dtype=object))) == 0
+    assert to_timedelta(pd.Series([None, np.nan, ''], dtype=object)).isna().all()
+
+
+def test_numbers_are_seconds_and_timedeltas_pass_through():
+    numbers = pd.Series([1.5, np.nan, 90])
+    assert to_seconds(numbers).tolist()[::2] == [1.5, 90.0]
+    assert np.isnan(to_seconds(numbers)[1])
+    deltas = pd.Series(pd.to_timedelta(['00:00:01', None]))
+    pd.testing.assert_series_equal(to_timedelta(deltas), deltas.astype('timedelta64[ns]'))
+
+
+def test_index_name_and_nanoseconds_are_kept():
+    values = pd.Series(['0 days 00:00:01.000000001', None], index=[10, 20], name='LapTime')
+    parsed = to_timedelta(values)
+    assert parsed.name == 'LapTime'
+    assert parsed.index.tolist() == [10, 20]
+    assert to_nanoseconds(values).tolist() == [1_000_000_001, NAT]
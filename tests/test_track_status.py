@@ -0,0 +1,59 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import track_status
+from track_status import CONDITIONS, track_condition
+
+
+def test_the_most_severe_status_of_a_lap_wins():
+    laps = pd.DataFrame({'TrackStatus': ['1', '12', '2671', '67', '6', '7', '41', '2654', '5', None, np.nan, '']})
+    assert track_condition(laps).tolist() == [
+        'GREEN', 'YELLOW', 'VSC', 'VSC', 'VSC', 'VSC', 'SC', 'RED', 'RED', 'GREEN', 'GREEN', 'GREEN']
+
+
+# Status read from the CSV as numbers is decoded the same way
+def test_numeric_status():
+    laps = pd.DataFrame({'TrackStatus': [1, 12, 4, 671]})
+    assert track_condition(laps).tolist() == ['GREEN', 'YELLOW', 'SC', 'VSC']
+
+
+def laps(seed=0, n=3_000):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'EventName': rng.choice(['Bahrain Grand Prix', 'Monaco Grand Prix', 'Italian Grand Prix'], n),
+        'Driver': rng.choice(['VER', 'LEC', 'HAM', 'NOR'], n),
+        'LapTime': pd.to_timedelta(rng.normal(92, 4, n), unit='s').where(rng.random(n) > 0.05),
+        'TrackStatus': rng.choice(['1', '2', '12', '4', '24', '6', '67', '5', None], n),
+        'IsAccurate': rng.choice([True, False, None], n),
+    })
+
+
+def test_matrix_matches_a_groupby_over_the_season():
+    df = laps()
+    matrix = track_status.finalize([track_status.summarize(event_laps)
+                                    for _, event_laps in df.groupby('EventName')])
+    assert list(matrix.columns) == [f'{condition}_{accurate}'
+                                    for condition in sorted(CONDITIONS) for accurate in (False, True)]
+    assert matrix.index.tolist() == ['HAM', 'LEC', 'NOR', 'VER']
+
+    condition = track_condition(df) + '_' + df['IsAccurate'].fillna(False).astype(bool).astype(str)
+    expected = df['LapTime'].dt.total_seconds().groupby([df['Driver'], condition]).mean().unstack()
+    for column in matrix.columns:
+        np.testing.assert_allclose(matrix[column], expected[column].reindex(matrix.index), rtol=1e-12)
+
+
+# A condition nobody raced under still gets its (empty) column
+def test_missing_conditions_are_empty_columns():
+    df = pd.DataFrame({
+        'EventName': 'Bahrain Grand Prix',
+        'Driver': ['VER', 'VER', 'LEC'],
+        'LapTime': pd.to_timedelta([90, 92, 91], unit='s'),
+        'TrackStatus': ['1', '1', '4'],
+        'IsAccurate': [True, True, False],
+    })
+    matrix = track_status.finalize([track_status.summarize(df)])
+    assert matrix.loc['VER', 'GREEN_True'] == pytest.approx(91.0)
+    assert matrix.loc['LEC', 'SC_False'] == pytest.approx(91.0)
+    assert matrix.notna().sum().sum() == 2
+    assert matrix.shape == (2, 2 * len(CONDITIONS))
@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import undercut
+from undercut import lap_end_table, lap_ends
+
+DRIVERS = ['ALB', 'BOT', 'ZHO']
+
+LAP_ENDS = pd.DataFrame({
+    'Driver': ['BOT', 'BOT', 'ALB', 'BOT', 'ZHO', 'ALB', 'ZHO', 'ALB'],
+    'LapNumber': [1, 2, 1, 2, np.nan, 3, 1.5, 0],
+    'Time': pd.to_timedelta([3690, 3780, 3691, 3999, 3700, 3871, 3720, 3600], unit='s'),
+})
+
+
+# The merge on deduplicated rows lap_ends() used to run for every query
+def merged_ends(laps, drivers, lap_numbers):
+    ends = laps[['Driver', 'LapNumber', 'Time']].dropna()
+    ends = pd.DataFrame({
+        'Driver': ends['Driver'].astype(object),
+        'LapNumber': ends['LapNumber'].astype(float),
+        'Seconds': ends['Time'].dt.total_seconds(),
+    }).drop_duplicates(['Driver', 'LapNumber'])
+    queries = pd.DataFrame({'Driver': np.asarray(drivers, dtype=object), 'LapNumber': np.asarray(lap_numbers, dtype=float)})
+    return queries.merge(ends, on=['Driver', 'LapNumber'], how='left')['Seconds'].to_numpy()
+
+
+def test_lap_end_table():
+    table = lap_end_table(LAP_ENDS, DRIVERS)
+    np.testing.assert_array_equal(table, [
+        [3600, 3691, np.nan, 3871],
+        # The first row of a repeated lap wins
+        [np.nan, 3690, 3780, np.nan],
+        # Missing and fractional lap numbers have no column
+        [np.nan, np.nan, np.nan, np.nan],
+    ])
+    assert lap_end_table(LAP_ENDS.iloc[0:0], DRIVERS).shape == (3, 0)
+
+
+def test_lap_ends_match_the_merge():
+    rng = np.random.default_rng(0)
+    drivers = rng.choice(DRIVERS + ['HAM'], 500)
+    lap_numbers = rng.choice([-1, 0, 1, 2, 3, 4, 2.5, np.nan], 500)
+    # Drivers outside the table have no row
+    rows = np.array([DRIVERS.index(driver) if driver in DRIVERS else -1 for driver in drivers])
+    np.testing.assert_array_equal(lap_ends(lap_end_table(LAP_ENDS, DRIVERS), rows, lap_numbers),
+                                  merged_ends(LAP_ENDS, drivers, lap_numbers))
+
+
+# Lap end times of a driver lapping in `pace` seconds from `start`, with
+# (lap number, extra seconds) delays
+def race(driver, start, pace, laps, delays, stint_from):
+    lap_times = np.full(laps, float(pace[0]))
+    lap_times[stint_from:] = pace[1]
+    for lap_number, extra in delays:
+        lap_times[lap_number - 1] += extra
+    ends = start + np.cumsum(lap_times)
+    stint = np.where(np.arange(1, laps + 1) > stint_from, 2, 1)
+    return pd.DataFrame({
+        'EventName': 'Bahrain Grand Prix',
+        'Driver': driver,
+        'LapNumber': np.arange(1, laps + 1),
+        'Stint': stint,
+        'Compound': np.where(stint == 1, 'MEDIUM', 'HARD'),
+        'Time': pd.to_timedelta(ends, unit='s'),
+        'LapTime': pd.to_timedelta(lap_times, unit='s'),
+        'PitInTime': pd.to_timedelta(np.where(np.arange(1, laps + 1) == stint_from, ends - 2, np.nan), unit='s'),
+        'PitOutTime': pd.to_timedelta(np.where(np.arange(1, laps + 1) == stint_from + 1, ends - lap_times + 18, np.nan),
+                                      unit='s'),
+    })
+
+
+def test_earlier_stop_on_fresh_tyres_is_an_undercut():
+    laps = pd.concat([
+        # ALB runs a second behind BOT, stops a lap earlier and is two seconds a lap faster after it
+        race('ALB', 3601, (90, 88), 20, [(10, 5), (11, 15)], 10),
+        race('BOT', 3600, (90, 88), 20, [(11, 5), (12, 15)], 11),
+        # ZHO is a minute behind, racing nobody
+        race('ZHO', 3660, (90, 89), 20, [(5, 5), (6, 15)], 5),
+    ], ignore_index=True)
+    positions = pd.DataFrame(columns=undercut.TABLES['positions'])
+
+    pairs = undercut.finalize([undercut.summarize(laps, positions)]).set_index('Driver')
+    # BOT is alone when it starts its in-lap: ALB is in the pits, six seconds back
+    assert pairs['Outcome'].to_dict() == {'ALB': 'undercut', 'BOT': 'clear_air', 'ZHO': 'clear_air'}
+    alb = pairs.loc['ALB']
+    assert (alb['Rival'], alb['RivalInLap']) == ('BOT', 11)
+    assert alb['GapBefore'] == pytest.approx(1.0, abs=0.1)
+    assert alb['GapAfter'] < 0
+    # Over laps 10-12 ALB loses 20 s in the pits and gains 2 s on fresh tyres
+    assert alb['StopDelta'] == pytest.approx(-2.0)
+    assert alb['PaceBefore'] == pytest.approx(0.0)